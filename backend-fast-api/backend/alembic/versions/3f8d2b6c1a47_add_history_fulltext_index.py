@@ -0,0 +1,26 @@
+"""Add fulltext index on history title and result
+
+Revision ID: 3f8d2b6c1a47
+Revises: f2c8a6d4e913
+Create Date: 2026-10-19 15:40:12.204871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8d2b6c1a47'
+down_revision: Union[str, None] = 'f2c8a6d4e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_history_fulltext', 'history', ['title', 'result'], mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_history_fulltext', table_name='history')
@@ -0,0 +1,127 @@
+"""Add credit ledger, job credit holds and user_credits.credits_held
+
+Revision ID: 5b7e1d9c3a62
+Revises: 9a4c6e2f8b15
+Create Date: 2026-10-19 18:12:47.093551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e1d9c3a62'
+down_revision: Union[str, None] = '9a4c6e2f8b15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # Billing tables are created by create_all at startup, so depending on whether the
+    # app ran first, user_credits may be missing or the new tables may already exist
+    if not inspector.has_table('credit_ledger'):
+        create_credit_ledger()
+    if not inspector.has_table('credit_holds'):
+        create_credit_holds()
+    if inspector.has_table('user_credits') and 'credits_held' not in {
+        column['name'] for column in inspector.get_columns('user_credits')
+    }:
+        upgrade_user_credits()
+
+
+def create_credit_ledger() -> None:
+    op.create_table(
+        'credit_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=32), nullable=False),
+        sa.Column('reference', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_credit_ledger_id'), 'credit_ledger', ['id'], unique=False)
+    op.create_index('ux_credit_ledger_kind_reference', 'credit_ledger', ['kind', 'reference'], unique=True)
+    op.create_index('ix_credit_ledger_user_created', 'credit_ledger', ['user_id', 'created_at'], unique=False)
+
+
+def create_credit_holds() -> None:
+    op.create_table(
+        'credit_holds',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('pdf_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['pdf_id'], ['pdfs.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_credit_holds_id'), 'credit_holds', ['id'], unique=False)
+    op.create_index(op.f('ix_credit_holds_user_id'), 'credit_holds', ['user_id'], unique=False)
+    op.create_index(op.f('ix_credit_holds_pdf_id'), 'credit_holds', ['pdf_id'], unique=False)
+    op.create_index('ix_credit_holds_status_expires', 'credit_holds', ['status', 'expires_at'], unique=False)
+
+
+def upgrade_user_credits() -> None:
+    conn = op.get_bind()
+    op.add_column('user_credits', sa.Column('credits_held', sa.Integer(), nullable=False, server_default='0'))
+
+    # --- Manual Step: merge duplicate credit rows before user_id becomes unique ---
+    # get_user_credits could insert a second row for a user under concurrency;
+    # fold each user's rows into the oldest one, keeping the summed balance.
+    duplicates = conn.execute(sa.text(
+        "SELECT user_id, MIN(id), SUM(credits_balance) FROM user_credits "
+        "GROUP BY user_id HAVING COUNT(*) > 1"
+    )).all()
+    for user_id, keep_id, balance in duplicates:
+        conn.execute(
+            sa.text("UPDATE user_credits SET credits_balance = :balance WHERE id = :keep_id"),
+            {"balance": balance, "keep_id": keep_id}
+        )
+        conn.execute(
+            sa.text("DELETE FROM user_credits WHERE user_id = :user_id AND id <> :keep_id"),
+            {"user_id": user_id, "keep_id": keep_id}
+        )
+
+    # Open every account's ledger with its current balance so ledger sums match balances
+    conn.execute(sa.text(
+        "INSERT INTO credit_ledger (user_id, amount, kind, reference, created_at) "
+        "SELECT user_id, credits_balance, 'opening_balance', CONCAT('user_credits:', id), CURRENT_TIMESTAMP "
+        "FROM user_credits WHERE credits_balance <> 0"
+    ))
+    # --- End Manual Step ---
+
+    op.alter_column('user_credits', 'user_id', existing_type=sa.String(length=255), type_=sa.String(length=64), existing_nullable=False)
+    op.alter_column('user_credits', 'credits_balance', existing_type=sa.Integer(), nullable=False, server_default='0')
+    op.drop_index('ix_user_credits_user_id', table_name='user_credits')
+    op.create_index(op.f('ix_user_credits_user_id'), 'user_credits', ['user_id'], unique=True)
+
+
+def downgrade() -> None:
+    # Mirrors upgrade: only undo what is actually there
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('user_credits') and 'credits_held' in {
+        column['name'] for column in inspector.get_columns('user_credits')
+    }:
+        op.drop_index(op.f('ix_user_credits_user_id'), table_name='user_credits')
+        op.create_index('ix_user_credits_user_id', 'user_credits', ['user_id'], unique=False)
+        op.drop_column('user_credits', 'credits_held')
+
+    if inspector.has_table('credit_holds'):
+        op.drop_index('ix_credit_holds_status_expires', table_name='credit_holds')
+        op.drop_index(op.f('ix_credit_holds_pdf_id'), table_name='credit_holds')
+        op.drop_index(op.f('ix_credit_holds_user_id'), table_name='credit_holds')
+        op.drop_index(op.f('ix_credit_holds_id'), table_name='credit_holds')
+        op.drop_table('credit_holds')
+
+    if inspector.has_table('credit_ledger'):
+        op.drop_index('ix_credit_ledger_user_created', table_name='credit_ledger')
+        op.drop_index('ux_credit_ledger_kind_reference', table_name='credit_ledger')
+        op.drop_index(op.f('ix_credit_ledger_id'), table_name='credit_ledger')
+        op.drop_table('credit_ledger')
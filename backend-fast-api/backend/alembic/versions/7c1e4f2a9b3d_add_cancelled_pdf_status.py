@@ -0,0 +1,35 @@
+"""Add cancelled to pdf status enum
+
+Revision ID: 7c1e4f2a9b3d
+Revises: cbe9a2810e00
+Create Date: 2026-10-19 09:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4f2a9b3d'
+down_revision: Union[str, None] = 'cbe9a2810e00'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column('pdfs', 'status',
+               existing_type=mysql.ENUM('pending', 'processing', 'completed', 'failed'),
+               type_=mysql.ENUM('pending', 'processing', 'completed', 'failed', 'cancelled'),
+               existing_nullable=False,
+               existing_server_default=sa.text("'pending'"))
+
+
+def downgrade() -> None:
+    op.execute("UPDATE pdfs SET status = 'failed' WHERE status = 'cancelled'")
+    op.alter_column('pdfs', 'status',
+               existing_type=mysql.ENUM('pending', 'processing', 'completed', 'failed', 'cancelled'),
+               type_=mysql.ENUM('pending', 'processing', 'completed', 'failed'),
+               existing_nullable=False,
+               existing_server_default=sa.text("'pending'"))
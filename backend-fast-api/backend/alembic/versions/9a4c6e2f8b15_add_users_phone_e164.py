@@ -0,0 +1,100 @@
+"""Add normalized users.phone_e164 with a unique index
+
+Revision ID: 9a4c6e2f8b15
+Revises: b4e9c1a6d372
+Create Date: 2026-10-19 17:05:31.618204
+
+"""
+import os
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import phonenumbers
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4c6e2f8b15'
+down_revision: Union[str, None] = 'b4e9c1a6d372'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows normalized and written per statement; each batch commits on its own
+BATCH_SIZE = 5000
+
+# Region bare national numbers are read in, as PHONE_DEFAULT_REGION was when this migration was written
+DEFAULT_REGION = os.getenv("PHONE_DEFAULT_REGION", "IN")
+
+
+# Frozen copy of app.core.phone.normalize_phone as of this revision, so later
+# changes to the app's normalization cannot change what this backfill writes
+def normalize_phone(raw: Optional[str]) -> Optional[str]:
+    if not raw:
+        return None
+    raw = raw.strip()
+    digits = "".join(filter(str.isdigit, raw))
+    cleaned = f"+{digits}" if raw.startswith("+") and digits else digits
+    if not digits:
+        return None
+    if not cleaned.startswith("+") and digits.startswith("00"):
+        digits = digits[2:]
+        cleaned = f"+{digits}"
+
+    if cleaned.startswith("+"):
+        candidates = [(cleaned, None)]
+    else:
+        candidates = [(digits, DEFAULT_REGION), (f"+{digits}", None)]
+    for number, region in candidates:
+        try:
+            parsed = phonenumbers.parse(number, region)
+        except phonenumbers.NumberParseException:
+            continue
+        if phonenumbers.is_valid_number(parsed):
+            return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+    return f"+{digits}"
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('phone_e164', sa.String(length=32), nullable=True))
+
+    # --- Manual Step: backfill phone_e164 in id-ordered batches ---
+    # phone_number was never unique, so when several accounts normalize to the
+    # same number the oldest keeps it and the rest stay NULL (they can still
+    # log in by email) rather than failing the unique index below.
+    conn = op.get_bind()
+    seen = set()
+    duplicates = 0
+    last_id = 0
+    with op.get_context().autocommit_block():
+        while True:
+            rows = conn.execute(
+                sa.text(
+                    "SELECT id, phone_number FROM users "
+                    "WHERE id > :last_id AND phone_number IS NOT NULL AND phone_number <> '' "
+                    "ORDER BY id LIMIT :batch_size"
+                ),
+                {"last_id": last_id, "batch_size": BATCH_SIZE}
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for user_id, phone_number in rows:
+                phone_e164 = normalize_phone(phone_number)
+                if phone_e164 in seen:
+                    duplicates += 1
+                    continue
+                seen.add(phone_e164)
+                updates.append({"id": user_id, "phone_e164": phone_e164})
+            if updates:
+                conn.execute(sa.text("UPDATE users SET phone_e164 = :phone_e164 WHERE id = :id"), updates)
+            last_id = rows[-1][0]
+    if duplicates:
+        print(f"phone_e164 backfill: {duplicates} user(s) share a number with an older account and were left NULL")
+    # --- End Manual Step ---
+
+    op.create_index(op.f('ix_users_phone_e164'), 'users', ['phone_e164'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_phone_e164'), table_name='users')
+    op.drop_column('users', 'phone_e164')
@@ -0,0 +1,35 @@
+"""Add replication_heartbeat for measuring read replica lag
+
+Revision ID: a7d3f5b1c820
+Revises: 3f8d2b6c1a47
+Create Date: 2026-10-19 15:08:52.614290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f5b1c820'
+down_revision: Union[str, None] = '3f8d2b6c1a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # create_all at startup may have created the table already; the lag monitor inserts its row
+    if not sa.inspect(op.get_bind()).has_table('replication_heartbeat'):
+        op.create_table(
+            'replication_heartbeat',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('beat_at', sa.DateTime(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('replication_heartbeat')
@@ -0,0 +1,49 @@
+"""Add webhook_inbox for asynchronous payment webhook processing
+
+Revision ID: b83d5f1e6a47
+Revises: e41a7c9d2b58
+Create Date: 2026-10-19 19:48:36.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83d5f1e6a47'
+down_revision: Union[str, None] = 'e41a7c9d2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # create_all at startup may have created the table already
+    if sa.inspect(op.get_bind()).has_table('webhook_inbox'):
+        return
+    op.create_table(
+        'webhook_inbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=32), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=128), nullable=False),
+        sa.Column('event_type', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_webhook_inbox_id'), 'webhook_inbox', ['id'], unique=False)
+    op.create_index('ux_webhook_inbox_source_key', 'webhook_inbox', ['source', 'idempotency_key'], unique=True)
+    op.create_index('ix_webhook_inbox_status_id', 'webhook_inbox', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_inbox_status_id', table_name='webhook_inbox')
+    op.drop_index('ux_webhook_inbox_source_key', table_name='webhook_inbox')
+    op.drop_index(op.f('ix_webhook_inbox_id'), table_name='webhook_inbox')
+    op.drop_table('webhook_inbox')
@@ -0,0 +1,32 @@
+"""Add job_outputs.ref_book_text so resumed jobs keep the reference book
+
+Revision ID: c9e1b7a3f520
+Revises: d5a9c3e7f214
+Create Date: 2026-10-20 10:14:36.208417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1b7a3f520'
+down_revision: Union[str, None] = 'd5a9c3e7f214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# MySQL TEXT tops out at 64KB, extracted papers can be larger
+LongText = sa.Text().with_variant(mysql.LONGTEXT(), 'mysql')
+
+
+def upgrade() -> None:
+    # create_all at startup may have added the column already
+    if 'ref_book_text' not in {column['name'] for column in sa.inspect(op.get_bind()).get_columns('job_outputs')}:
+        op.add_column('job_outputs', sa.Column('ref_book_text', LongText, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('job_outputs', 'ref_book_text')
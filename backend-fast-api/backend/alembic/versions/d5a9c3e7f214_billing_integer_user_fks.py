@@ -0,0 +1,98 @@
+"""Integer user_id foreign keys and composite indexes on billing tables
+
+Revision ID: d5a9c3e7f214
+Revises: b83d5f1e6a47
+Create Date: 2026-10-19 20:31:09.748352
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9c3e7f214'
+down_revision: Union[str, None] = 'b83d5f1e6a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Billing tables whose user_id was a string copy of users.id, with its old type
+BILLING_TABLES = {
+    'user_credits': sa.String(length=64),
+    'credit_ledger': sa.String(length=64),
+    'credit_holds': sa.String(length=64),
+    'credit_transactions': sa.String(length=255),
+}
+
+
+def fk_name(table: str) -> str:
+    return f'fk_{table}_user_id_users'
+
+
+def count_orphans(conn, table: str) -> int:
+    """Rows whose user_id is not the id of an existing user (non-numeric or deleted)"""
+    rows = sa.table(table, sa.column('user_id'))
+    users = sa.table('users', sa.column('id'))
+    return conn.scalar(
+        sa.select(sa.func.count()).select_from(rows).where(
+            rows.c.user_id.notin_(sa.select(sa.cast(users.c.id, sa.String(32))))
+        )
+    )
+
+
+def has_string_user_id(inspector, table: str) -> bool:
+    if not inspector.has_table(table):
+        return False
+    column = next(column for column in inspector.get_columns(table) if column['name'] == 'user_id')
+    return isinstance(column['type'], sa.String)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    # Missing tables, or ones create_all already built from the current models, need nothing
+    tables = [table for table in BILLING_TABLES if has_string_user_id(inspector, table)]
+
+    # --- Manual Step: every user_id must name an existing user before it can become a foreign key ---
+    # Balances and purchases are not ours to drop silently, so stop and report instead
+    orphans = {table: count_orphans(conn, table) for table in tables}
+    orphans = {table: count for table, count in orphans.items() if count}
+    if orphans:
+        raise RuntimeError(
+            f"Billing rows reference missing users, fix or remove them before upgrading: {orphans}"
+        )
+    # --- End Manual Step ---
+
+    for table in tables:
+        # MySQL converts the numeric strings in place
+        op.alter_column(table, 'user_id', existing_type=BILLING_TABLES[table], type_=sa.Integer(), existing_nullable=False)
+
+    if 'credit_transactions' in tables:
+        indexes = {index['name'] for index in inspector.get_indexes('credit_transactions')}
+        # The composite indexes lead with user_id, so they also serve the foreign key
+        op.create_index('ix_credit_transactions_user_created', 'credit_transactions', ['user_id', 'created_at'], unique=False)
+        op.create_index('ix_credit_transactions_user_status', 'credit_transactions', ['user_id', 'payment_status'], unique=False)
+        op.create_index('ix_credit_transactions_razorpay_order_id', 'credit_transactions', ['razorpay_order_id'], unique=False)
+        if 'ix_credit_transactions_user_id' in indexes:
+            op.drop_index('ix_credit_transactions_user_id', table_name='credit_transactions')
+
+    for table in tables:
+        op.create_foreign_key(fk_name(table), table, 'users', ['user_id'], ['id'])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = [table for table in BILLING_TABLES if inspector.has_table(table) and not has_string_user_id(inspector, table)]
+
+    for table in tables:
+        op.drop_constraint(fk_name(table), table, type_='foreignkey')
+
+    if 'credit_transactions' in tables:
+        op.create_index('ix_credit_transactions_user_id', 'credit_transactions', ['user_id'], unique=False)
+        op.drop_index('ix_credit_transactions_razorpay_order_id', table_name='credit_transactions')
+        op.drop_index('ix_credit_transactions_user_status', table_name='credit_transactions')
+        op.drop_index('ix_credit_transactions_user_created', table_name='credit_transactions')
+
+    for table in tables:
+        op.alter_column(table, 'user_id', existing_type=sa.Integer(), type_=BILLING_TABLES[table], existing_nullable=False)
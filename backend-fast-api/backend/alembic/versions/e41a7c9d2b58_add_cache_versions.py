@@ -0,0 +1,40 @@
+"""Add cache_versions for invalidating per-worker caches
+
+Revision ID: e41a7c9d2b58
+Revises: 5b7e1d9c3a62
+Create Date: 2026-10-19 19:02:14.527310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41a7c9d2b58'
+down_revision: Union[str, None] = '5b7e1d9c3a62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    # create_all at startup may have created the table already
+    if not sa.inspect(conn).has_table('cache_versions'):
+        op.create_table(
+            'cache_versions',
+            sa.Column('name', sa.String(length=64), nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+    # Seed the billing plan catalog's counter so plan edits only ever need an UPDATE
+    if conn.execute(sa.text("SELECT 1 FROM cache_versions WHERE name = 'billing_plans'")).first() is None:
+        conn.execute(sa.text(
+            "INSERT INTO cache_versions (name, version, updated_at) VALUES ('billing_plans', 0, CURRENT_TIMESTAMP)"
+        ))
+
+
+def downgrade() -> None:
+    op.drop_table('cache_versions')
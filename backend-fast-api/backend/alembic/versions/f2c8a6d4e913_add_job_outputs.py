@@ -0,0 +1,77 @@
+"""Add job_outputs and job_output_chunks for checkpointed, resumable jobs
+
+Revision ID: f2c8a6d4e913
+Revises: 7c1e4f2a9b3d
+Create Date: 2026-10-19 11:42:16.208417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8a6d4e913'
+down_revision: Union[str, None] = '7c1e4f2a9b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# MySQL TEXT tops out at 64KB, extracted papers can be larger
+LongText = sa.Text().with_variant(mysql.LONGTEXT(), 'mysql')
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # create_all at startup may have created the tables already
+    if not inspector.has_table('job_outputs'):
+        create_job_outputs()
+    if not inspector.has_table('job_output_chunks'):
+        create_job_output_chunks()
+
+
+def create_job_outputs() -> None:
+    op.create_table(
+        'job_outputs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('pdf_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('source_text', LongText, nullable=False),
+        sa.Column('claimed_by', sa.String(length=255), nullable=True),
+        sa.Column('resume_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['pdf_id'], ['pdfs.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('pdf_id')
+    )
+    op.create_index(op.f('ix_job_outputs_id'), 'job_outputs', ['id'], unique=False)
+    op.create_index('ix_job_outputs_updated_at', 'job_outputs', ['updated_at'], unique=False)
+
+
+def create_job_output_chunks() -> None:
+    op.create_table(
+        'job_output_chunks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_output_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['job_output_id'], ['job_outputs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_job_output_chunks_id'), 'job_output_chunks', ['id'], unique=False)
+    op.create_index('ix_job_output_chunks_job_seq', 'job_output_chunks', ['job_output_id', 'seq'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_output_chunks_job_seq', table_name='job_output_chunks')
+    op.drop_index(op.f('ix_job_output_chunks_id'), table_name='job_output_chunks')
+    op.drop_table('job_output_chunks')
+
+    op.drop_index('ix_job_outputs_updated_at', table_name='job_outputs')
+    op.drop_index(op.f('ix_job_outputs_id'), table_name='job_outputs')
+    op.drop_table('job_outputs')
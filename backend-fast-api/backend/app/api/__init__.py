@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import auth, pdf_process, payment, history
+from app.api.endpoints import auth, pdf_process, payment, history, metrics, billing_plan
 
 api_router = APIRouter()
 
@@ -7,4 +7,6 @@ api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(pdf_process.router, prefix="/pdf", tags=["pdf-processing"])
 api_router.include_router(payment.router, prefix="/payment", tags=["payment"])
+api_router.include_router(billing_plan.router, prefix="/billing", tags=["payment"])
 api_router.include_router(history.router, prefix="/history", tags=["history"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
@@ -2,16 +2,22 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
 from app.core.config import settings
-from app.db.database import get_db
+from app.core.user_cache import user_cache
+from app.db.database import read_session
 from app.api import models, schemas
 import google.generativeai as genai
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current user from JWT token using user ID"""
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    Get current user from JWT token using user ID.
+
+    The user comes from the per-process user cache when possible; otherwise
+    the lookup is a read, so it may be served by a replica. The returned user
+    is detached; endpoints that modify it merge it into their own session.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -28,7 +34,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except (JWTError, ValidationError):
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+    user = user_cache.get(int(user_id))
+    if user is None:
+        async with read_session(int(user_id)) as db:
+            user = await db.get(models.User, int(user_id))
+        if user is not None:
+            user_cache.put(user)
     if user is None:
         raise credentials_exception
     return user
@@ -39,6 +50,14 @@ async def get_current_active_user(current_user: models.User = Depends(get_curren
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_user_read_db(current_user: models.User = Depends(get_current_active_user)):
+    """
+    Dependency for a read-only async session on behalf of the current user.
+    Served by a replica unless the user wrote something moments ago.
+    """
+    async with read_session(current_user.id) as db:
+        yield db
+
 def get_gemini_client():
     """Get Gemini API client"""
     if not settings.GOOGLE_API_KEY:
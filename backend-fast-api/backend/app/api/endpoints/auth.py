@@ -1,9 +1,11 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ...db.database import get_db
-from ...schemas.user import UserCreate, UserLogin, UserResponse, Token, PasswordChange, UserUpdate
+from ...core.exceptions import ServiceOverloadedError, NotFoundException, RateLimitedError
+from ...core.login_throttle import client_ip, login_throttle
+from ...db.database import get_async_db
+from ...schemas.user import UserCreate, UserLogin, UserResponse, Token, PasswordChange, UserUpdate, RefreshTokenRequest
 from ...models.user import User
 from ...repositories.auth_repository import AuthRepository
 from ...services.auth_service import AuthService
@@ -11,10 +13,26 @@ from ...api.dependencies import get_current_active_user
 
 router = APIRouter()
 
-def get_auth_service(db: Session = Depends(get_db)) -> AuthService:
+def get_auth_service(db: AsyncSession = Depends(get_async_db)) -> AuthService:
     repository = AuthRepository(db)
     return AuthService(repository)
 
+def server_busy(busy: ServiceOverloadedError) -> HTTPException:
+    """503 for requests shed because password hashing is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"Server busy ({busy.reason}), retry later",
+        headers={"Retry-After": str(busy.retry_after)}
+    )
+
+def too_many_attempts(limited: RateLimitedError) -> HTTPException:
+    """429 for login attempts over the per-IP or per-identifier limit"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many login attempts, retry later",
+        headers={"Retry-After": str(limited.retry_after)}
+    )
+
 @router.post(
     "/register",
     response_model=UserResponse,
@@ -70,6 +88,8 @@ async def register_user(
     """
     try:
         return await auth_service.create_user(user_data)
+    except ServiceOverloadedError as busy:
+        raise server_busy(busy)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -81,7 +101,7 @@ async def register_user(
     response_model=Token,
     summary="User Login",
     description="Authenticate user with email/phone and password to get access token.",
-    response_description="JWT access token for authentication",
+    response_description="JWT access token and refresh token for authentication",
     tags=["Authentication"],
     responses={
         200: {
@@ -90,7 +110,8 @@ async def register_user(
                 "application/json": {
                     "example": {
                         "access_token": "eyJ0eXAiOiJKV1QiLCJhbGc...",
-                        "token_type": "bearer"
+                        "token_type": "bearer",
+                        "refresh_token": "Yc8N2p0Zr5..."
                     }
                 }
             }
@@ -102,11 +123,20 @@ async def register_user(
                     "example": {"detail": "Incorrect email/phone or password"}
                 }
             }
+        },
+        429: {
+            "description": "Too many failed logins from this IP, or attempts for this account",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Too many login attempts, retry later"}
+                }
+            }
         }
     }
 )
 async def user_login(
     login_data: UserLogin,
+    request: Request,
     auth_service: AuthService = Depends(get_auth_service)
 ):
     """
@@ -119,24 +149,142 @@ async def user_login(
             - password: User's password
     
     Returns:
-        Token: JWT access token and type
+        Token: JWT access token, type and a refresh token for POST /auth/refresh
     
     Raises:
-        HTTPException: 401 if authentication fails
+        HTTPException: 401 if authentication fails, 429 (with Retry-After) if
+        the client IP has too many recent failed logins or the email/phone
+        too many recent attempts
     """
+    identifier = login_data.email or login_data.phone_number
+    ip = client_ip(request)
     try:
-        return await auth_service.authenticate_user(
+        # Before the user lookup and bcrypt, so throttled attempts cost almost nothing
+        await login_throttle.check(ip, identifier)
+        token = await auth_service.authenticate_user(
             email=login_data.email,
             phone_number=login_data.phone_number,
             password=login_data.password
         )
+        await login_throttle.reset(identifier)
+        return token
+    except RateLimitedError as limited:
+        raise too_many_attempts(limited)
+    except ServiceOverloadedError as busy:
+        raise server_busy(busy)
     except Exception as e:
         logging.error(f"Login error: {str(e)}")
+        await login_throttle.record_failure(ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email/phone or password"
         )
 
+@router.post(
+    "/refresh",
+    response_model=Token,
+    summary="Refresh Access Token",
+    description="Exchange a refresh token for a new access token and a new refresh token, without the password.",
+    response_description="New JWT access token and rotated refresh token",
+    tags=["Authentication"],
+    responses={
+        200: {
+            "description": "Tokens refreshed",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "access_token": "eyJ0eXAiOiJKV1QiLCJhbGc...",
+                        "token_type": "bearer",
+                        "refresh_token": "Qm4v7TfK1x..."
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Refresh token invalid, expired or already used",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid or expired refresh token"}
+                }
+            }
+        }
+    }
+)
+async def refresh_access_token(
+    refresh_data: RefreshTokenRequest,
+    auth_service: AuthService = Depends(get_auth_service)
+):
+    """
+    Rotate a refresh token.
+
+    Parameters:
+        refresh_data (RefreshTokenRequest):
+            - refresh_token: Token from login or the previous refresh
+
+    Returns:
+        Token: New access token and a new refresh token; the one sent is no longer valid
+
+    Raises:
+        HTTPException: 401 if the refresh token is invalid, expired or was already used.
+        Reusing a rotated token revokes every token issued since that login.
+    """
+    try:
+        return await auth_service.refresh_tokens(refresh_data.refresh_token)
+    except HTTPException:
+        raise
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token"
+        )
+    except Exception as e:
+        logging.error(f"Token refresh error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to refresh token"
+        )
+
+@router.post(
+    "/logout",
+    response_model=dict,
+    summary="Logout",
+    description="Revoke a refresh token along with every token rotated from the same login.",
+    response_description="Success message",
+    tags=["Authentication"],
+    responses={
+        200: {
+            "description": "Refresh token revoked",
+            "content": {
+                "application/json": {
+                    "example": {"message": "Logged out successfully"}
+                }
+            }
+        }
+    }
+)
+async def logout(
+    refresh_data: RefreshTokenRequest,
+    auth_service: AuthService = Depends(get_auth_service)
+):
+    """
+    Log out by revoking the refresh token.
+
+    Access tokens already issued stay valid until they expire
+    (ACCESS_TOKEN_EXPIRE_MINUTES); clients should discard theirs.
+
+    Returns:
+        dict: Success message, also for unknown tokens
+    """
+    try:
+        await auth_service.logout(refresh_data.refresh_token)
+        return {"message": "Logged out successfully"}
+    except Exception as e:
+        logging.error(f"Logout error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to log out"
+        )
+
 @router.post(
     "/change-password",
     response_model=dict,
@@ -189,6 +337,8 @@ async def change_password(
             new_password=password_data.new_password
         )
         return {"message": "Password updated successfully"}
+    except ServiceOverloadedError as busy:
+        raise server_busy(busy)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -321,7 +471,7 @@ async def get_current_user_details(
     }
 )
 async def get_all_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user),
     auth_service: AuthService = Depends(get_auth_service)
 ):
@@ -1,24 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ...db.session import get_db
+from ...db.database import get_async_db, read_session
 from ...core.auth import get_current_user
+from ...core.config import settings
+from ...core.http_cache import etag_matches
+from ...core.security import verify_payment_signature
 from ...schemas.billing import (
     BillingPlanResponse,
     CreditPurchaseRequest,
+    CreditTransactionListResponse,
     CreditTransactionResponse,
     UserCreditResponse
 )
-from ...repositories.billing_repository import BillingRepository
+from ...repositories.billing_repository import BillingRepository, decode_transaction_cursor, encode_transaction_cursor
 from ...services.billing_service import BillingService
+from ...services.plan_cache import plan_cache
+from ...services.webhook_inbox import SOURCE_RAZORPAY_CALLBACK, webhook_inbox
 
 router = APIRouter()
 
-def get_billing_service(db: Session = Depends(get_db)) -> BillingService:
+def get_billing_service(db: AsyncSession = Depends(get_async_db)) -> BillingService:
     repository = BillingRepository(db)
     return BillingService(repository)
 
+def plan_response(body: bytes, etag: str, if_none_match: Optional[str] = None) -> Response:
+    # public: plans are the same for every user; no-cache: clients revalidate with the ETag
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get(
     "/plans",
     response_model=List[BillingPlanResponse],
@@ -27,11 +40,13 @@ def get_billing_service(db: Session = Depends(get_db)) -> BillingService:
     response_description="List of billing plans with their complete details",
     tags=["Billing Plans"]
 )
-async def get_billing_plans(
-    billing_service: BillingService = Depends(get_billing_service)
-):
+async def get_billing_plans(request: Request):
     """
     Get all available billing plans.
+
+    Served from the per-worker plan cache, already serialized; the `ETag`
+    changes whenever a plan is edited, and a matching `If-None-Match`
+    returns 304 with no body.
     
     Returns:
         List[BillingPlanResponse]: A list of billing plans containing:
@@ -41,7 +56,8 @@ async def get_billing_plans(
         - price: Price in INR
         - description: Detailed plan description
     """
-    return await billing_service.get_all_plans()
+    catalog = await plan_cache.get()
+    return plan_response(catalog.list_body, catalog.list_etag, request.headers.get("if-none-match"))
 
 @router.get(
     "/plans/{plan_id}",
@@ -63,10 +79,10 @@ async def get_billing_plans(
 )
 async def get_plan_details(
     plan_id: str,
-    billing_service: BillingService = Depends(get_billing_service)
+    request: Request
 ):
     """
-    Get details for a specific plan.
+    Get details for a specific plan, from the plan cache like the list.
     
     Parameters:
         plan_id (str): The unique identifier of the billing plan
@@ -77,13 +93,14 @@ async def get_plan_details(
     Raises:
         HTTPException: 404 if plan is not found
     """
-    try:
-        return await billing_service.get_plan_by_id(plan_id)
-    except Exception as e:
+    catalog = await plan_cache.get()
+    body = catalog.plan_body(plan_id)
+    if body is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=str(e)
+            detail=f"Plan with id {plan_id} not found"
         )
+    return plan_response(body, catalog.plan_etag(plan_id), request.headers.get("if-none-match"))
 
 @router.post(
     "/purchase",
@@ -154,18 +171,80 @@ async def get_credit_balance(
     Returns:
         UserCreditResponse: Credit balance information containing:
             - user_id: ID of the user
-            - credits: Current credit balance
+            - credits_balance: Current credit balance
+            - credits_held: Credits reserved by jobs still running
+            - credits_available: Balance minus held credits, what a new job can use
             - last_updated: Timestamp of last balance update
     """
     return await billing_service.get_user_credits(current_user["id"])
 
+@router.get(
+    "/transactions",
+    response_model=CreditTransactionListResponse,
+    summary="Get Credit Transactions",
+    description="Retrieves a page of the authenticated user's credit purchases, newest first.",
+    response_description="One page of credit transactions and the cursor of the next page",
+    tags=["Credit Transactions"],
+    responses={
+        400: {
+            "description": "Invalid cursor",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid cursor: abc"}
+                }
+            }
+        }
+    }
+)
+async def get_credit_transactions(
+    limit: int = Query(settings.TRANSACTIONS_PAGE_SIZE, ge=1, le=settings.TRANSACTIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get the credit transaction history of the authenticated user, one page at a time.
+    
+    Parameters:
+        limit (int): Transactions per page
+        cursor (str): Pass the returned `next_cursor` back to get the next page; it is null on the last page
+        
+    Returns:
+        CreditTransactionListResponse: Transactions ordered from newest to oldest, and next_cursor
+        
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    try:
+        before = decode_transaction_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    async with read_session(current_user["id"]) as db:
+        transactions, has_more = await BillingRepository(db).get_user_transactions(current_user["id"], limit, before)
+        page = [CreditTransactionResponse.model_validate(transaction) for transaction in transactions]
+    
+    next_cursor = None
+    if has_more:
+        last = transactions[-1]
+        next_cursor = encode_transaction_cursor(last.created_at, last.id)
+    return CreditTransactionListResponse(transactions=page, next_cursor=next_cursor)
+
 @router.post(
     "/purchase/callback",
+    status_code=status.HTTP_202_ACCEPTED,
     summary="Razorpay Callback Handler",
-    description="Handles the payment callback from Razorpay after payment completion.",
-    response_description="Payment verification and credit allocation status",
+    description="Accepts the payment callback from Razorpay; credits are allocated shortly after by a background consumer.",
+    response_description="Whether the callback was accepted or had already been received",
     tags=["Payment Callbacks"],
     responses={
+        202: {
+            "description": "Callback stored for processing",
+            "content": {
+                "application/json": {
+                    "example": {"status": "accepted", "transaction_id": "txn_5f2c..."}
+                }
+            }
+        },
         400: {
             "description": "Invalid Payment",
             "content": {
@@ -180,7 +259,7 @@ async def razorpay_callback(
     transaction_id: str,
     razorpay_payment_id: str,
     razorpay_signature: str,
-    billing_service: BillingService = Depends(get_billing_service)
+    razorpay_order_id: str
 ):
     """
     Handle Razorpay payment callback.
@@ -189,40 +268,28 @@ async def razorpay_callback(
         transaction_id (str): Our internal transaction ID
         razorpay_payment_id (str): Payment ID from Razorpay
         razorpay_signature (str): Payment signature for verification
+        razorpay_order_id (str): Razorpay order ID the signature covers; must be the transaction's order
         
     Returns:
-        dict: Transaction completion status
+        dict: "accepted" if stored for processing, "duplicate" if this payment's callback was already received
         
     Raises:
         HTTPException: 400 if payment verification fails
     """
-    try:
-        # Verify the payment signature
-        is_valid = await billing_service.verify_payment(
-            razorpay_payment_id,
-            razorpay_signature
-        )
-        
-        if not is_valid:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid payment signature"
-            )
-        
-        # Complete the purchase
-        return await billing_service.complete_credit_purchase(
-            transaction_id=transaction_id,
-            razorpay_payment_id=razorpay_payment_id,
-            payment_status="completed"
-        )
-    except Exception as e:
-        # Mark transaction as failed
-        await billing_service.complete_credit_purchase(
-            transaction_id=transaction_id,
-            razorpay_payment_id=razorpay_payment_id,
-            payment_status="failed"
-        )
+    # Only the signature is checked here; the consumer checks that the signed order is this transaction's
+    # before updating the transaction and credits
+    if not verify_payment_signature(
+        f"{razorpay_order_id}|{razorpay_payment_id}".encode(), razorpay_signature, settings.RAZORPAY_KEY_SECRET
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            detail="Invalid payment signature"
         )
+    
+    accepted = await webhook_inbox.accept(
+        SOURCE_RAZORPAY_CALLBACK,
+        razorpay_payment_id,
+        "payment.callback",
+        {"transaction_id": transaction_id, "razorpay_payment_id": razorpay_payment_id, "razorpay_order_id": razorpay_order_id}
+    )
+    return {"status": "accepted" if accepted else "duplicate", "transaction_id": transaction_id}
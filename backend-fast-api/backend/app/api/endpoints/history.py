@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import logging
 
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.http_cache import etag_matches, negotiate_encoding, variant_etag
 from app.api import models
-from app.schemas import HistoryListItem, HistoryDetail, HistoryListResponse
+from app.repositories.history_repository import HistoryRepository, decode_history_cursor, encode_history_cursor
+from app.schemas import HistoryListItem, HistoryDetail, HistoryListResponse, HistorySearchResponse
+from app.services.history_cache import CachedHistory, history_cache, history_etag
 # from app.core.security import get_current_user # Remove incorrect import
-from app.api.dependencies import get_current_active_user # Import the correct dependency
+from app.api.dependencies import get_current_active_user, get_user_read_db # Import the correct dependency
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -21,28 +28,59 @@ router = APIRouter()
     "/", 
     response_model=HistoryListResponse, 
     summary="Get User History List",
-    description="Retrieves a list of processed PDF history items for the current user, ordered by creation date."
+    description="Retrieves a page of processed PDF history items for the current user, ordered by creation date."
 )
-def get_history_list(
-    db: Session = Depends(get_db),
+async def get_history_list(
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_user_read_db),
     current_user: models.User = Depends(get_current_active_user) # Use the correct dependency
 ):
     """
-    Fetches the processing history for the logged-in user.
+    Fetches the processing history for the logged-in user, one page at a time.
     
     - **Requires authentication.**
-    - Returns a list containing ID, PDF name, title, and creation date for each history item.
+    - Returns ID, PDF name, title, and creation date for each history item (no result body).
     - Items are ordered from newest to oldest.
+    - Pass the returned `next_cursor` back as `cursor` to get the next page; it is null on the last page.
     """
-    # Log the user ID being used for the query
-    print(f"Fetching history for User ID: {current_user.id}") 
+    try:
+        before = decode_history_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    history_items = db.query(models.History)\
-                      .filter(models.History.user_id == current_user.id)\
-                      .order_by(models.History.created_at.desc())\
-                      .all()
-    print(f"History items: {history_items}")
-    return HistoryListResponse(history=history_items)
+    history_items, has_more = await HistoryRepository(db).get_user_history(current_user.id, limit, before)
+    logger.debug("Fetched %d history items for User ID: %s", len(history_items), current_user.id)
+    
+    next_cursor = None
+    if has_more:
+        last = history_items[-1]
+        next_cursor = encode_history_cursor(last.created_at, last.id)
+    return HistoryListResponse(history=history_items, next_cursor=next_cursor)
+
+@router.get(
+    "/search",
+    response_model=HistorySearchResponse,
+    summary="Search User History",
+    description="Full-text search over the titles and results of the current user's history, best match first."
+)
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for"),
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_user_read_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Searches the logged-in user's history.
+
+    - **Requires authentication.**
+    - Matches words in the title and the generated result using the database's full-text index.
+    - An item matches if it contains any of the words; items matching more of them rank higher.
+      `AND`, `OR` and `NOT` are not operators and are ignored when written in capitals.
+    - Each hit includes a relevance score and a snippet with matches wrapped in `<mark>` tags.
+    """
+    results = await HistoryRepository(db).search_user_history(current_user.id, q, limit)
+    return HistorySearchResponse(query=q, results=results)
 
 @router.get(
     "/{history_id}", 
@@ -50,9 +88,10 @@ def get_history_list(
     summary="Get History Item Detail",
     description="Retrieves the full details, including the generated result, for a specific history item."
 )
-def get_history_detail(
+async def get_history_detail(
     history_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_user_read_db),
     current_user: models.User = Depends(get_current_active_user) # Use the correct dependency
 ):
     """
@@ -61,12 +100,45 @@ def get_history_detail(
     - **Requires authentication.**
     - Ensures the requested item belongs to the current user.
     - Returns full details including the generated Markdown result.
+    - Sends an `ETag`; repeating the request with `If-None-Match` returns 304 with no body if unchanged.
+    - Large bodies are compressed (brotli or gzip) per `Accept-Encoding`.
     """
-    history_item = db.query(models.History)\
-                     .filter(models.History.id == history_id, models.History.user_id == current_user.id)\
-                     .first()
-                     
-    if not history_item:
-        raise HTTPException(status_code=404, detail="History item not found or not owned by user")
+    if_none_match = request.headers.get("if-none-match")
+    repository = HistoryRepository(db)
+    cached = history_cache.get(current_user.id, history_id)
+    
+    if cached is None:
+        if if_none_match:
+            # Revalidation: answer from id and created_at alone, without loading the result
+            version = await repository.get_user_history_version(history_id, current_user.id)
+            if not version:
+                raise HTTPException(status_code=404, detail="History item not found or not owned by user")
+            etag = history_etag(version.id, version.created_at)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
         
-    return history_item 
\ No newline at end of file
+        history_item = await repository.get_user_history_item(history_id, current_user.id)
+        if not history_item:
+            raise HTTPException(status_code=404, detail="History item not found or not owned by user")
+        
+        body = HistoryDetail.model_validate(history_item).model_dump_json().encode()
+        cached = history_cache.put(current_user.id, history_id, CachedHistory(
+            history_etag(history_item.id, history_item.created_at), body, history_item.expires_at
+        ))
+    elif etag_matches(if_none_match, cached.etag):
+        return not_modified(cached.etag)
+    
+    encoding = None
+    if len(cached.body) >= settings.HISTORY_COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = cache_headers(variant_etag(cached.etag, encoding))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=cached.encoded(encoding), media_type="application/json", headers=headers)
+
+def cache_headers(etag: str) -> dict:
+    # private: per-user data; no-cache: clients may store it but must revalidate with the ETag
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
\ No newline at end of file
@@ -0,0 +1,159 @@
+from fastapi import APIRouter
+
+from app.core.scheduler import job_scheduler
+from app.core.admission import admission_controller
+from app.core.password_hashing import password_hash_pool
+from app.core.login_throttle import login_throttle
+from app.services.plan_cache import plan_cache
+from app.services.webhook_inbox import webhook_inbox
+from app.db.database import async_engine, replica_engines, replica_router
+from app.db.pool import pool_stats
+
+router = APIRouter()
+
+@router.get(
+    "/scheduler",
+    summary="Job Scheduler Statistics",
+    description="Current queue depth per tier, running jobs and per-tier wait-time histograms.",
+    response_description="Scheduler statistics used to verify the paid-tier SLO",
+    tags=["Metrics"]
+)
+async def get_scheduler_stats():
+    """
+    Get processing job scheduler statistics.
+
+    Returns:
+        dict: Scheduler state containing:
+        - running: Number of jobs currently holding a slot
+        - queued: Waiting jobs per tier
+        - tiers: Weight and cumulative wait-time histogram (seconds) per tier
+    """
+    return job_scheduler.stats()
+
+@router.get(
+    "/utilization",
+    summary="Processing Utilization",
+    description="Current usage of each admission control limit, for autoscaling decisions.",
+    response_description="Usage and limits for jobs, queue, upload bytes and websockets",
+    tags=["Metrics"]
+)
+async def get_utilization():
+    """
+    Get current processing utilization.
+
+    Returns:
+        dict: Usage against each admission limit containing:
+        - utilization: Ratio (0-1) of each limit in use
+        - saturation: Highest of those ratios, the suggested autoscaling signal
+        - rejections: Requests shed so far, by reason
+    """
+    return admission_controller.utilization()
+
+@router.get(
+    "/db-pool",
+    summary="Database Pool Statistics",
+    description="Occupancy, saturation and checkout wait-time histogram of each database connection pool.",
+    response_description="Per-pool connection usage and checkout metrics",
+    tags=["Metrics"]
+)
+async def get_db_pool_stats():
+    """
+    Get database connection pool statistics.
+
+    Returns:
+        dict: One entry per pool ("async" for the primary) containing:
+        - checked_out / idle / overflow: Current connection usage
+        - saturation: Checked-out connections over pool_size + max_overflow
+        - checkout_wait_seconds: Histogram of time spent waiting for a connection
+        - checkout_timeouts: Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS
+        - idle_pings / stale_connections: Idle-connection pings and how many found a dead connection
+        Read replica pools ("replica-N") are listed too, and "replicas" holds each one's lag and health.
+    """
+    stats = pool_stats(async_engine, *replica_engines)
+    if replica_engines:
+        stats["replicas"] = replica_router.status()
+    return stats
+
+@router.get(
+    "/password-hashing",
+    summary="Password Hashing Pool Statistics",
+    description="Queue depth, rejections and queue-wait/run-time histograms of the bcrypt executor.",
+    response_description="Password hashing executor usage and latency",
+    tags=["Metrics"]
+)
+async def get_password_hashing_stats():
+    """
+    Get password hashing executor statistics.
+
+    Returns:
+        dict: Executor state containing:
+        - running / waiting: Hash operations in progress and queued
+        - rejected: Requests shed because the queue was full
+        - queue_wait_seconds: Histogram of time spent waiting for a worker
+        - run_time_seconds: Histogram of bcrypt time per operation
+    """
+    return password_hash_pool.stats()
+
+@router.get(
+    "/login-throttle",
+    summary="Login Throttle Statistics",
+    description="Login attempts allowed and rejected by the per-IP and per-identifier limits.",
+    response_description="Login throttle counters and the bcrypt time they saved",
+    tags=["Metrics"]
+)
+async def get_login_throttle_stats():
+    """
+    Get login throttle statistics for this worker.
+
+    Returns:
+        dict: Throttle state containing:
+        - limits / window_seconds: Attempts allowed per IP and per identifier per window
+        - allowed: Attempts that went on to the user lookup and bcrypt
+        - rejected: Attempts answered with 429, by which limit they hit
+        - estimated_bcrypt_seconds_saved: Rejected attempts times the mean bcrypt verification time
+    """
+    stats = login_throttle.stats()
+    run_time = password_hash_pool.run_time
+    mean_hash_seconds = run_time.total / run_time.count if run_time.count else 0.0
+    stats["estimated_bcrypt_seconds_saved"] = round(sum(stats["rejected"].values()) * mean_hash_seconds, 3)
+    return stats
+
+@router.get(
+    "/plan-cache",
+    summary="Billing Plan Cache Statistics",
+    description="Catalog version this worker serves billing plans at, and how often it has reloaded them.",
+    response_description="Version, size and load count of the in-process plan cache",
+    tags=["Metrics"]
+)
+async def get_plan_cache_stats():
+    """
+    Get billing plan cache statistics.
+
+    Returns:
+        dict: Plan cache state containing:
+        - version: Catalog version currently cached (null before the first load)
+        - plans: Number of cached plans
+        - stale: Whether an edit is waiting to be reloaded
+        - loads: Times the catalog was read from the database
+    """
+    return plan_cache.stats()
+
+@router.get(
+    "/webhooks",
+    summary="Webhook Inbox Statistics",
+    description="Payment webhooks accepted, absorbed as duplicates and applied by this worker's consumer.",
+    response_description="Webhook inbox counters",
+    tags=["Metrics"]
+)
+async def get_webhook_stats():
+    """
+    Get payment webhook inbox statistics.
+
+    Returns:
+        dict: Inbox counters containing:
+        - accepted: Events stored in the inbox
+        - duplicates: Redeliveries dropped without writing
+        - processed / retried / failed: Outcomes of the consumer's attempts
+        - batches: Consumer transactions run
+    """
+    return webhook_inbox.stats()
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import hashlib
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.dependencies import get_current_active_user
 from app.api import models
-from app.db.database import get_db
+from app.core.config import settings
+from app.core.security import verify_payment_signature
+from app.db.database import get_async_db
+from app.services.webhook_inbox import SOURCE_RAZORPAY_WEBHOOK, webhook_inbox
 from pydantic import BaseModel
 from typing import Optional
 import uuid
@@ -84,7 +90,7 @@ class PaymentResponse(BaseModel):
 async def create_payment_session(
     payment_request: PaymentRequest,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a payment session for credit purchase.
@@ -165,7 +171,7 @@ async def create_payment_session(
 async def get_payment_status(
     payment_id: str,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get the current status of a payment transaction.
@@ -217,28 +223,37 @@ async def get_payment_status(
         }
     }
 )
-async def payment_webhook(
-    payload: dict,
-    db: Session = Depends(get_db)
-):
+async def payment_webhook(request: Request):
     """
     Handle payment webhook notifications from Razorpay.
     
     Parameters:
-        payload (dict): Webhook payload from Razorpay containing:
-            - event: Event type (payment.success, payment.failed, etc.)
-            - payment_id: Razorpay payment ID
-            - signature: Webhook signature for verification
+        request: Raw webhook body from Razorpay containing:
+            - event: Event type (payment.captured, payment.failed, etc.)
+            - payload.payment.entity: The payment, with its id and order_id
+        Headers:
+            - X-Razorpay-Signature: HMAC of the body with RAZORPAY_WEBHOOK_SECRET
+            - X-Razorpay-Event-Id: Event id, used to drop redeliveries
     
     Returns:
-        dict: Webhook processing acknowledgment
+        dict: Webhook processing acknowledgment, sent as soon as the event is stored
     
     Raises:
         HTTPException: 400 if webhook signature is invalid
     """
-    # In a real implementation, you would:
-    # 1. Verify the webhook signature
-    # 2. Parse the event type (payment succeeded, failed, etc.)
-    # 3. Update your database and trigger appropriate actions
+    body = await request.body()
+    if not verify_payment_signature(
+        body, request.headers.get("x-razorpay-signature"), settings.RAZORPAY_WEBHOOK_SECRET
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid webhook payload")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid webhook payload")
     
-    return {"status": "received"}
+    # Razorpay resends an event with the same id; without one, identical bodies count as the same event
+    event_id = request.headers.get("x-razorpay-event-id") or hashlib.sha256(body).hexdigest()
+    accepted = await webhook_inbox.accept(SOURCE_RAZORPAY_WEBHOOK, event_id, str(payload.get("event", "unknown"))[:64], payload)
+    return {"status": "received" if accepted else "duplicate"}
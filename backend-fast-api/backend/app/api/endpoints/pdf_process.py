@@ -1,100 +1,61 @@
 import os
 import time
 import tempfile
-import traceback
+import logging
 import asyncio
+import shutil
 from datetime import datetime
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, UploadFile, File, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, UploadFile, File, Form, Query, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select
 from app.core.config import settings
 from app.api import models
-from app.db.database import get_db
+from app.db.database import read_session
+from app.api.dependencies import get_current_active_user
+from app.core.scheduler import job_scheduler
+from app.core.admission import admission_controller
+from app.core.exceptions import CheckpointLostError, InsufficientCreditsError, ServiceOverloadedError, JobCancelledError
+from app.core.user_cache import user_cache
+from app.repositories.billing_repository import BillingRepository
+from app.services.billing_service import resolve_priority_tier
+from app.services.pdf_pipeline import (
+    CancelToken,
+    build_full_prompt,
+    create_pdf_record,
+    extract_text_sync,
+    generate_solution,
+    process_pdf_file,
+    stream_solution
+)
+from app.services.blob_store import blob_store
+from app.services.job_bookkeeping import bookkeeping_writer
+from app.services.credit_ledger import place_job_hold, release_job_hold
+from app.services.job_checkpoint import CheckpointWriter, create_job_output, discard_job_output
+from app.services.job_events import JobEventChannel, QueueChannel, WebSocketChannel, format_ndjson, format_sse
 from typing import List, Optional, Dict, Any
 from google import genai
 from google.genai import types
 import base64
-import fitz  # PyMuPDF
 import json
+
+logger = logging.getLogger(__name__)
+
 try:
     from jose import jwt, exceptions as jose_exceptions
 except ImportError:
     # For development only, if JWT package isn't available
     jwt = None
     jose_exceptions = None
-    print("WARNING: JWT package not installed, token validation will be mocked")
+    logger.warning("JWT package not installed, token validation will be mocked")
 
 router = APIRouter()
 
-# --- START: Synchronous Text Extraction Function ---
-def extract_text_sync(file_path: str) -> tuple[str, int]:
-    """Synchronous function to extract text using PyMuPDF."""
-    extracted_text = ""
-    page_count = 0
-    print(f"[extract_text_sync] Starting extraction for: {file_path}")
-    try:
-        # Verify the file is still accessible
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"[extract_text_sync] PDF file disappeared before extraction could start")
-        
-        # Log detailed information about the file
-        file_info = os.stat(file_path)
-        print(f"[extract_text_sync] File details: Size={file_info.st_size} bytes, Permissions={oct(file_info.st_mode)[-3:]}")
-        
-        # Open the PDF file with error diagnostics
-        try:
-            pdf_document = fitz.open(file_path)
-            page_count = len(pdf_document)
-            print(f"[extract_text_sync] PDF opened successfully: {page_count} pages")
-        except Exception as open_error:
-            raise ValueError(f"[extract_text_sync] Failed to open PDF document: {str(open_error)}")
-        
-        # Make sure we have a valid document
-        if not pdf_document:
-            raise ValueError("[extract_text_sync] PDF document is None or invalid")
-            
-        if page_count == 0:
-            raise ValueError("[extract_text_sync] PDF document has no pages")
-        
-        # Extract text from each page with individual page error handling
-        for page_num in range(page_count):
-            try:
-                page = pdf_document[page_num]
-                if not page:
-                    print(f"[extract_text_sync] Warning: Page {page_num + 1} is invalid, skipping")
-                    continue
-                    
-                page_text = page.get_text()
-                extracted_text += f"\n--- Page {page_num + 1} ---\n{page_text}"
-                
-                # Progress reporting for large documents (logged to server console)
-                if page_num % 5 == 0 or page_num == page_count - 1:
-                    print(f"[extract_text_sync] Processed page {page_num + 1} of {page_count}")
-                    
-            except Exception as page_error:
-                print(f"[extract_text_sync] Warning: Error on page {page_num + 1}: {str(page_error)}")
-                extracted_text += f"\n--- Page {page_num + 1} (Error: {str(page_error)}) ---\n"
-        
-        # Close the document
-        try:
-            pdf_document.close()
-            print("[extract_text_sync] PDF document closed properly")
-        except Exception as close_error:
-            print(f"[extract_text_sync] Warning when closing PDF: {str(close_error)}")
-        
-        # Check if we got any text
-        text_size = len(extracted_text)
-        if text_size == 0:
-            # Don't raise error here, let the main function decide
-            print("[extract_text_sync] Warning: No text could be extracted from the PDF")
-            
-        print(f"[extract_text_sync] Successfully extracted {text_size} characters from {page_count} pages")
-        return extracted_text, page_count
-        
-    except Exception as extract_error:
-        # Log the error and re-raise to be caught by the caller
-        print(f"[extract_text_sync] Error during extraction: {extract_error}")
-        raise ValueError(f"Error extracting PDF text: {str(extract_error)}")
-# --- END: Synchronous Text Extraction Function ---
+# Streaming modes of the REST /process endpoint and their media types
+STREAM_FORMATS = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
 
 def validate_token(token: str) -> Optional[Dict[str, Any]]:
     """
@@ -102,7 +63,7 @@ def validate_token(token: str) -> Optional[Dict[str, Any]]:
     """
     if jwt is None or jose_exceptions is None:
         # Mock validation for development if jwt package isn't available
-        print("Using MOCK token validation as jose package is missing")
+        logger.warning("Using MOCK token validation as jose package is missing")
         # Return a payload that likely matches a real user for testing
         return {"sub": "test@example.com", "exp": 1754911691} # Example: Use an email that might exist
             
@@ -113,7 +74,7 @@ def validate_token(token: str) -> Optional[Dict[str, Any]]:
         
     # Add a check/warning if the secret key seems like a fallback
     if secret_key == "development_secret_key":
-        print("WARNING: Using default/fallback secret key for token validation. Ensure SECRET_KEY is set in settings.")
+        logger.warning("Using default/fallback secret key for token validation. Ensure SECRET_KEY is set in settings.")
         # You might want to return None here in production if the key isn't properly configured
         # return None 
 
@@ -127,16 +88,76 @@ def validate_token(token: str) -> Optional[Dict[str, Any]]:
         return payload
     except jose_exceptions.JWTError as e: 
         # Catch specific JWT errors (like ExpiredSignatureError, JWTClaimsError, etc.)
-        print(f"Token validation failed (JWTError): {str(e)}")
+        logger.warning(f"Token validation failed (JWTError): {str(e)}")
         return None # Return None if validation fails
     except Exception as e:
         # Catch any other unexpected errors during decoding
-        print(f"An unexpected error occurred during token validation: {str(e)}")
+        logger.error(f"An unexpected error occurred during token validation: {str(e)}")
         return None # Return None for any other failure
 
-async def process_pdf_with_gemini(file_path: str, websocket: WebSocket, user_id: int, db: Session):
-    """Process a PDF with Gemini and stream results over websocket"""
-    pdf_record = None
+async def require_credits(user_id: int, jobs: int = 1) -> None:
+    """Fail fast with 402 if the user's available credits cannot cover ``jobs`` jobs; the holds enforce it"""
+    required = settings.JOB_CREDIT_COST * jobs
+    if required <= 0:
+        return
+    async with read_session(user_id) as db:
+        available = await BillingRepository(db).get_available_credits(user_id)
+    if available < required:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail=f"Insufficient credits. Required: {required}, Available: {available}"
+        )
+
+async def send_busy_frame(websocket: WebSocket, busy: ServiceOverloadedError):
+    """Tell the client the server is at capacity, then close the socket"""
+    try:
+        await websocket.send_text(json.dumps({
+            "type": "busy",
+            "reason": busy.reason,
+            "retry_after": busy.retry_after
+        }))
+        await websocket.close(code=1013)  # 1013: Try Again Later
+    except Exception:
+        logger.warning("Could not send busy frame to client, likely disconnected")
+
+async def watch_for_disconnect(websocket: WebSocket, cancel_token: CancelToken):
+    """
+    Return once the client disconnects or asks to cancel, triggering the cancel token.
+    
+    A client may cancel explicitly by sending "cancel" or {"type": "cancel"}.
+    Any other message received while processing is ignored.
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            logger.info("Client disconnected during processing, cancelling job")
+            break
+        text = (message.get("text") or "").strip()
+        if text == "cancel" or text.replace(" ", "") == '{"type":"cancel"}':
+            logger.info("Client requested cancellation")
+            break
+    cancel_token.cancel()
+
+async def process_pdf_with_gemini(
+    file_path: str,
+    channel: JobEventChannel,
+    user_id: int,
+    cancel_token: Optional[CancelToken] = None,
+    ref_book_path: Optional[str] = None
+):
+    """
+    Process a PDF with Gemini and stream results to the given event channel.
+
+    Each piece of DB work runs in its own short session scope, so a job holds a
+    pooled connection only while it touches the database, not while it streams.
+    The job's credits are held before it queues for a slot; completing spends
+    them, any other outcome releases them.
+    """
+    cancel_token = cancel_token or CancelToken()
+    pdf_id = None
+    job_ticket = None
+    checkpoint = None
+    credits_held = False
     try:
         # Validate the file exists
         if not os.path.exists(file_path):
@@ -147,48 +168,38 @@ async def process_pdf_with_gemini(file_path: str, websocket: WebSocket, user_id:
         if file_size == 0:
             raise ValueError("PDF file is empty (0 bytes)")
             
-        # Send plain text status
-        await websocket.send_text(f"[INFO] Found PDF file: {os.path.basename(file_path)} ({file_size} bytes)")
+        await channel.info(f"Found PDF file: {os.path.basename(file_path)} ({file_size} bytes)")
         
         # Check if user exists and create a dummy user if needed (for development)
         try:
-            # Check if the user exists
-            user = db.query(models.User).filter(models.User.id == user_id).first()
-            if not user:
-                await websocket.send_text("[INFO] Creating dummy user for development...")
-                # Create a dummy user for development purposes
-                dummy_user = models.User(
-                    id=user_id,
-                    email="dev@example.com",
-                    password="dummy_hash",
-                    is_active=True
-                )
-                db.add(dummy_user)
-                db.commit()
+            if await bookkeeping_writer.ensure_user(user_id):
+                await channel.info("Created dummy user for development.")
         except Exception as user_error:
-            # Send plain text warning
-            await websocket.send_text(f"[WARNING] Could not check/create user: {str(user_error)}")
+            await channel.warning(f"Could not check/create user: {str(user_error)}")
             # Continue without creating PDF record
             pass
         
         # Create a PDF record in database
         try:
-            pdf_record = models.PDF(
-                filename=os.path.basename(file_path),
-                user_id=user_id, 
-                status="processing"
-            )
-            db.add(pdf_record)
-            db.commit()
-            db.refresh(pdf_record)
+            pdf_id = await create_pdf_record(user_id, os.path.basename(file_path))
         except Exception as db_error:
-            # Send plain text warning
-            await websocket.send_text(f"[WARNING] Could not create PDF record: {str(db_error)}")
+            await channel.warning(f"Could not create PDF record: {str(db_error)}")
             # Continue without the record
-            pdf_record = None
+            pdf_id = None
         
-        # Send plain text status
-        await websocket.send_text("[INFO] Initializing PDF processing...")
+        # Reserve the job's credits; raises InsufficientCreditsError if the user cannot cover them
+        if pdf_id and settings.JOB_CREDIT_COST > 0:
+            await place_job_hold(user_id, pdf_id, settings.JOB_CREDIT_COST)
+            credits_held = True
+            await channel.info(f"Reserved {settings.JOB_CREDIT_COST} credit(s) for this job.")
+        
+        # Wait for a processing slot according to the user's plan tier
+        tier = await resolve_priority_tier(user_id, settings.JOB_CREDIT_COST if credits_held else 0)
+        await channel.info(f"Waiting for a processing slot ({tier} tier)...")
+        job_ticket = await job_scheduler.acquire(user_id, tier)
+        await channel.info(f"Processing slot acquired after {job_ticket.wait_time:.2f}s.")
+        
+        await channel.info("Initializing PDF processing...")
         
         # Initialize the API client
         api_key = settings.GEMINI_API_KEY
@@ -197,226 +208,206 @@ async def process_pdf_with_gemini(file_path: str, websocket: WebSocket, user_id:
         start_time = time.time()
         
         # --- START: Run Extraction in Thread --- 
-        # Send plain text status
-        await websocket.send_text("[INFO] Starting text extraction (in background thread)...")
+        await channel.info("Starting text extraction (in background thread)...")
         try:
             # Use asyncio.to_thread to run the sync function
-            extracted_text, page_count = await asyncio.to_thread(extract_text_sync, file_path)
+            extracted_text, page_count = await asyncio.to_thread(extract_text_sync, file_path, cancel_token)
             text_size = len(extracted_text)
-            # Send plain text status
-            await websocket.send_text(f"[INFO] Extraction complete: {text_size} chars, {page_count} pages.")
+            await channel.info(f"Extraction complete: {text_size} chars, {page_count} pages.")
             if text_size == 0:
                  raise ValueError("No text could be extracted from the PDF (post-thread).")
+        except JobCancelledError:
+            raise
         except Exception as thread_error:
             error_msg = f"Error during threaded text extraction: {str(thread_error)}"
-            # Send plain text error
-            await websocket.send_text(f"[ERROR] {error_msg}")
+            await channel.error(error_msg)
             # Re-raise to ensure the main try-except block catches it for cleanup/DB update
             raise ValueError(error_msg) 
         # --- END: Run Extraction in Thread --- 
+        
+        # The reference book is optional, so extraction failures only produce a warning
+        ref_book_text = ""
+        if ref_book_path:
+            try:
+                ref_book_text, ref_page_count = await asyncio.to_thread(extract_text_sync, ref_book_path, cancel_token)
+                await channel.info(f"Reference book extracted: {len(ref_book_text)} chars, {ref_page_count} pages.")
+            except JobCancelledError:
+                raise
+            except Exception as ref_error:
+                await channel.warning(f"Could not extract text from reference book: {str(ref_error)}")
 
         extraction_duration = time.time() - start_time
-        # Send plain text status
-        await websocket.send_text(f"[INFO] Extraction took {extraction_duration:.2f}s.")
-
-        # --- Prepare and run Gemini (mostly unchanged) --- 
-        prompt_text = f"""
-        You are an expert AI assistant specialized in analyzing PDF content and generating high-quality, well-structured **GitHub Flavored Markdown (GFM)** responses suitable for rendering in web applications.
-
-        **Task:** Analyze the provided PDF text and generate a detailed, accurate, and presentation-ready GFM response.
+        await channel.info(f"Extraction took {extraction_duration:.2f}s.")
 
-        **Formatting Guidelines (Strict):**
-
-        1.  **Overall Structure:** Format your entire response using standard GFM. Use headings (`#`, `##`), lists (`*`, `-`, `1.`), bold (`**...**`), italics (`*...*`), etc.
-        2.  **Content Identification:** Identify the type of content (e.g., academic questions, technical documentation, general text) and structure your response accordingly.
-        3.  **Academic Questions:** Label solutions clearly (e.g., using `## Question 1`, `### Part a)`). Provide step-by-step explanations where appropriate.
-        4.  **Mathematical Expressions (LaTeX):** CRITICAL: Use standard LaTeX delimiters ONLY:
-            *   Inline math: Use `$` followed by the LaTeX expression, followed by `$`. Example: `The formula is $E=mc^2$.`
-            *   Display math: Use `$$` followed by the LaTeX expression, followed by `$$`. Example: `$$
-            \\sum_{{i=1}}^n i = \\frac{{n(n+1)}}{{2}}
-            $$`
-        5.  **Code Snippets:** Use standard GFM fenced code blocks:
-            *   Start the block with three backticks followed by the language name (e.g., ```c, ```python).
-            *   Place ALL code lines within the fences.
-            *   End the block with three backticks on a new line.
-            *   Example:
-                ```python
-                def hello():
-                    print("Hello")
-                ```
-        6.  **Headings and Sections:** Use headings (`#`, `##`, etc.) logically to structure the content. Address distinct parts or questions separately.
-        7.  **Diagrams/Figures:** If the PDF contains visual elements you cannot reproduce, explicitly state this (e.g., `*Note: The original document included a diagram here illustrating...*`) and describe its likely content based on context.
-        8.  **Clarity:** Ensure explanations are clear, concise, and easy to follow.
-        9.  **Error Handling:** If parts of the input text are garbled or incomprehensible, indicate this clearly, perhaps using italics: `*Unclear or garbled text segment*`.
-
-        **Output:** Start your response directly with the main content, usually beginning with a `#` title appropriate for the document (e.g., `# Solutions for [Document Title]`). Do NOT output raw HTML tags.
-
-        **Input PDF Text:**
-        --- BEGIN PDF TEXT ---
-        {extracted_text}
-        --- END PDF TEXT ---
-        """
-        
-        # Configure generation settings
-        generate_config = types.GenerateContentConfig(
-            temperature=0.7,
-            top_p=0.95,
-            top_k=40,
-            max_output_tokens=4096,  # Increased token limit for longer responses
-            response_mime_type="text/plain",
-        )
-        
         # Generate solutions
-        # Send plain text status
-        await websocket.send_text("[INFO] Generating solutions...")
+        await channel.info("Generating solutions...")
         token_count = 0
         generation_start = time.time()
         
-        # Comment out the line sending the raw HTML div
-        # await websocket.send_text("\n<div class='solution-container'>")
-        await websocket.send_text("\n\n **Question Paper** \n\n")
+        await channel.emit("answer_start")
         
-        full_prompt = prompt_text + "\n\n" + extracted_text
+        full_prompt = build_full_prompt(extracted_text, ref_book_text)
         
-        await websocket.send_text("[INFO] Sending extracted PDF text to Gemini API...")
+        # Checkpoint the streamed answer so another worker can resume it if this one dies
+        if pdf_id:
+            try:
+                checkpoint = CheckpointWriter(
+                    await create_job_output(pdf_id, user_id, extracted_text, ref_book_text), pdf_id=pdf_id
+                )
+                # Keeps the job from looking abandoned while Gemini is silent
+                checkpoint.start_heartbeat()
+            except Exception as checkpoint_error:
+                logger.warning(f"Could not start checkpointing: {str(checkpoint_error)}")
+        
+        await channel.info("Sending extracted PDF text to Gemini API...")
         
         try:
-            # --- DEBUG: Message before starting stream --- 
-            # Send plain text debug message
-            await websocket.send_text("[DEBUG] Attempting to initiate Gemini stream...")
-            response_stream = client.models.generate_content_stream(
-                model="gemini-2.0-flash-lite",
-                contents=full_prompt,
-                config=generate_config
-            )
-            # --- DEBUG: Message after initiating stream --- 
-            # Send plain text debug message
-            await websocket.send_text("[DEBUG] Gemini stream initiated. Starting iteration...")
-            print("Starting to process Gemini response stream...")
+            await channel.debug("Attempting to initiate Gemini stream...")
+            response_stream = stream_solution(client, full_prompt)
+            await channel.debug("Gemini stream initiated. Starting iteration...")
+            logger.debug("Starting to process Gemini response stream...")
             store_text = ""
             first_chunk_received = False
-            for chunk in response_stream:
-                 # --- DEBUG: Message upon receiving any chunk --- 
+            async for chunk in response_stream:
+                 # Stop pulling from Gemini as soon as the job is cancelled
+                 cancel_token.raise_if_cancelled()
                  if not first_chunk_received:
-                     # Send plain text debug message
-                     await websocket.send_text("[DEBUG] Received first chunk from stream.")
+                     await channel.debug("Received first chunk from stream.")
                      first_chunk_received = True
                  
                  if hasattr(chunk, 'text') and chunk.text:
-                    # --- DEBUG: Explicit yield before sending --- 
-                    await asyncio.sleep(0)
-                    print(f"Sending chunk of size: {len(chunk.text)}")
+                    logger.debug("Sending chunk of size: %d", len(chunk.text))
                     store_text += chunk.text
-                    await websocket.send_text(chunk.text)
+                    await channel.delta(chunk.text)
+                    if checkpoint:
+                        await checkpoint.append(chunk.text)
                     # Estimate token count based on space-separated words if not provided
                     token_count += chunk.token_count if hasattr(chunk, 'token_count') and chunk.token_count else len(chunk.text.split())
                  else:
-                     print("Received empty or non-text chunk from Gemini API")
+                     logger.debug("Received empty or non-text chunk from Gemini API")
             
-            # --- DEBUG: Message after loop finishes --- 
-            # Send plain text debug message
-            await websocket.send_text("[DEBUG] Finished iterating Gemini stream.")
-            print("Finished processing Gemini response stream.")
+            if checkpoint:
+                await checkpoint.flush()
+                checkpoint.stop_heartbeat()
+            await channel.debug("Finished iterating Gemini stream.")
+            logger.debug("Finished processing Gemini response stream.")
             # Ensure store_text is not None before printing
             if store_text:
-                print(f"Final store_text length: {len(store_text)}") 
+                logger.debug("Final store_text length: %d", len(store_text))
             else:
-                print("Final store_text is None or empty.")
+                logger.debug("Final store_text is None or empty.")
                 store_text = "" # Ensure store_text is an empty string if nothing was received
             
+        except (JobCancelledError, CheckpointLostError):
+            raise
         except Exception as stream_error:
-            print(f"Error during content streaming: {str(stream_error)}")
-            print(f"Error type: {type(stream_error)}")
-            # Use traceback to print full stack trace
-            print(f"Error details: {traceback.format_exc()}") 
-            # Send plain text error
-            await websocket.send_text(f"[ERROR] Error during content generation: {str(stream_error)}")
+            # Logs the full stack trace along with the message
+            logger.exception(f"Error during content streaming ({type(stream_error).__name__}): {str(stream_error)}")
+            await channel.error(f"Error during content generation: {str(stream_error)}")
             raise
 
         generation_time = time.time() - generation_start
-        # Remove the closing div
-        # await websocket.send_text("</div>\n")
         
-        # Display metrics as Markdown
-        metrics_md = (
-            "\n### Metrics\n"
-            f"* Text Extraction Time: {extraction_duration:.2f} seconds\n"
-            f"* Generation Time: {generation_time:.2f} seconds\n"
-            f"* Estimated Tokens Used: {token_count}\n"
-            f"* Characters Extracted: {len(extracted_text)}\n"
+        await channel.emit(
+            "metrics",
+            extraction_time=extraction_duration,
+            generation_time=generation_time,
+            token_count=token_count,
+            question_paper_chars=len(extracted_text),
+            reference_book_chars=len(ref_book_text)
         )
-        await websocket.send_text(metrics_md)
         
-        # Update PDF record
-        if pdf_record:
+        # Update PDF record, save to history and drop checkpoints in one transaction
+        if pdf_id:
             try:
-                pdf_record.status = "completed"
-                pdf_record.processed_at = datetime.now()
-                db.commit()
-                db.refresh(pdf_record) # Refresh to get the latest state including created_at
-                 
-                # --- START: Save to History ---
-                if store_text: # Only save if we got a result
-                    try:
-                        # Create a title (e.g., first 100 chars, clean basic markdown)
-                        title_raw = store_text[:100].strip()
-                        # Basic cleanup: remove leading #, *, -, spaces
-                        title = title_raw.lstrip('#*-\\s ') 
-                        if not title: # Handle cases where the start is just markdown
-                            title = "Processed Content" 
-                            
-                        history_entry = models.History(
-                            user_id=user_id,
-                            pdf_name=pdf_record.filename,
-                            title=title,
-                            result=store_text,
-                            # created_at and expires_at are handled by __init__
-                        )
-                        db.add(history_entry)
-                        db.commit()
-                        # Log successful history save
-                        print(f"Successfully saved history entry ID: {history_entry.id} for User ID: {user_id}") 
-                        await websocket.send_text("[INFO] Result saved to history.")
-                    except Exception as history_error:
-                        print(f"Error saving to history: {str(history_error)}")
-                        await websocket.send_text(f"[WARNING] Could not save result to history: {str(history_error)}")
-                # --- END: Save to History ---
-
+                history_id = await bookkeeping_writer.complete_job(
+                    pdf_id,
+                    user_id,
+                    os.path.basename(file_path),
+                    store_text,
+                    checkpoint.job_output_id if checkpoint else None
+                )
+                # The checkpoints and held credits went with the completion, nothing left to discard
+                checkpoint = None
+                credits_held = False
+                if history_id:
+                    # Log successful history save
+                    logger.info(f"Successfully saved history entry ID: {history_id} for User ID: {user_id}")
+                    await channel.info("Result saved to history.")
             except Exception as update_error:
-                # Send plain text warning
-                await websocket.send_text(f"[WARNING] Could not update PDF record: {str(update_error)}")
+                logger.error(f"Error recording completed job: {str(update_error)}")
+                await channel.warning(f"Could not update PDF record or save result to history: {str(update_error)}")
         
-        # Send plain text completion message
-        await websocket.send_text("\n**Processing complete.**")
+        await channel.emit("complete", pdf_id=pdf_id)
         
+    except (asyncio.CancelledError, JobCancelledError) as cancellation:
+        logger.info(f"Processing cancelled for user {user_id}")
+        if pdf_id:
+            try:
+                await bookkeeping_writer.set_status(pdf_id, models.PDFStatus.CANCELLED)
+            except Exception as update_error:
+                logger.warning(f"Could not mark PDF record as cancelled: {str(update_error)}")
+        try:
+            # Only reaches clients that cancelled explicitly and are still connected
+            await channel.emit("cancelled")
+        except Exception:
+            pass
+        if isinstance(cancellation, asyncio.CancelledError):
+            raise
+    except CheckpointLostError:
+        # Another worker resumed the job; its checkpoints, credit hold and PDF record are that worker's now
+        logger.warning("Job for PDF %s was claimed by another worker, stopping here", pdf_id)
+        if checkpoint:
+            checkpoint.stop_heartbeat()
+        checkpoint = None
+        credits_held = False
+        await channel.warning("This job was taken over by another worker; the result will be saved to your history.")
     except Exception as e:
-        print(e)
+        logger.exception(f"Error processing PDF: {str(e)}")
         error_message = f"Error processing PDF: {str(e)}"
-        # Send plain text error
-        await websocket.send_text(f"[ERROR] {error_message}")
+        await channel.error(error_message)
         
         # Update PDF record with error status
-        if pdf_record:
+        if pdf_id:
             try:
-                pdf_record.status = "failed"
-                pdf_record.error_message = str(e)
-                db.commit()
+                await bookkeeping_writer.set_status(pdf_id, models.PDFStatus.FAILED, str(e))
             except Exception as update_error:
-                # Send plain text warning
-                await websocket.send_text(f"[WARNING] Could not update PDF record with error status: {str(update_error)}")
+                await channel.warning(f"Could not update PDF record with error status: {str(update_error)}")
             
     finally:
+        if checkpoint:
+            checkpoint.stop_heartbeat()
+        
+        # Free the processing slot for the next queued job
+        if job_ticket:
+            job_scheduler.release(job_ticket)
+        
+        # Failed, cancelled or its result could not be recorded: give the credits back
+        if credits_held:
+            try:
+                await asyncio.shield(release_job_hold(pdf_id))
+            except Exception as release_error:
+                logger.warning(f"Could not release held credits: {str(release_error)}")
+        
+        # The job finished, failed or was cancelled here, so nothing is left to resume.
+        # Shielded: a client disconnecting right after "complete" cancels this task,
+        # and a checkpoint left behind would be picked up by recovery and re-run.
+        if checkpoint:
+            try:
+                await asyncio.shield(discard_job_output(checkpoint.job_output_id))
+            except Exception as checkpoint_error:
+                logger.warning(f"Could not discard checkpoints: {str(checkpoint_error)}")
+        
         # Clean up temporary file
         if 'file_path' in locals() and file_path and file_path.startswith(tempfile.gettempdir()) and os.path.exists(file_path):
             try:
                 os.remove(file_path)
-                # Send plain text status
-                await websocket.send_text("[INFO] Temporary file cleaned up")
+                await channel.info("Temporary file cleaned up")
             except Exception as temp_cleanup_error:
-                print(f"Error cleaning up temp file: {temp_cleanup_error}")
+                logger.error(f"Error cleaning up temp file: {temp_cleanup_error}")
 
 @router.websocket("/ws/process")
-async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_db)):
+async def websocket_pdf_process(websocket: WebSocket):
     """
     WebSocket endpoint for real-time PDF processing.
     
@@ -447,6 +438,10 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
     - Invalid token: Connection closed with 401
     - Invalid file: Error message sent, connection remains open
     - Processing error: Error message sent, connection remains open
+    - Client disconnect or a "cancel" message: extraction and generation stop,
+      the PDF record is marked cancelled and the processing slot is freed
+    - Server at capacity: JSON frame {"type": "busy", "reason": "...", "retry_after": 30}
+      is sent and the connection is closed with code 1013
     
     Notes:
     - Keep connection alive for entire processing duration
@@ -457,6 +452,8 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
     temp_dir = None
     authenticated = False
     user_id = 1  # Default user ID
+    websocket_registered = False
+    upload_bytes = 0
     try:
         # Inform the client we're ready - plain text
         await websocket.send_text("[INFO] Connection established. Ready to receive files...")
@@ -465,7 +462,7 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
         try:
             # Receive initial message which might be JSON with token
             initial_data = await websocket.receive_text()
-            print(f"Received initial data: {initial_data}")
+            logger.debug("Received initial message (%d chars)", len(initial_data))
             
             # Try to parse as JSON
             try:
@@ -474,7 +471,7 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                 # Handle token if present
                 if "token" in json_data:
                     token = json_data["token"]
-                    print(f"Received authentication token: {token[:20]}...")
+                    logger.debug("Received authentication token")
                     
                     # Validate the token
                     payload = validate_token(token)
@@ -488,29 +485,35 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                             if user_identifier.isdigit():
                                 try:
                                     user_id_from_token = int(user_identifier)
-                                    db_user = db.query(models.User).filter(models.User.id == user_id_from_token).first()
-                                    print(f"Attempted lookup by ID: {user_id_from_token}")
+                                    db_user = user_cache.get(user_id_from_token)
+                                    if db_user is None:
+                                        async with read_session(user_id_from_token) as db:
+                                            db_user = await db.get(models.User, user_id_from_token)
+                                        if db_user is not None:
+                                            user_cache.put(db_user)
+                                    logger.debug("Attempted lookup by ID: %s", user_id_from_token)
                                 except ValueError:
-                                    print(f"Could not convert token subject '{user_identifier}' to integer ID.")
+                                    logger.warning(f"Could not convert token subject '{user_identifier}' to integer ID.")
                                     pass # Fall through to try email lookup
                             
                             # If not found by ID or identifier wasn't numeric, try by email
                             if not db_user:
-                                print(f"Attempting lookup by email: {user_identifier}")
-                                db_user = db.query(models.User).filter(models.User.email == user_identifier).first()
+                                logger.debug("Attempting lookup by email: %s", user_identifier)
+                                async with read_session() as db:
+                                    db_user = await db.scalar(select(models.User).where(models.User.email == user_identifier))
 
                             # Check if user was found by either method
                             if db_user:
                                 user_id = db_user.id # Use the actual ID from the database
-                                print(f"User identified from token: ID={user_id}, Identifier={user_identifier}")
+                                logger.debug("User identified from token: ID=%s, Identifier=%s", user_id, user_identifier)
                             else:
                                 # Handle case where token subject doesn't match a user by ID or email
-                                print(f"Warning: User with identifier '{user_identifier}' from token not found in DB by ID or email.")
+                                logger.warning(f"User with identifier '{user_identifier}' from token not found in DB by ID or email.")
                                 await websocket.send_text("[ERROR] User from token not found.")
                                 return # Or raise exception
                         else:
                              # Handle case where token has no 'sub'
-                             print("Warning: Token payload does not contain 'sub' identifier.")
+                             logger.warning("Token payload does not contain 'sub' identifier.")
                              await websocket.send_text("[ERROR] Invalid token payload (missing subject).")
                              return # Or raise exception
 
@@ -518,7 +521,7 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                         await websocket.send_text("[INFO] Authentication successful. Ready to receive PDF file.")
                         
                         # Based on the client script.js, we expect binary data next
-                        print("Authentication successful, expecting binary data next...")
+                        logger.debug("Authentication successful, expecting binary data next...")
                         message_type = "binary"
                     else:
                         # Send plain text error
@@ -535,13 +538,13 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                     message_type = "binary" 
             except json.JSONDecodeError:
                 # Not JSON, might be a message type indicator
-                print("Initial message is not JSON, treating as message type")
+                logger.debug("Initial message is not JSON, treating as message type")
                 message_type = initial_data
                 # Skip the auth requirement for now if not JSON
                 authenticated = True  # Allow non-token messages to proceed for backward compatibility
             
         except Exception as auth_error:
-            print(f"Error during authentication: {str(auth_error)}")
+            logger.error(f"Error during authentication: {str(auth_error)}")
             # Don't use initial_data as message_type directly as it could be a JSON string
             message_type = "binary"  # Default to binary for backward compatibility
             authenticated = True  # Allow non-token messages to proceed for backward compatibility
@@ -553,16 +556,21 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
             await websocket.send_text("[ERROR] Authentication failed")
             return
         
+        # Shed load before the client uploads anything
+        admission_controller.check_job_capacity()
+        admission_controller.open_websocket(user_id)
+        websocket_registered = True
+        
         # Create temporary directory
         temp_dir = tempfile.mkdtemp()
-        print(f"Created temporary directory: {temp_dir}")
+        logger.debug("Created temporary directory: %s", temp_dir)
         
         # Set directory permissions to ensure access
         try:
             os.chmod(temp_dir, 0o755)  # rwxr-xr-x
-            print(f"Set directory permissions for {temp_dir}")
+            logger.debug("Set directory permissions for %s", temp_dir)
         except Exception as perm_error:
-            print(f"Warning: Could not set directory permissions: {str(perm_error)}")
+            logger.warning(f"Could not set directory permissions: {str(perm_error)}")
         
         file_path = None
         
@@ -570,9 +578,9 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
         if message_type == "binary":
             # Receive binary data
             try:
-                print("Waiting for binary data...")
+                logger.debug("Waiting for binary data...")
                 data = await websocket.receive_bytes()
-                print(f"Received binary data: {len(data)} bytes")
+                logger.debug("Received binary data: %d bytes", len(data))
                 
                 # Save the received data as a temporary file
                 file_path = os.path.join(temp_dir, f"uploaded_{int(time.time())}.pdf")
@@ -582,14 +590,14 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                 # Set file permissions to ensure it's readable
                 try:
                     os.chmod(file_path, 0o644)  # rw-r--r--
-                    print(f"Set file permissions for {file_path}")
+                    logger.debug("Set file permissions for %s", file_path)
                 except Exception as perm_error:
-                    print(f"Warning: Could not set file permissions: {str(perm_error)}")
+                    logger.warning(f"Could not set file permissions: {str(perm_error)}")
                 
                 # Log the file reception - plain text
                 await websocket.send_text(f"[INFO] Received {len(data)} bytes of binary data")
             except Exception as bin_error:
-                print(f"Error receiving binary data: {str(bin_error)}")
+                logger.error(f"Error receiving binary data: {str(bin_error)}")
                 raise ValueError(f"Failed to receive binary data: {str(bin_error)}")
                 
         elif message_type == "base64":
@@ -611,14 +619,14 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                 # Set file permissions to ensure it's readable
                 try:
                     os.chmod(file_path, 0o644)  # rw-r--r--
-                    print(f"Set file permissions for {file_path}")
+                    logger.debug("Set file permissions for %s", file_path)
                 except Exception as perm_error:
-                    print(f"Warning: Could not set file permissions: {str(perm_error)}")
+                    logger.warning(f"Could not set file permissions: {str(perm_error)}")
                 
                 # Log the file reception - plain text
                 await websocket.send_text(f"[INFO] Received and decoded {len(data)} bytes from base64 data")
             except Exception as b64_error:
-                print(f"Error processing base64 data: {str(b64_error)}")
+                logger.error(f"Error processing base64 data: {str(b64_error)}")
                 raise ValueError(f"Failed to process base64 data: {str(b64_error)}")
         
         elif message_type in ["json", "json_with_file"] and 'json_content' in locals():
@@ -658,9 +666,9 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                     # Set file permissions to ensure it's readable
                     try:
                         os.chmod(file_path, 0o644)  # rw-r--r--
-                        print(f"Set file permissions for {file_path}")
+                        logger.debug("Set file permissions for %s", file_path)
                     except Exception as perm_error:
-                        print(f"Warning: Could not set file permissions: {str(perm_error)}")
+                        logger.warning(f"Could not set file permissions: {str(perm_error)}")
                     
                     # Send plain text status
                     await websocket.send_text(f"[INFO] Extracted and decoded {len(data)} bytes from JSON data")
@@ -693,7 +701,7 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
                     else:
                         raise ValueError(f"Unsupported message type: {next_message_type}. Expected 'binary' or 'base64'")
             except Exception as json_error:
-                print(f"Error processing JSON file data: {str(json_error)}")
+                logger.error(f"Error processing JSON file data: {str(json_error)}")
                 raise ValueError(f"Failed to process JSON file data: {str(json_error)}")
                 
         else:
@@ -701,32 +709,61 @@ async def websocket_pdf_process(websocket: WebSocket, db: Session = Depends(get_
         
         if not file_path or not os.path.exists(file_path):
             raise FileNotFoundError("No valid file was received or saved")
+        
+        # Hold the upload against the in-flight byte budget until processing ends
+        upload_bytes = admission_controller.reserve_upload(os.path.getsize(file_path))
             
         # Send plain text status
         await websocket.send_text(f"[INFO] File saved temporarily as: {os.path.basename(file_path)}")
         
-        # Process the PDF with Gemini (using text extraction)
-        await process_pdf_with_gemini(file_path, websocket, user_id, db)
+        # Process the PDF with Gemini (using text extraction), cancelling it
+        # as soon as the client disconnects instead of on the next failed send
+        cancel_token = CancelToken()
+        processing_task = asyncio.create_task(
+            process_pdf_with_gemini(file_path, WebSocketChannel(websocket), user_id, cancel_token)
+        )
+        disconnect_task = asyncio.create_task(watch_for_disconnect(websocket, cancel_token))
+        try:
+            done, _ = await asyncio.wait(
+                {processing_task, disconnect_task},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect_task in done:
+                processing_task.cancel()
+        finally:
+            # Also covers this handler being cancelled (e.g. server shutdown)
+            cancel_token.cancel()
+            disconnect_task.cancel()
+            processing_task.cancel()
+            await asyncio.gather(processing_task, disconnect_task, return_exceptions=True)
         
+    except ServiceOverloadedError as busy:
+        logger.warning(f"Rejecting websocket job, server busy: {busy.reason}")
+        await send_busy_frame(websocket, busy)
     except WebSocketDisconnect:
-        print("Client disconnected")
+        logger.info("Client disconnected")
     except Exception as e:
-        print(f"WebSocket error: {str(e)}")
+        logger.error(f"WebSocket error: {str(e)}")
         try:
             # Send plain text error
             await websocket.send_text(f"<div class='error'><p>Error: {str(e)}</p></div>")
             await websocket.send_text(f"[ERROR] Error: {str(e)}")
         except:
-            print("Could not send error message to client, likely disconnected")
+            logger.warning("Could not send error message to client, likely disconnected")
     finally:
+        # Return admission control reservations
+        if upload_bytes:
+            admission_controller.release_upload(upload_bytes)
+        if websocket_registered:
+            admission_controller.close_websocket(user_id)
+        
         # Clean up temporary directory if it exists
         if temp_dir and os.path.exists(temp_dir):
             try:
-                import shutil
                 shutil.rmtree(temp_dir)
-                print(f"Cleaned up temporary directory: {temp_dir}")
+                logger.debug("Cleaned up temporary directory: %s", temp_dir)
             except Exception as cleanup_error:
-                print(f"Error cleaning up temp directory: {cleanup_error}")
+                logger.error(f"Error cleaning up temp directory: {cleanup_error}")
 
 @router.websocket("/ws/simple_test")
 async def websocket_simple_test(websocket: WebSocket):
@@ -752,7 +789,7 @@ async def websocket_simple_test(websocket: WebSocket):
     No authentication required for this test endpoint.
     """
     await websocket.accept()
-    print("Client connected to /ws/simple_test")
+    logger.debug("Client connected to /ws/simple_test")
     try:
         # Send a few messages with delays
         await websocket.send_text("Message 1 received.\n")
@@ -767,11 +804,11 @@ async def websocket_simple_test(websocket: WebSocket):
         await websocket.send_text("Test complete. Closing connection.\n")
         
     except WebSocketDisconnect:
-        print("Client disconnected from /ws/simple_test")
+        logger.debug("Client disconnected from /ws/simple_test")
     except Exception as e:
-        print(f"Error in /ws/simple_test: {e}")
+        logger.error(f"Error in /ws/simple_test: {e}")
     finally:
-        print("Closing connection for /ws/simple_test")
+        logger.debug("Closing connection for /ws/simple_test")
         # Ensure connection is closed properly even on error
         await websocket.close()
 
@@ -783,6 +820,7 @@ async def websocket_simple_test(websocket: WebSocket):
     Process a question paper PDF using Gemini AI.
     Analyzes questions and provides answers using reference material if provided.
     Requires authentication and sufficient credits.
+    Pass `stream=sse` or `stream=ndjson` to receive progress, answer deltas and metrics as they happen.
     """,
     response_description="Processing job details and initial results",
     tags=["PDF Processing"],
@@ -799,6 +837,19 @@ async def websocket_simple_test(websocket: WebSocket):
                         "credits_used": 0,
                         "estimated_time": "2-3 minutes"
                     }
+                },
+                "text/event-stream": {
+                    "example": (
+                        'event: info\ndata: {"type": "info", "message": "Extraction complete: 5120 chars, 3 pages."}\n\n'
+                        'event: delta\ndata: {"type": "delta", "text": "## Question 1"}\n\n'
+                        'event: complete\ndata: {"type": "complete", "pdf_id": 42}\n\n'
+                    )
+                },
+                "application/x-ndjson": {
+                    "example": (
+                        '{"type": "delta", "text": "## Question 1"}\n'
+                        '{"type": "complete", "pdf_id": 42}\n'
+                    )
                 }
             }
         },
@@ -825,13 +876,21 @@ async def websocket_simple_test(websocket: WebSocket):
                     "example": {"detail": "Insufficient credits. Required: 10, Available: 5"}
                 }
             }
+        },
+        503: {
+            "description": "Server at capacity, retry after the number of seconds in the Retry-After header",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Server busy (job_queue_full), retry later"}
+                }
+            }
         }
     }
 )
 async def process_question_paper(
     file: UploadFile = File(...), 
     ref_book: UploadFile = None, 
-    db: Session = Depends(get_db)
+    stream: Optional[str] = Query(None, description="Stream events as 'sse' or 'ndjson' instead of returning one JSON result")
 ):
     """
     Process a question paper PDF using Gemini AI.
@@ -847,6 +906,11 @@ async def process_question_paper(
         - Format: PDF
         - Max size: 20MB
         - Used to provide more accurate answers
+    - **stream**: Optional streaming mode, `sse` or `ndjson`
+        - Runs the same pipeline as the WebSocket endpoint
+        - Events: info, warning, error, debug, answer_start, delta, metrics, complete, cancelled
+        - Idle streams receive a keep-alive (SSE comment or `{"type": "ping"}` line)
+        - Closing the connection cancels the job
 
     Returns:
     - **id**: Unique identifier for the processing job
@@ -863,13 +927,46 @@ async def process_question_paper(
     - 402: Insufficient credits
     - 422: Validation Error
     - 500: Processing Error
+    - 503: Server at capacity (see Retry-After header)
 
     Notes:
     - Processing may take a few minutes depending on the size of the files
+    - No database connection is held while the job waits, extracts or generates;
+      short sessions cover the PDF record insert and the final update
     - Each question processed consumes credits from the user's account
     - For real-time progress updates, use the WebSocket endpoint
     """
+    if stream and stream not in STREAM_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported stream format '{stream}', expected one of: {', '.join(STREAM_FORMATS)}"
+        )
+    
     temp_dir = None
+    job_ticket = None
+    pdf_id = None
+    credits_held = False
+    cancel_token = CancelToken()
+    
+    # Same default user as the processing below, until this endpoint is authenticated
+    await require_credits(1)
+    
+    # Shed load before doing any work for this request
+    try:
+        admission_controller.check_job_capacity()
+        upload_bytes = admission_controller.reserve_upload(
+            (file.size or 0) + ((ref_book.size or 0) if ref_book else 0)
+        )
+    except ServiceOverloadedError as busy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server busy ({busy.reason}), retry later",
+            headers={"Retry-After": str(busy.retry_after)}
+        )
+    
+    if stream:
+        return await stream_question_paper(file, ref_book, stream, upload_bytes)
+    
     try:
         # Initialize the API client
         api_key = settings.GEMINI_API_KEY
@@ -877,14 +974,14 @@ async def process_question_paper(
         
         # Save uploaded file to a temporary location
         temp_dir = tempfile.mkdtemp()
-        print(f"Created temporary directory: {temp_dir}")
+        logger.debug("Created temporary directory: %s", temp_dir)
         
         # Set directory permissions to ensure access
         try:
             os.chmod(temp_dir, 0o755)  # rwxr-xr-x
-            print(f"Set directory permissions for {temp_dir}")
+            logger.debug("Set directory permissions for %s", temp_dir)
         except Exception as perm_error:
-            print(f"Warning: Could not set directory permissions: {str(perm_error)}")
+            logger.warning("Could not set directory permissions: %s", perm_error)
             
         file_path = os.path.join(temp_dir, file.filename)
         with open(file_path, "wb") as temp_file:
@@ -893,9 +990,9 @@ async def process_question_paper(
         # Set file permissions to ensure it's readable
         try:
             os.chmod(file_path, 0o644)  # rw-r--r--
-            print(f"Set file permissions for {file_path}")
+            logger.debug("Set file permissions for %s", file_path)
         except Exception as perm_error:
-            print(f"Warning: Could not set file permissions: {str(perm_error)}")
+            logger.warning("Could not set file permissions: %s", perm_error)
         
         # Save reference book if provided
         ref_book_path = None
@@ -910,295 +1007,75 @@ async def process_question_paper(
         
         # Check if user exists and create a dummy user if needed (for development)
         try:
-            # Check if the user exists
-            user = db.query(models.User).filter(models.User.id == user_id).first()
-            if not user:
-                print("Creating dummy user for development...")
-                # Create a dummy user for development purposes
-                dummy_user = models.User(
-                    id=user_id,
-                    email="dev@example.com",
-                    password="dummy_hash",
-                    is_active=True
-                )
-                db.add(dummy_user)
-                db.commit()
+            if await bookkeeping_writer.ensure_user(user_id):
+                logger.info("Created dummy user for development")
         except Exception as user_error:
-            print(f"Warning: Could not check/create user: {str(user_error)}")
+            logger.warning("Could not check/create user: %s", user_error)
             # Continue without creating PDF record
             pass
         
         # Create a PDF record in database
-        pdf_record = None
+        pdf_id = None
         try:
-            pdf_record = models.PDF(
-                filename=file.filename,
-                user_id=user_id,
-                status="processing"
-            )
-            db.add(pdf_record)
-            db.commit()
-            db.refresh(pdf_record)
+            pdf_id = await create_pdf_record(user_id, file.filename)
         except Exception as db_error:
-            print(f"Warning: Could not create PDF record: {str(db_error)}")
+            logger.warning("Could not create PDF record: %s", db_error)
             # Continue without the record
         
-        # Extract text from main PDF using PyMuPDF
-        start_time = time.time()
-        extracted_text = ""
+        # Reserve the job's credits; raises InsufficientCreditsError if the user cannot cover them
+        if pdf_id and settings.JOB_CREDIT_COST > 0:
+            await place_job_hold(user_id, pdf_id, settings.JOB_CREDIT_COST)
+            credits_held = True
         
-        try:
-            # Verify the file is still accessible
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"PDF file disappeared before extraction could start")
-            
-            # Log detailed information about the file
-            file_info = os.stat(file_path)
-            print(f"File details: Size={file_info.st_size} bytes, Permissions={oct(file_info.st_mode)[-3:]}")
-            
-            # Open the PDF file with error diagnostics
-            try:
-                pdf_document = fitz.open(file_path)
-                print(f"PDF opened successfully: {len(pdf_document)} pages")
-            except Exception as open_error:
-                # More specific error for PDF opening failures
-                raise ValueError(f"Failed to open PDF document: {str(open_error)}")
-            
-            # Make sure we have a valid document
-            if not pdf_document:
-                raise ValueError("PDF document is None or invalid")
-                
-            if len(pdf_document) == 0:
-                raise ValueError("PDF document has no pages")
-            
-            # Extract text from each page with individual page error handling
-            page_count = len(pdf_document)
-            for page_num in range(page_count):
-                try:
-                    # Get the page with error checking
-                    page = pdf_document[page_num]
-                    if not page:
-                        print(f"Warning: Page {page_num + 1} is invalid, skipping")
-                        continue
-                        
-                    # Extract text with error checking
-                    page_text = page.get_text()
-                    extracted_text += f"\n--- Page {page_num + 1} ---\n{page_text}"
-                    
-                    # Progress reporting for large documents
-                    if page_num % 10 == 0 or page_num == page_count - 1:
-                        print(f"Processed page {page_num + 1} of {page_count}")
-                        
-                except Exception as page_error:
-                    # Don't fail the whole document for a single page error
-                    print(f"Error on page {page_num + 1}: {str(page_error)}")
-                    extracted_text += f"\n--- Page {page_num + 1} (Error: {str(page_error)}) ---\n"
-            
-            # Close the document in a try/finally to ensure it gets closed
-            try:
-                pdf_document.close()
-                print("PDF document closed properly")
-            except Exception as close_error:
-                print(f"Warning when closing PDF: {str(close_error)}")
-            
-            # Check if we got any text
-            text_size = len(extracted_text)
-            if text_size == 0:
-                raise ValueError("No text could be extracted from the PDF")
-                
-            print(f"Successfully extracted {text_size} characters from {page_count} pages")
-            
-        except Exception as extract_error:
-            # Provide detailed error information
-            raise ValueError(f"Error extracting PDF text: {str(extract_error)}")
+        # Wait for a processing slot according to the user's plan tier
+        tier = await resolve_priority_tier(user_id, settings.JOB_CREDIT_COST if credits_held else 0)
+        job_ticket = await job_scheduler.acquire(user_id, tier)
+        logger.info("Processing slot acquired for user %s (%s tier) after %.2fs", user_id, tier, job_ticket.wait_time)
+        
+        # Extract text from the main PDF in a worker thread, checking the cancel token between pages
+        start_time = time.time()
+        extracted_text, page_count = await asyncio.to_thread(extract_text_sync, file_path, cancel_token)
+        if not extracted_text:
+            raise ValueError("No text could be extracted from the PDF")
+        logger.info("Successfully extracted %d characters from %d pages", len(extracted_text), page_count)
         
-        # Extract text from reference book if provided
+        # The reference book is optional, so extraction failures only produce a warning
         if ref_book_path:
             try:
-                # Verify the file is still accessible
-                if not os.path.exists(ref_book_path):
-                    print(f"Warning: Reference book file disappeared before extraction could start")
-                    # Continue without reference book
-                else:
-                    # Log detailed information about the file
-                    file_info = os.stat(ref_book_path)
-                    print(f"Reference book details: Size={file_info.st_size} bytes, Permissions={oct(file_info.st_mode)[-3:]}")
-                    
-                    # Open the PDF file with error diagnostics
-                    try:
-                        ref_pdf_document = fitz.open(ref_book_path)
-                        print(f"Reference PDF opened successfully: {len(ref_pdf_document)} pages")
-                    except Exception as open_error:
-                        print(f"Warning: Failed to open reference PDF document: {str(open_error)}")
-                        # Continue without reference book
-                        ref_pdf_document = None
-                    
-                    if ref_pdf_document:
-                        # Make sure we have a valid document
-                        if len(ref_pdf_document) == 0:
-                            print("Warning: Reference PDF document has no pages")
-                        else:
-                            # Extract text from each page with individual page error handling
-                            page_count = len(ref_pdf_document)
-                            for page_num in range(page_count):
-                                try:
-                                    # Get the page with error checking
-                                    page = ref_pdf_document[page_num]
-                                    if not page:
-                                        print(f"Warning: Reference page {page_num + 1} is invalid, skipping")
-                                        continue
-                                        
-                                    # Extract text with error checking
-                                    page_text = page.get_text()
-                                    ref_book_text += f"\n--- Reference Page {page_num + 1} ---\n{page_text}"
-                                    
-                                    # Progress reporting for large documents
-                                    if page_num % 10 == 0 or page_num == page_count - 1:
-                                        print(f"Processed reference page {page_num + 1} of {page_count}")
-                                        
-                                except Exception as page_error:
-                                    # Don't fail the whole document for a single page error
-                                    print(f"Error on reference page {page_num + 1}: {str(page_error)}")
-                                    ref_book_text += f"\n--- Reference Page {page_num + 1} (Error: {str(page_error)}) ---\n"
-                            
-                            # Close the document in a try/finally to ensure it gets closed
-                            try:
-                                ref_pdf_document.close()
-                                print("Reference PDF document closed properly")
-                            except Exception as close_error:
-                                print(f"Warning when closing reference PDF: {str(close_error)}")
-                            
-                            # Check if we got any text
-                            text_size = len(ref_book_text)
-                            if text_size == 0:
-                                print("Warning: No text could be extracted from the reference PDF")
-                            else:
-                                print(f"Successfully extracted {text_size} characters from {page_count} reference pages")
-                
+                ref_book_text, ref_page_count = await asyncio.to_thread(extract_text_sync, ref_book_path, cancel_token)
+                logger.info("Successfully extracted %d characters from %d reference pages", len(ref_book_text), ref_page_count)
+            except JobCancelledError:
+                raise
             except Exception as ref_extract_error:
-                print(f"Warning: Could not extract text from reference book: {str(ref_extract_error)}")
+                logger.warning("Could not extract text from reference book: %s", ref_extract_error)
                 # Continue without reference book text
                 ref_book_text = ""
         
         extraction_time = time.time() - start_time
         
-        # Prepare prompt
-        prompt_text = f"""
-        You are an expert AI assistant specialized in analyzing PDF content and generating high-quality, well-structured **GitHub Flavored Markdown (GFM)** responses suitable for rendering in web applications.
-
-        **Task:** Analyze the provided PDF text and generate a detailed, accurate, and presentation-ready GFM response.
-
-        **Formatting Guidelines (Strict):**
-
-        1.  **Overall Structure:** Format your entire response using standard GFM. Use headings (`#`, `##`), lists (`*`, `-`, `1.`), bold (`**...**`), italics (`*...*`), etc.
-        2.  **Content Identification:** Identify the type of content (e.g., academic questions, technical documentation, general text) and structure your response accordingly.
-        3.  **Academic Questions:** Label solutions clearly (e.g., using `## Question 1`, `### Part a)`). Provide step-by-step explanations where appropriate.
-        4.  **Mathematical Expressions (LaTeX):** CRITICAL: Use standard LaTeX delimiters ONLY:
-            *   Inline math: Use `$` followed by the LaTeX expression, followed by `$`. Example: `The formula is $E=mc^2$.`
-            *   Display math: Use `$$` followed by the LaTeX expression, followed by `$$`. Example: `$$
-            \\sum_{{i=1}}^n i = \\frac{{n(n+1)}}{{2}}
-            $$`
-        5.  **Code Snippets:** Use standard GFM fenced code blocks:
-            *   Start the block with three backticks followed by the language name (e.g., ```c, ```python).
-            *   Place ALL code lines within the fences.
-            *   End the block with three backticks on a new line.
-            *   Example:
-                ```python
-                def hello():
-                    print("Hello")
-                ```
-        6.  **Headings and Sections:** Use headings (`#`, `##`, etc.) logically to structure the content. Address distinct parts or questions separately.
-        7.  **Diagrams/Figures:** If the PDF contains visual elements you cannot reproduce, explicitly state this (e.g., `*Note: The original document included a diagram here illustrating...*`) and describe its likely content based on context.
-        8.  **Clarity:** Ensure explanations are clear, concise, and easy to follow.
-        9.  **Error Handling:** If parts of the input text are garbled or incomprehensible, indicate this clearly, perhaps using italics: `*Unclear or garbled text segment*`.
-
-        **Output:** Start your response directly with the main content, usually beginning with a `#` title appropriate for the document (e.g., `# Solutions for [Document Title]`). Do NOT output raw HTML tags.
-
-        **Input PDF Text:**
-        --- BEGIN PDF TEXT ---
-        {extracted_text}
-        --- END PDF TEXT ---
-        """
-        
-        # Add reference book text to the prompt if available
-        if ref_book_text:
-            prompt_text += """
-            
-            I've also provided a reference book that you should use to ensure your solutions are accurate and aligned with the course material. Here is the extracted text from the reference book:
-            """
-        
-        # Configure generation settings
-        generate_config = types.GenerateContentConfig(
-            temperature=0.7,
-            top_p=0.95,
-            top_k=40,
-            max_output_tokens=4096,  # Increased token limit for longer responses
-            response_mime_type="text/plain",
-        )
-        
-        # Generate solutions
-        token_count = 0
+        # Generate solutions without blocking the event loop
         generation_start = time.time()
         
-        # Combine prompts and extracted text
-        full_prompt = prompt_text + "\n\n" + extracted_text
-        if ref_book_text:
-            full_prompt += "\n\n" + ref_book_text
-        
-        # Generate content with the text prompt
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-lite",
-            contents=full_prompt,
-            config=generate_config,
-        )
-        response_text = response.text
-        token_count += response.token_count if hasattr(response, 'token_count') else len(response.text.split())
+        # Combine prompts and extracted text (and reference book text if available)
+        full_prompt = build_full_prompt(extracted_text, ref_book_text)
+        response_text, token_count = await generate_solution(client, full_prompt)
         
         generation_time = time.time() - generation_start
         
-        # Update PDF record
-        if pdf_record:
+        # Update PDF record, save to history and spend the held credits in one transaction
+        if pdf_id:
             try:
-                pdf_record.status = "completed"
-                pdf_record.processed_at = datetime.now()
-                db.commit()
-                db.refresh(pdf_record) # Refresh to get the latest state including created_at
-                 
-                # --- START: Save to History ---
-                if response_text: # Only save if we got a result
-                    try:
-                        # Create a title (e.g., first 100 chars, clean basic markdown)
-                        title_raw = response_text[:100].strip()
-                        # Basic cleanup: remove leading #, *, -, spaces
-                        title = title_raw.lstrip('#*-\\s ') 
-                        if not title: # Handle cases where the start is just markdown
-                            title = "Processed Content" 
-                            
-                        history_entry = models.History(
-                            user_id=user_id,
-                            pdf_name=pdf_record.filename,
-                            title=title,
-                            result=response_text,
-                            # created_at and expires_at are handled by __init__
-                        )
-                        db.add(history_entry)
-                        db.commit()
-                        # Log successful history save
-                        print(f"Successfully saved history entry ID: {history_entry.id} for User ID: {user_id}") 
-                        await websocket.send_text("[INFO] Result saved to history.")
-                    except Exception as history_error:
-                        print(f"Error saving to history: {str(history_error)}")
-                        await websocket.send_text(f"[WARNING] Could not save result to history: {str(history_error)}")
-                # --- END: Save to History ---
-
+                history_id = await bookkeeping_writer.complete_job(pdf_id, user_id, file.filename, response_text)
+                credits_held = False
+                if history_id:
+                    logger.info("Successfully saved history entry ID: %s for User ID: %s", history_id, user_id)
             except Exception as update_error:
-                # Send plain text warning
-                await websocket.send_text(f"[WARNING] Could not update PDF record: {str(update_error)}")
+                logger.error("Could not update PDF record or save result to history: %s", update_error)
         
         # Return results
         return {
             "message": "PDF processed successfully",
-            "pdf_id": pdf_record.id if pdf_record else None,
+            "pdf_id": pdf_id,
             "solutions": response_text,
             "metrics": {
                 "extraction_time": extraction_time,
@@ -1209,29 +1086,303 @@ async def process_question_paper(
             }
         }
     
+    except InsufficientCreditsError as short:
+        # Another job spent or held the credits after the up-front check
+        try:
+            await bookkeeping_writer.set_status(pdf_id, models.PDFStatus.FAILED, str(short))
+        except Exception as update_error:
+            logger.warning("Could not update PDF record with error status: %s", update_error)
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=str(short))
     except Exception as e:
-        print(e)
+        logger.exception("Error processing PDF: %s", e)
         # Update PDF record with error if it exists
-        if 'pdf_record' in locals() and pdf_record:
+        if pdf_id:
             try:
-                pdf_record.status = "failed"
-                pdf_record.error_message = str(e)
-                db.commit()
+                await bookkeeping_writer.set_status(pdf_id, models.PDFStatus.FAILED, str(e))
             except Exception as update_error:
-                print(f"Warning: Could not update PDF record with error status: {str(update_error)}")
+                logger.warning("Could not update PDF record with error status: %s", update_error)
         
-        # Clean up temporary directory if it exists
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing PDF: {str(e)}"
+        )
+    finally:
+        # Clean up the uploaded files whether the job succeeded or not
         if temp_dir and os.path.exists(temp_dir):
             try:
-                import shutil
                 shutil.rmtree(temp_dir)
             except Exception as cleanup_error:
-                print(f"Error cleaning up temp directory: {cleanup_error}")
-        
+                logger.error("Error cleaning up temp directory: %s", cleanup_error)
+        # Stops an extraction thread still running if the request was cancelled
+        cancel_token.cancel()
+        # Free the processing slot for the next queued job
+        if job_ticket:
+            job_scheduler.release(job_ticket)
+        # Failed, cancelled or its result could not be recorded: give the credits back
+        if credits_held:
+            try:
+                await asyncio.shield(release_job_hold(pdf_id))
+            except Exception as release_error:
+                logger.warning(f"Could not release held credits: {str(release_error)}")
+        admission_controller.release_upload(upload_bytes)
+
+async def stream_question_paper(
+    file: UploadFile,
+    ref_book: Optional[UploadFile],
+    stream_format: str,
+    upload_bytes: int
+) -> StreamingResponse:
+    """
+    Run the WebSocket processing pipeline for an HTTP request and stream its events.
+
+    The pipeline runs in a task that feeds a QueueChannel; the response drains it
+    as SSE frames or NDJSON lines. If the client goes away the job is cancelled.
+    """
+    temp_dir = tempfile.mkdtemp()
+
+    def cleanup():
+        admission_controller.release_upload(upload_bytes)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    try:
+        file_path = os.path.join(temp_dir, os.path.basename(file.filename or "question_paper.pdf"))
+        with open(file_path, "wb") as temp_file:
+            temp_file.write(await file.read())
+        ref_book_path = None
+        if ref_book:
+            ref_book_path = os.path.join(temp_dir, "ref_" + os.path.basename(ref_book.filename or "reference.pdf"))
+            with open(ref_book_path, "wb") as temp_ref_file:
+                temp_ref_file.write(await ref_book.read())
+    except Exception as e:
+        cleanup()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing PDF: {str(e)}"
+            detail=f"Error saving uploaded PDF: {str(e)}"
+        )
+
+    # Default user ID, should be obtained from auth (same as the non-streaming mode)
+    user_id = 1
+    formatter = format_sse if stream_format == "sse" else format_ndjson
+
+    async def event_stream():
+        channel = QueueChannel()
+        cancel_token = CancelToken()
+
+        async def run_pipeline():
+            try:
+                await process_pdf_with_gemini(file_path, channel, user_id, cancel_token, ref_book_path)
+            finally:
+                channel.close()
+
+        processing_task = asyncio.create_task(run_pipeline())
+        try:
+            async for event in channel.events(settings.STREAM_KEEPALIVE_SECONDS):
+                yield formatter(event)
+        finally:
+            # Stream finished or the client disconnected; stop any work still running
+            cancel_token.cancel()
+            processing_task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type=STREAM_FORMATS[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(cleanup)
+    )
+
+@router.post(
+    "/blobs",
+    summary="Upload PDF Blob",
+    description="Store a PDF for later processing and return a reference usable with the batch endpoint.",
+    response_description="Blob reference for the uploaded PDF",
+    tags=["PDF Processing"],
+    responses={
+        200: {
+            "description": "Blob stored",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "blob_id": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                        "file_name": "question_paper.pdf",
+                        "size": 482133
+                    }
+                }
+            }
+        }
+    }
+)
+async def upload_pdf_blob(
+    file: UploadFile = File(...),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Upload a PDF without processing it.
+
+    Blobs are content-addressed (SHA-256), so uploading the same file again
+    returns the same blob_id without storing a second copy.
+    """
+    data = await file.read()
+    if not data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded file is empty"
+        )
+    blob_id = await asyncio.to_thread(blob_store.put, current_user.id, data)
+    return {"blob_id": blob_id, "file_name": file.filename, "size": len(data)}
+
+@router.post(
+    "/batch",
+    summary="Process Question Papers in Batch",
+    description="""
+    Process many question paper PDFs in one request.
+    Accepts uploaded files and/or blob_ids of previously uploaded PDFs and
+    streams one NDJSON line per file as each one finishes.
+    """,
+    response_description="NDJSON stream of per-file results followed by a summary line",
+    tags=["PDF Processing"],
+    responses={
+        200: {
+            "description": "Per-file results streamed as they complete",
+            "content": {
+                "application/x-ndjson": {
+                    "example": (
+                        '{"type": "result", "file_name": "paper1.pdf", "blob_id": "9f86...", "status": "completed", "pdf_id": 12, "history_id": 40, "duplicate_of": null, "solutions": "# Solutions...", "metrics": {}}\n'
+                        '{"type": "summary", "total": 1, "unique": 1, "completed": 1, "failed": 0}\n'
+                    )
+                }
+            }
+        },
+        400: {"description": "No files given or too many files"},
+        402: {"description": "Available credits do not cover one job per unique file"},
+        503: {"description": "Server at capacity, see Retry-After header"}
+    }
+)
+async def process_batch(
+    files: List[UploadFile] = File(None),
+    blob_ids: List[str] = Form(None),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Process a batch of question paper PDFs.
+
+    Parameters:
+    - **files**: Question paper PDF files (optional, repeatable)
+    - **blob_ids**: References returned by /blobs (optional, repeatable)
+
+    Identical files within the batch are processed once; their other entries
+    are reported with `duplicate_of` set to the file name that was processed.
+    Files run concurrently, bounded by BATCH_MAX_CONCURRENCY and the job scheduler.
+    """
+    files = files or []
+    blob_ids = blob_ids or []
+    total = len(files) + len(blob_ids)
+    if total == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide at least one file or blob_id"
+        )
+    if total > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many files in batch. Maximum: {settings.BATCH_MAX_FILES}"
+        )
+
+    user_id = current_user.id
+    upload_bytes = 0
+    try:
+        admission_controller.check_job_capacity()
+        upload_bytes = admission_controller.reserve_upload(sum(upload.size or 0 for upload in files))
+    except ServiceOverloadedError as busy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server busy ({busy.reason}), retry later",
+            headers={"Retry-After": str(busy.retry_after)}
         )
 
+    # Resolve every entry to a stored blob, grouping identical content
+    unique_blobs: Dict[str, List[str]] = {}
+    missing: List[Dict[str, Any]] = []
+    try:
+        for upload in files:
+            data = await upload.read()
+            blob_id = await asyncio.to_thread(blob_store.put, user_id, data)
+            unique_blobs.setdefault(blob_id, []).append(upload.filename)
+        for blob_id in blob_ids:
+            if blob_store.path(user_id, blob_id):
+                unique_blobs.setdefault(blob_id, []).append(f"{blob_id}.pdf")
+            else:
+                missing.append({
+                    "type": "result",
+                    "file_name": None,
+                    "blob_id": blob_id,
+                    "status": "failed",
+                    "error": "Blob not found"
+                })
+    except Exception:
+        admission_controller.release_upload(upload_bytes)
+        raise
 
+    # Each unique file is one job; duplicates are not charged twice
+    try:
+        await require_credits(user_id, len(unique_blobs))
+    except HTTPException:
+        admission_controller.release_upload(upload_bytes)
+        raise
+
+    tier = await resolve_priority_tier(user_id)
+
+    batch_semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    cancel_token = CancelToken()
+
+    async def process_unique_blob(blob_id: str, file_names: List[str]):
+        async with batch_semaphore:
+            async with job_scheduler.slot(user_id, tier):
+                try:
+                    result = await process_pdf_file(
+                        blob_store.path(user_id, blob_id), file_names[0], user_id, client, cancel_token
+                    )
+                    return blob_id, file_names, {"status": "completed", **result}
+                except Exception as e:
+                    logger.error(f"Batch item {file_names[0]} failed: {str(e)}")
+                    return blob_id, file_names, {"status": "failed", "error": str(e)}
+
+    async def stream_results():
+        tasks = [
+            asyncio.create_task(process_unique_blob(blob_id, file_names))
+            for blob_id, file_names in unique_blobs.items()
+        ]
+        completed = failed = 0
+        try:
+            for line in missing:
+                failed += 1
+                yield json.dumps(line) + "\n"
+            for next_finished in asyncio.as_completed(tasks):
+                blob_id, file_names, outcome = await next_finished
+                for index, file_name in enumerate(file_names):
+                    if outcome["status"] == "completed":
+                        completed += 1
+                    else:
+                        failed += 1
+                    yield json.dumps({
+                        "type": "result",
+                        "file_name": file_name,
+                        "blob_id": blob_id,
+                        "duplicate_of": file_names[0] if index else None,
+                        **outcome
+                    }, default=str) + "\n"
+            yield json.dumps({
+                "type": "summary",
+                "total": total,
+                "unique": len(unique_blobs),
+                "completed": completed,
+                "failed": failed
+            }) + "\n"
+        finally:
+            # Client went away or stream finished: stop outstanding work
+            cancel_token.cancel()
+            for task in tasks:
+                task.cancel()
+            admission_controller.release_upload(upload_bytes)
 
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
@@ -2,6 +2,13 @@
 from app.models.user import User
 from app.models.pdf import PDF, PDFStatus
 from app.models.history import History
+from app.models.job_output import JobOutput, JobOutputChunk
+from app.models.replication import ReplicationHeartbeat
+from app.models.refresh_token import RefreshToken
+from app.models.cache_version import CacheVersion
+from app.models.webhook import WebhookEvent
+from app.models.billing import BillingPlan, UserCredit, CreditTransaction, CreditLedgerEntry, CreditHold
 
 # Re-export the models
-__all__ = ['User', 'PDF', 'PDFStatus', 'History']
+__all__ = ['User', 'PDF', 'PDFStatus', 'History', 'JobOutput', 'JobOutputChunk', 'ReplicationHeartbeat', 'RefreshToken', 'CacheVersion', 'WebhookEvent',
+           'BillingPlan', 'UserCredit', 'CreditTransaction', 'CreditLedgerEntry', 'CreditHold']
@@ -0,0 +1,105 @@
+import logging
+from collections import Counter
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedError
+from app.core.scheduler import JobScheduler, job_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    Load shedding in front of the job scheduler.
+
+    Rejects new work once the scheduler queue is full, a user has too many
+    processing websockets open, or too many upload bytes are held in flight,
+    so a burst degrades into fast 503s instead of slowing every running job.
+    All bookkeeping is synchronous, so a check and the reservation that follows
+    it cannot interleave with another request on the event loop.
+    """
+
+    def __init__(
+        self,
+        scheduler: JobScheduler,
+        max_queued_jobs: int,
+        max_websockets_per_user: int,
+        max_inflight_upload_bytes: int,
+        retry_after_seconds: int,
+    ):
+        self.scheduler = scheduler
+        self.max_queued_jobs = max_queued_jobs
+        self.max_websockets_per_user = max_websockets_per_user
+        self.max_inflight_upload_bytes = max_inflight_upload_bytes
+        self.retry_after_seconds = retry_after_seconds
+        self._websockets_per_user: Counter = Counter()
+        self._inflight_upload_bytes = 0
+        self._rejections: Counter = Counter()
+
+    @classmethod
+    def from_settings(cls, scheduler: JobScheduler) -> "AdmissionController":
+        return cls(
+            scheduler=scheduler,
+            max_queued_jobs=settings.ADMISSION_MAX_QUEUED_JOBS,
+            max_websockets_per_user=settings.ADMISSION_MAX_WEBSOCKETS_PER_USER,
+            max_inflight_upload_bytes=settings.ADMISSION_MAX_INFLIGHT_UPLOAD_BYTES,
+            retry_after_seconds=settings.ADMISSION_RETRY_AFTER_SECONDS,
+        )
+
+    def _reject(self, reason: str) -> None:
+        self._rejections[reason] += 1
+        logger.warning(f"Admission rejected: {reason}")
+        raise ServiceOverloadedError(reason, self.retry_after_seconds)
+
+    def check_job_capacity(self) -> None:
+        """Reject a new job when every slot is busy and the queue is full"""
+        if (
+            self.scheduler.running >= self.scheduler.max_concurrent
+            and self.scheduler.queued >= self.max_queued_jobs
+        ):
+            self._reject("job_queue_full")
+
+    def reserve_upload(self, num_bytes: int) -> int:
+        """Account for an upload held in memory/disk until release_upload is called"""
+        if self._inflight_upload_bytes + num_bytes > self.max_inflight_upload_bytes:
+            self._reject("upload_bytes_exceeded")
+        self._inflight_upload_bytes += num_bytes
+        return num_bytes
+
+    def release_upload(self, num_bytes: int) -> None:
+        self._inflight_upload_bytes = max(0, self._inflight_upload_bytes - num_bytes)
+
+    def open_websocket(self, user_id: int) -> None:
+        if self._websockets_per_user[user_id] >= self.max_websockets_per_user:
+            self._reject("too_many_websockets")
+        self._websockets_per_user[user_id] += 1
+
+    def close_websocket(self, user_id: int) -> None:
+        self._websockets_per_user[user_id] -= 1
+        if self._websockets_per_user[user_id] <= 0:
+            del self._websockets_per_user[user_id]
+
+    def utilization(self) -> Dict[str, Any]:
+        """Current usage against each limit; ``saturation`` is the highest ratio"""
+        ratios = {
+            "jobs": self.scheduler.running / self.scheduler.max_concurrent,
+            "queue": self.scheduler.queued / max(1, self.max_queued_jobs),
+            "upload_bytes": self._inflight_upload_bytes / max(1, self.max_inflight_upload_bytes),
+        }
+        return {
+            "running_jobs": self.scheduler.running,
+            "max_concurrent_jobs": self.scheduler.max_concurrent,
+            "queued_jobs": self.scheduler.queued,
+            "max_queued_jobs": self.max_queued_jobs,
+            "inflight_upload_bytes": self._inflight_upload_bytes,
+            "max_inflight_upload_bytes": self.max_inflight_upload_bytes,
+            "open_websockets": sum(self._websockets_per_user.values()),
+            "max_websockets_per_user": self.max_websockets_per_user,
+            "rejections": dict(self._rejections),
+            "utilization": {name: round(ratio, 3) for name, ratio in ratios.items()},
+            "saturation": round(max(ratios.values()), 3),
+        }
+
+
+admission_controller = AdmissionController.from_settings(job_scheduler)
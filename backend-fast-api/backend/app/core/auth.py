@@ -18,6 +18,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-        return {"id": user_id}
-    except JWTError:
+        # users.id is an integer, and so are the user_id columns of the billing tables
+        return {"id": int(user_id)}
+    except (JWTError, ValueError):
         raise credentials_exception 
\ No newline at end of file
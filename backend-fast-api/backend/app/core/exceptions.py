@@ -8,4 +8,33 @@ class DatabaseError(Exception):
 
 class NotFoundException(Exception):
     """Raised when requested resource is not found"""
-    pass 
\ No newline at end of file
+    pass
+
+class InsufficientCreditsError(Exception):
+    """Raised when a user's available credits do not cover a job's cost"""
+    def __init__(self, required: int, available: int):
+        super().__init__(f"Insufficient credits. Required: {required}, Available: {available}")
+        self.required = required
+        self.available = available
+
+class ServiceOverloadedError(Exception):
+    """Raised when admission control rejects work because the server is at capacity"""
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class RateLimitedError(Exception):
+    """Raised when a client has used up its attempts for the current rate-limit window"""
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class JobCancelledError(Exception):
+    """Raised inside a processing job once its cancel token has been triggered"""
+    pass
+
+class CheckpointLostError(Exception):
+    """Raised when another worker has claimed a job this worker was still running"""
+    pass
@@ -0,0 +1,145 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else was passed through ``extra`` and is emitted as a field
+RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def parse_sample_rates(raw: str) -> Dict[str, float]:
+    """Parse "logger:rate" pairs such as "app.api.endpoints.pdf_process:0.1" into a dict"""
+    rates: Dict[str, float] = {}
+    for pair in raw.split(","):
+        if not pair.strip():
+            continue
+        name, _, rate = pair.rpartition(":")
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, ``extra`` fields and any traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the DEBUG and INFO records of chosen loggers.
+
+    A rate set for "app.api" also applies to "app.api.endpoints.history"
+    unless that logger has its own. Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+        self.dropped = 0
+
+    def rate_for(self, name: str) -> float:
+        if name not in self._resolved:
+            prefix = name
+            while prefix and prefix not in self.rates:
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = self.rates.get(prefix, 1.0)
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class InProcessQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread with only the message merged.
+
+    The stock prepare() formats the whole record, traceback included, on
+    the calling thread so it can be pickled; the queue never leaves this
+    process, so formatting is left to the listener and only the arguments
+    are resolved here (they may be mutated after the call returns).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+sampling_filter = SamplingFilter({})
+
+
+def setup_logging() -> QueueListener:
+    """
+    Route all logging through a queue so handlers write from a background thread.
+
+    The root logger gets a single QueueHandler (replacing any handlers set
+    up earlier); a QueueListener thread owns the real stdout handler. Safe
+    to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    sampling_filter.rates = parse_sample_rates(settings.LOG_SAMPLE_RATES)
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = InProcessQueueHandler(log_queue)
+    # Filter before enqueueing, so sampled-out records cost nothing on the listener thread
+    queue_handler.addFilter(sampling_filter)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    # Disable noisy logs
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    logging.getLogger("sqlalchemy.pool").setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # The listener thread is a daemon; drain the queue on exit so the last records are not lost
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush what is still queued and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
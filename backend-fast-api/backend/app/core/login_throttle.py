@@ -0,0 +1,261 @@
+import ipaddress
+import logging
+import math
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from cachetools import TTLCache
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.exceptions import RateLimitedError
+from app.core.phone import normalize_phone
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Optional: only needed for LOGIN_THROTTLE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def parse_trusted_proxies(raw: str) -> List[Any]:
+    """Networks of the proxies allowed to set X-Forwarded-For, from a comma separated list of IPs/CIDRs"""
+    return [ipaddress.ip_network(entry.strip(), strict=False) for entry in raw.split(",") if entry.strip()]
+
+
+TRUSTED_PROXIES = parse_trusted_proxies(settings.TRUSTED_PROXIES)
+
+
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    Address of the client behind any trusted proxies.
+
+    X-Forwarded-For is read right to left, skipping trusted proxies; the
+    first address that is not one is the client. Hops left of it could be
+    forged by the client, and the header is ignored entirely unless the
+    connection itself comes from a trusted proxy.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None or not is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+class MemoryRateLimitBackend:
+    """
+    Sliding-window log of attempt times per key, local to this worker.
+
+    Keys idle for a whole window drop out of the TTLCache on their own, and
+    at most ``max_keys`` are tracked, so a spray of random identifiers
+    cannot grow memory without bound.
+    """
+
+    def __init__(self, max_keys: int, window_seconds: float):
+        self._attempts = TTLCache(maxsize=max_keys, ttl=window_seconds)
+
+    def _window(self, key: str, now: float, window_seconds: float) -> deque:
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            attempts = deque()
+        while attempts and attempts[0] <= now - window_seconds:
+            attempts.popleft()
+        return attempts
+
+    async def peek(self, key: str, limit: int, window_seconds: float) -> float:
+        now = time.monotonic()
+        attempts = self._window(key, now, window_seconds)
+        if len(attempts) >= limit:
+            return attempts[0] + window_seconds - now
+        return 0.0
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> float:
+        now = time.monotonic()
+        attempts = self._window(key, now, window_seconds)
+        if len(attempts) >= limit:
+            return attempts[0] + window_seconds - now
+        attempts.append(now)
+        # Re-inserting refreshes the key's TTL to a full window after its latest attempt
+        self._attempts[key] = attempts
+        return 0.0
+
+    async def record(self, key: str, window_seconds: float) -> None:
+        now = time.monotonic()
+        attempts = self._window(key, now, window_seconds)
+        attempts.append(now)
+        self._attempts[key] = attempts
+
+    async def reset(self, key: str) -> None:
+        self._attempts.pop(key, None)
+
+
+# Trim, count and record in one round trip so concurrent workers cannot both take the last slot
+_REDIS_HIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return tostring(tonumber(oldest[2]) + window - now)
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+return '0'
+"""
+
+# Same check without recording anything
+_REDIS_PEEK_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return tostring(tonumber(oldest[2]) + window - now)
+end
+return '0'
+"""
+
+
+class RedisRateLimitBackend:
+    """Sliding-window log kept in a Redis sorted set per key, shared by every worker"""
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("LOGIN_THROTTLE_BACKEND=redis needs the 'redis' package (pip install .[rate-limit])")
+        self._client = redis.from_url(url)
+        self._hit = self._client.register_script(_REDIS_HIT_SCRIPT)
+        self._peek = self._client.register_script(_REDIS_PEEK_SCRIPT)
+
+    async def peek(self, key: str, limit: int, window_seconds: float) -> float:
+        retry_after = await self._peek(keys=[key], args=[time.time(), window_seconds, limit])
+        return float(retry_after)
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> float:
+        retry_after = await self._hit(keys=[key], args=[time.time(), window_seconds, limit, uuid.uuid4().hex])
+        return float(retry_after)
+
+    async def record(self, key: str, window_seconds: float) -> None:
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zadd(key, {uuid.uuid4().hex: time.time()})
+            pipe.pexpire(key, math.ceil(window_seconds * 1000))
+            await pipe.execute()
+
+    async def reset(self, key: str) -> None:
+        await self._client.delete(key)
+
+
+class LoginThrottle:
+    """
+    Caps failed logins per client IP and attempts per email/phone before any work is done.
+
+    Both limits are sliding windows of ``window_seconds``: the IP limit slows
+    down credential stuffing from one source, the identifier limit guessing
+    at one account from many. Only failures (record_failure) count against
+    an IP, so many users behind one NAT or proxy can all log in; every
+    attempt counts against an identifier until it logs in (reset). Over-limit
+    attempts raise RateLimitedError and never reach the user lookup or
+    bcrypt. If the backend fails, logins are let through rather than locking
+    everyone out.
+    """
+
+    def __init__(self, backend: Any, window_seconds: float, ip_limit: int, identifier_limit: int):
+        self.backend = backend
+        self.window_seconds = window_seconds
+        self.limits = {"ip": ip_limit, "identifier": identifier_limit}
+        self.allowed = 0
+        self.rejected = {"ip": 0, "identifier": 0}
+        self.backend_errors = 0
+
+    @classmethod
+    def from_settings(cls) -> "LoginThrottle":
+        if settings.LOGIN_THROTTLE_BACKEND == "redis":
+            backend = RedisRateLimitBackend(settings.LOGIN_THROTTLE_REDIS_URL)
+        else:
+            backend = MemoryRateLimitBackend(settings.LOGIN_THROTTLE_MAX_KEYS, settings.LOGIN_THROTTLE_WINDOW_SECONDS)
+        return cls(
+            backend=backend,
+            window_seconds=settings.LOGIN_THROTTLE_WINDOW_SECONDS,
+            ip_limit=settings.LOGIN_THROTTLE_IP_LIMIT,
+            identifier_limit=settings.LOGIN_THROTTLE_IDENTIFIER_LIMIT
+        )
+
+    @staticmethod
+    def _key(scope: str, value: str) -> str:
+        value = value.strip().lower()
+        if scope == "identifier" and "@" not in value:
+            # Every spelling of a phone number that logs in to one account shares one budget
+            value = normalize_phone(value) or value
+        return f"login-throttle:{scope}:{value}"
+
+    async def check(self, ip: Optional[str], identifier: Optional[str]) -> None:
+        """
+        Raise RateLimitedError if the IP or identifier is over its limit.
+
+        Records the attempt against the identifier; the IP is only read here
+        and charged by record_failure once the credentials turn out wrong.
+        """
+        for scope, value in (("ip", ip), ("identifier", identifier)):
+            limit = self.limits[scope]
+            if not value or limit <= 0:
+                continue
+            key = self._key(scope, value)
+            try:
+                if scope == "ip":
+                    retry_after = await self.backend.peek(key, limit, self.window_seconds)
+                else:
+                    retry_after = await self.backend.hit(key, limit, self.window_seconds)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"Login throttle backend error, allowing attempt: {str(e)}")
+                continue
+            if retry_after > 0:
+                self.rejected[scope] += 1
+                raise RateLimitedError(f"login_{scope}", max(1, math.ceil(retry_after)))
+        self.allowed += 1
+
+    async def record_failure(self, ip: Optional[str]) -> None:
+        """Count a failed login against the client IP"""
+        if not ip or self.limits["ip"] <= 0:
+            return
+        try:
+            await self.backend.record(self._key("ip", ip), self.window_seconds)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"Login throttle backend error on record: {str(e)}")
+
+    async def reset(self, identifier: Optional[str]) -> None:
+        """Forget an identifier's attempts after it logs in successfully"""
+        if not identifier:
+            return
+        try:
+            await self.backend.reset(self._key("identifier", identifier))
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"Login throttle backend error on reset: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "window_seconds": self.window_seconds,
+            "limits": dict(self.limits),
+            "allowed": self.allowed,
+            "rejected": dict(self.rejected),
+            "backend_errors": self.backend_errors,
+        }
+
+
+login_throttle = LoginThrottle.from_settings()
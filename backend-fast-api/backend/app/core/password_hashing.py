@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedError
+from app.core.scheduler import WaitTimeHistogram
+from app.core.security import get_password_hash, verify_password
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the queue-wait and run-time histogram buckets
+HASH_TIME_BUCKETS = (0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+class PasswordHashPool:
+    """
+    Runs bcrypt hashing and verification off the event loop on a bounded executor.
+
+    At most ``max_workers`` operations run at once; further ones wait their
+    turn, and once ``max_queue`` are waiting new requests are rejected with
+    ServiceOverloadedError instead of piling up. A "thread" executor is
+    enough because bcrypt releases the GIL while hashing; "process" isolates
+    the work completely at the cost of pickling each call.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, kind: str = "thread", retry_after_seconds: int = 1):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {kind}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self.retry_after_seconds = retry_after_seconds
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self.queue_wait = WaitTimeHistogram(HASH_TIME_BUCKETS)
+        self.run_time = WaitTimeHistogram(HASH_TIME_BUCKETS)
+
+    @classmethod
+    def from_settings(cls) -> "PasswordHashPool":
+        return cls(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+            kind=settings.PASSWORD_HASH_EXECUTOR
+        )
+
+    def _get_executor(self) -> Executor:
+        # Created on first use so importing the app never starts worker processes
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ServiceOverloadedError("password_hash_queue", self.retry_after_seconds)
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.queue_wait.observe(started - queued_at)
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.running -= 1
+            self.run_time.observe(time.perf_counter() - started)
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        """bcrypt hash of ``password``"""
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Whether ``plain_password`` matches ``hashed_password``"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "run_time_seconds": self.run_time.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hash_pool = PasswordHashPool.from_settings()
@@ -0,0 +1,46 @@
+from typing import Optional
+
+import phonenumbers
+
+from app.core.config import settings
+
+
+def clean_phone_number(raw: str) -> str:
+    """Digits of a user-typed phone number, keeping a leading '+' that marks it as international"""
+    raw = raw.strip()
+    digits = "".join(filter(str.isdigit, raw))
+    return f"+{digits}" if raw.startswith("+") and digits else digits
+
+
+def normalize_phone(raw: Optional[str], default_region: Optional[str] = None) -> Optional[str]:
+    """
+    E.164 form ("+919876543210") of a phone number, the key stored in users.phone_e164.
+
+    Numbers with a '+' or '00' prefix are read as international; bare digits
+    are tried as a national number of ``default_region`` first and then as
+    international digits whose '+' was dropped. Numbers that do not validate
+    either way still map to a stable "+<digits>" key, so the same input
+    always finds the same row.
+    """
+    if not raw:
+        return None
+    cleaned = clean_phone_number(raw)
+    digits = cleaned.lstrip("+")
+    if not digits:
+        return None
+    if not cleaned.startswith("+") and digits.startswith("00"):
+        digits = digits[2:]
+        cleaned = f"+{digits}"
+
+    if cleaned.startswith("+"):
+        candidates = [(cleaned, None)]
+    else:
+        candidates = [(digits, default_region or settings.PHONE_DEFAULT_REGION), (f"+{digits}", None)]
+    for number, region in candidates:
+        try:
+            parsed = phonenumbers.parse(number, region)
+        except phonenumbers.NumberParseException:
+            continue
+        if phonenumbers.is_valid_number(parsed):
+            return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+    return f"+{digits}"
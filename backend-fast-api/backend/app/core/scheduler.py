@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FREE_TIER = "free"
+PAID_TIER = "paid"
+
+# Upper bounds (seconds) of the wait-time histogram buckets
+WAIT_TIME_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def parse_tier_weights(raw: str) -> Dict[str, int]:
+    """Parse "tier:weight" pairs such as "paid:4,free:1" into a dict"""
+    weights: Dict[str, int] = {}
+    for pair in raw.split(","):
+        if not pair.strip():
+            continue
+        tier, _, weight = pair.partition(":")
+        weights[tier.strip()] = max(1, int(weight or 1))
+    if FREE_TIER not in weights:
+        weights[FREE_TIER] = 1
+    return weights
+
+
+class WaitTimeHistogram:
+    """Cumulative histogram of how long jobs waited for a slot"""
+
+    def __init__(self, buckets: tuple = WAIT_TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket containing it"""
+        if not self.count:
+            return None
+        threshold = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+@dataclass(eq=False)
+class JobTicket:
+    user_id: int
+    tier: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    future: Optional[asyncio.Future] = None
+
+    @property
+    def wait_time(self) -> float:
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+
+class JobScheduler:
+    """
+    Weighted fair-share scheduler for processing jobs.
+
+    Each tier gets dispatch slots in proportion to its weight (stride scheduling),
+    no user can hold more than ``per_user_limit`` running jobs, and any job that
+    has waited longer than ``starvation_seconds`` is dispatched first so free-tier
+    jobs always make progress under sustained paid load.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        per_user_limit: int,
+        tier_weights: Dict[str, int],
+        starvation_seconds: float,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_user_limit = max(1, per_user_limit)
+        self.tier_weights = tier_weights
+        self.starvation_seconds = starvation_seconds
+        self._queues: Dict[str, Deque[JobTicket]] = {tier: deque() for tier in tier_weights}
+        self._pass: Dict[str, float] = {tier: 0.0 for tier in tier_weights}
+        self._virtual_time = 0.0
+        self._running = 0
+        self._running_per_user: Counter = Counter()
+        self._histograms = {tier: WaitTimeHistogram() for tier in tier_weights}
+        self._starvation_promotions = 0
+
+    @classmethod
+    def from_settings(cls) -> "JobScheduler":
+        return cls(
+            max_concurrent=settings.SCHEDULER_MAX_CONCURRENT_JOBS,
+            per_user_limit=settings.SCHEDULER_PER_USER_LIMIT,
+            tier_weights=parse_tier_weights(settings.SCHEDULER_TIER_WEIGHTS),
+            starvation_seconds=settings.SCHEDULER_STARVATION_SECONDS,
+        )
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def acquire(self, user_id: int, tier: str) -> JobTicket:
+        """Wait until the job is granted a slot and return its ticket"""
+        if tier not in self._queues:
+            tier = FREE_TIER
+        ticket = JobTicket(user_id=user_id, tier=tier)
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._queues[tier].append(ticket)
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.started_at is not None:
+                # Granted right before the cancellation arrived, hand the slot back
+                self.release(ticket)
+            elif ticket in self._queues[tier]:
+                self._queues[tier].remove(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: JobTicket) -> None:
+        """Return a running job's slot and dispatch waiting jobs"""
+        self._running -= 1
+        self._running_per_user[ticket.user_id] -= 1
+        if self._running_per_user[ticket.user_id] <= 0:
+            del self._running_per_user[ticket.user_id]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, tier: str):
+        ticket = await self.acquire(user_id, tier)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _eligible(self, queue: Deque[JobTicket]) -> Optional[JobTicket]:
+        for ticket in queue:
+            if self._running_per_user[ticket.user_id] < self.per_user_limit:
+                return ticket
+        return None
+
+    def _next_ticket(self) -> Optional[JobTicket]:
+        now = time.monotonic()
+        candidates = {}
+        for tier, queue in self._queues.items():
+            ticket = self._eligible(queue)
+            if ticket is not None:
+                candidates[tier] = ticket
+        if not candidates:
+            return None
+
+        # Starvation protection: the longest-waiting overdue job goes first
+        oldest = min(candidates.values(), key=lambda t: t.enqueued_at)
+        if now - oldest.enqueued_at >= self.starvation_seconds:
+            self._starvation_promotions += 1
+            logger.debug("Promoting starved %s job for user %s", oldest.tier, oldest.user_id)
+            return oldest
+
+        tier = min(candidates, key=lambda t: max(self._pass[t], self._virtual_time))
+        self._virtual_time = max(self._pass[tier], self._virtual_time)
+        self._pass[tier] = self._virtual_time + 1.0 / self.tier_weights[tier]
+        return candidates[tier]
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrent:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            self._queues[ticket.tier].remove(ticket)
+            if ticket.future.done():
+                continue
+            ticket.started_at = time.monotonic()
+            self._running += 1
+            self._running_per_user[ticket.user_id] += 1
+            self._histograms[ticket.tier].observe(ticket.wait_time)
+            ticket.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "per_user_limit": self.per_user_limit,
+            "running": self._running,
+            "queued": {tier: len(queue) for tier, queue in self._queues.items()},
+            "starvation_promotions": self._starvation_promotions,
+            "tiers": {
+                tier: {
+                    "weight": self.tier_weights[tier],
+                    "wait_time_seconds": histogram.snapshot(),
+                }
+                for tier, histogram in self._histograms.items()
+            },
+        }
+
+
+job_scheduler = JobScheduler.from_settings()
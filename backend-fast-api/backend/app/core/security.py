@@ -1,3 +1,6 @@
+import hashlib
+import hmac
+import secrets
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Any, Union
@@ -25,3 +28,32 @@ def create_access_token(subject: Union[str, Any], expires_delta: int = None) ->
     to_encode = {"exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
+
+def generate_refresh_token() -> str:
+    """Create an opaque, random refresh token"""
+    return secrets.token_urlsafe(48)
+
+def hash_refresh_token(token: str) -> str:
+    """
+    SHA-256 of a refresh token, the form it is stored and looked up in.
+
+    Refresh tokens are 384 random bits, so a fast hash is enough; unlike
+    passwords they need no bcrypt work factor.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def verify_hmac_signature(message: bytes, signature: str, secret: str) -> bool:
+    """Constant-time check of a hex HMAC-SHA256 signature, the scheme Razorpay signs callbacks and webhooks with"""
+    expected = hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+def verify_payment_signature(message: bytes, signature: str, secret: str) -> bool:
+    """
+    Check a Razorpay callback or webhook signature against ``secret``.
+
+    Fails closed: with no secret configured nothing verifies, unless
+    RAZORPAY_ALLOW_UNSIGNED is set for local development.
+    """
+    if not secret:
+        return settings.RAZORPAY_ALLOW_UNSIGNED
+    return verify_hmac_signature(message, signature, secret)
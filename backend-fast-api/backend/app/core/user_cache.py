@@ -0,0 +1,41 @@
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import settings
+from app.models.user import User
+
+
+class UserCache:
+    """
+    Per-process cache of authenticated users, keyed by user id.
+
+    Entries live for ``ttl_seconds`` so a change made through another worker
+    shows up within that window; changes made through AuthRepository
+    invalidate the entry right away. Column values are cached rather than
+    the ORM object, and every hit builds a fresh detached User, so requests
+    never share (or mutate) one instance.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._entries = TTLCache(maxsize=max_size, ttl=ttl_seconds)
+
+    def get(self, user_id: int) -> Optional[User]:
+        values: Optional[Dict[str, Any]] = self._entries.get(user_id)
+        if values is None:
+            return None
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def put(self, user: User) -> None:
+        self._entries[user.id] = {
+            column.key: getattr(user, column.key) for column in User.__mapper__.column_attrs
+        }
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+
+user_cache = UserCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS)
@@ -3,6 +3,12 @@ from app.db.base_class import Base
 from app.models.user import User
 from app.models.pdf import PDF, PDFStatus
 from app.models.history import History  # Import the new History model
+from app.models.job_output import JobOutput, JobOutputChunk
+from app.models.replication import ReplicationHeartbeat
+from app.models.refresh_token import RefreshToken
+from app.models.cache_version import CacheVersion
+from app.models.webhook import WebhookEvent
+from app.models.billing import BillingPlan, UserCredit, CreditTransaction, CreditLedgerEntry, CreditHold
 
 # Import other models here as they are created
 # from app.models.other_model import OtherModel 
\ No newline at end of file
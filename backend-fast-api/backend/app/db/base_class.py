@@ -24,10 +24,14 @@ class Base(DeclarativeBase):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     def __repr__(self) -> str:
-        """String representation of the model."""
-        attrs = []
-        for key in self.__mapper__.columns.keys():
-            if not key.startswith('_'):
-                value = getattr(self, key)
-                attrs.append(f"{key}={value!r}")
-        return f"{self.__class__.__name__}({', '.join(attrs)})" 
\ No newline at end of file
+        """
+        String representation of the model: class name and primary key only.
+
+        Rows can carry large columns (a history result is a whole answer), so
+        repr never walks them; log the fields you need explicitly, at debug level.
+        Values come from the instance dict, so an expired row is never reloaded.
+        """
+        keys = ", ".join(
+            f"{column.key}={self.__dict__.get(column.key)!r}" for column in self.__mapper__.primary_key
+        )
+        return f"{self.__class__.__name__}({keys})"
\ No newline at end of file
@@ -1,34 +1,108 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from app.core.config import settings
 from .base_class import Base
+from .pool import InstrumentedAsyncQueuePool, ping_after_idle, pool_limits
+from .routing import ReplicaRouter
+from typing import Optional
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create the SQLAlchemy engine with MySQL
+# Share of each worker's connection budget; every DB call goes through the async engine
+ASYNC_POOL_SHARE = 1.0
+
+def create_db_engine(url: str, name: str, share: float) -> AsyncEngine:
+    """
+    Build an engine with the app's pool settings. Every engine in the process comes from here.
+
+    Pool size and overflow are derived from the worker count (see pool_limits),
+    checkouts are timed for the /metrics/db-pool endpoint, and connections are
+    pinged only after sitting idle instead of on every checkout.
+    """
+    pool_size, max_overflow = pool_limits(share)
+    options = dict(
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=3600,   # Recycle connections after 1 hour
+        pool_logging_name=name,
+        echo=False,          # Set to True to see SQL queries in logs
+        echo_pool=False      # Disable connection pool logging
+    )
+    db_engine = create_async_engine(url, **options)
+    # Events are registered on the sync engine, which an AsyncEngine wraps
+    ping_after_idle(db_engine.sync_engine, settings.DB_PING_IDLE_SECONDS)
+    logger.info(f"Database pool '{name}': pool_size={pool_size}, max_overflow={max_overflow}")
+    return db_engine
+
+# Async engine (aiomysql), so DB round trips don't block the event loop
 logger.info("Initializing database connection")
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,  # Reconnect on stale connections
-    pool_recycle=3600,   # Recycle connections after 1 hour
-    echo=False,          # Set to True to see SQL queries in logs
-    echo_pool=False      # Disable connection pool logging
+async_engine = create_db_engine(settings.ASYNC_DATABASE_URL, "async", ASYNC_POOL_SHARE)
+
+# expire_on_commit=False: objects stay readable after commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Read replicas; each is a separate server, so each gets the async share of its own connection budget
+replica_engines = [
+    create_db_engine(url.strip(), f"replica-{index}", ASYNC_POOL_SHARE)
+    for index, url in enumerate(settings.DB_REPLICA_URLS.split(","), start=1)
+    if url.strip()
+]
+replica_router = ReplicaRouter(
+    async_engine,
+    replica_engines,
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    sticky_seconds=settings.DB_READ_YOUR_WRITES_SECONDS
+)
 
-# Dependency to get DB session
-def get_db():
+def read_session(user_id: Optional[int] = None) -> AsyncSession:
     """
-    Dependency for getting a database session.
-    To be used with FastAPI Depends.
+    Async session for reads, bound to a healthy replica or the primary.
+
+    Pass the user the read is for, so users who just wrote read from the
+    primary. Only use it for reads: objects loaded here are not attached to
+    the request's write session.
     """
-    db = SessionLocal()
-    try:
+    return AsyncSessionLocal(bind=replica_router.read_engine(user_id))
+
+def mark_user_write(user_id: Optional[int]) -> None:
+    """Send the user's reads to the primary for a while after they wrote something"""
+    replica_router.mark_write(user_id)
+
+async def get_async_db():
+    """
+    Dependency for getting an async database session.
+    To be used with FastAPI Depends in async handlers.
+    """
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def get_read_db():
+    """
+    Dependency for a read-only async session not tied to a user (e.g. billing plans).
+    Routed to a replica when one is healthy.
+    """
+    async with read_session() as db:
+        yield db
+
+@asynccontextmanager
+async def async_session_scope():
+    """
+    Short transactional scope: commit on success, roll back on error, always close.
+    Use around a unit of DB work so the connection goes back to the pool right after,
+    instead of holding a session for the lifetime of a long-running job.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
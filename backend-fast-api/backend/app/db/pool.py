@@ -0,0 +1,120 @@
+import logging
+import time
+from typing import Any, Dict, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.scheduler import WaitTimeHistogram
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class PoolMetrics:
+    """Checkout wait times, timeouts and peak usage of one connection pool"""
+
+    def __init__(self):
+        self.checkout_wait = WaitTimeHistogram(CHECKOUT_WAIT_BUCKETS)
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self.idle_pings = 0
+        self.stale_connections = 0
+
+
+# Keyed by the pool's logging name, which survives pool.recreate() on dispose
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+class InstrumentedPoolMixin:
+    """Times every checkout, including the wait for a free connection"""
+
+    def _do_get(self):
+        metrics = pool_metrics.setdefault(self.logging_name, PoolMetrics())
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.checkout_wait.observe(time.perf_counter() - started)
+        metrics.peak_checked_out = max(metrics.peak_checked_out, self.checkedout())
+        return connection
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def ping_after_idle(engine: Engine, idle_seconds: float) -> None:
+    """
+    Ping a connection on checkout only if it sat idle for ``idle_seconds``.
+
+    Replaces pool_pre_ping, which costs a round trip on every checkout. Busy
+    connections are reused as-is; one that went quiet long enough for MySQL's
+    wait_timeout or a proxy to drop it is checked first, and replaced by the
+    pool (DisconnectionError) if the ping fails.
+    """
+    name = engine.pool.logging_name
+
+    @event.listens_for(engine, "checkin")
+    def remember_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_checkin"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        last_checkin = connection_record.info.get("last_checkin")
+        if last_checkin is None or time.monotonic() - last_checkin < idle_seconds:
+            return
+        metrics = pool_metrics.setdefault(name, PoolMetrics())
+        metrics.idle_pings += 1
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as ping_error:
+            metrics.stale_connections += 1
+            logger.info(f"Discarding stale {name} connection: {ping_error}")
+            raise exc.DisconnectionError() from ping_error
+        finally:
+            cursor.close()
+
+
+def pool_limits(share: float) -> Tuple[int, int]:
+    """
+    pool_size and max_overflow for an engine getting ``share`` of this worker's connections.
+
+    DB_MAX_CONNECTIONS is the budget for the whole deployment, so each of the
+    WEB_CONCURRENCY worker processes gets an equal slice of it.
+    """
+    per_worker = max(2, settings.DB_MAX_CONNECTIONS // max(1, settings.WEB_CONCURRENCY))
+    budget = max(2, int(per_worker * share))
+    pool_size = max(1, budget // 2)
+    return pool_size, budget - pool_size
+
+
+def pool_stats(*engines: Engine) -> Dict[str, Any]:
+    """Current occupancy and checkout metrics of each engine's pool"""
+    stats = {}
+    for engine in engines:
+        pool = engine.pool
+        metrics = pool_metrics.setdefault(pool.logging_name, PoolMetrics())
+        capacity = pool.size() + pool._max_overflow
+        stats[pool.logging_name] = {
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "peak_checked_out": metrics.peak_checked_out,
+            "saturation": round(pool.checkedout() / capacity, 3) if capacity else 0.0,
+            "checkout_timeouts": metrics.timeouts,
+            "idle_pings": metrics.idle_pings,
+            "stale_connections": metrics.stale_connections,
+            "checkout_wait_seconds": metrics.checkout_wait.snapshot(),
+        }
+    return stats
@@ -0,0 +1,130 @@
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.models.replication import ReplicationHeartbeat
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_ID = 1
+
+
+def engine_name(engine: AsyncEngine) -> str:
+    return engine.pool.logging_name or engine.url.render_as_string(hide_password=True)
+
+
+class ReplicaRouter:
+    """
+    Picks the engine a read should go to: a healthy replica, or the primary.
+
+    A replica is healthy while its lag, measured through a heartbeat row the
+    primary stamps every check, stays within ``max_lag``; a replica that has
+    never been checked or can't be reached counts as lagging. Users who wrote
+    in the last ``sticky_seconds`` read from the primary, so they see their
+    own writes (a new history entry, an edited profile) before the replicas
+    catch up. Stickiness is tracked per worker process; across workers the
+    lag guard bounds how stale a read can be.
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: List[AsyncEngine], max_lag: float, sticky_seconds: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self._lag: Dict[AsyncEngine, float] = {replica: float("inf") for replica in replicas}
+        self._last_beat: Optional[datetime] = None
+        self._recent_writers: Dict[int, float] = {}
+        self._round_robin = itertools.cycle(replicas) if replicas else None
+
+    def mark_write(self, user_id: Optional[int]) -> None:
+        """Route this user's reads to the primary for the next ``sticky_seconds``"""
+        if user_id is None or not self.replicas:
+            return
+        now = time.monotonic()
+        self._recent_writers[int(user_id)] = now + self.sticky_seconds
+        # Drop expired entries now and then so the map stays small
+        if len(self._recent_writers) > 10000:
+            self._recent_writers = {uid: until for uid, until in self._recent_writers.items() if until > now}
+
+    def is_sticky(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        until = self._recent_writers.get(int(user_id))
+        return until is not None and until > time.monotonic()
+
+    def read_engine(self, user_id: Optional[int] = None) -> AsyncEngine:
+        """Engine for a read on behalf of ``user_id`` (None for reads not tied to a user)"""
+        if not self.replicas or self.is_sticky(user_id):
+            return self.primary
+        for _ in range(len(self.replicas)):
+            replica = next(self._round_robin)
+            if self._lag[replica] <= self.max_lag:
+                return replica
+        return self.primary
+
+    async def check_lag(self) -> None:
+        """
+        Read each replica's heartbeat, then stamp a new one on the primary.
+
+        A replica's lag is how far its copy of the heartbeat trails the beat
+        written on the previous check; one that has caught up reports 0.
+        """
+        for replica in self.replicas:
+            try:
+                async with replica.connect() as conn:
+                    replica_beat = await conn.scalar(
+                        select(ReplicationHeartbeat.beat_at).where(ReplicationHeartbeat.id == HEARTBEAT_ID)
+                    )
+                if replica_beat is None or self._last_beat is None:
+                    # Nothing to compare against until this worker has stamped a beat
+                    lag = float("inf")
+                else:
+                    lag = max(0.0, (self._last_beat - replica_beat).total_seconds())
+            except Exception as e:
+                logger.warning(f"Replica {engine_name(replica)} lag check failed: {str(e)}")
+                lag = float("inf")
+            if lag > self.max_lag and self._lag[replica] <= self.max_lag:
+                logger.warning(f"Replica {engine_name(replica)} is {lag:.1f}s behind, reading from primary")
+            self._lag[replica] = lag
+
+        beat = datetime.utcnow()
+        async with self.primary.begin() as conn:
+            updated = await conn.execute(
+                ReplicationHeartbeat.__table__.update()
+                .where(ReplicationHeartbeat.id == HEARTBEAT_ID)
+                .values(beat_at=beat, updated_at=beat)
+            )
+            if updated.rowcount == 0:
+                await conn.execute(ReplicationHeartbeat.__table__.insert().values(
+                    id=HEARTBEAT_ID, beat_at=beat, created_at=beat, updated_at=beat
+                ))
+        self._last_beat = beat
+
+    async def run_lag_monitor(self, interval_seconds: float) -> None:
+        """Background loop started from the lifespan hook that keeps replica lag current"""
+        if not self.replicas:
+            return
+        while True:
+            first_check = self._last_beat is None
+            try:
+                await self.check_lag()
+            except Exception as e:
+                logger.error(f"Replica lag check failed: {str(e)}")
+            # Replicas stay unused until a second check has measured them, so do that one soon
+            await asyncio.sleep(min(1.0, interval_seconds) if first_check else interval_seconds)
+
+    def status(self) -> Dict[str, Any]:
+        """Lag and health of each replica"""
+        return {
+            engine_name(replica): {
+                "lag_seconds": None if self._lag[replica] == float("inf") else round(self._lag[replica], 3),
+                "healthy": self._lag[replica] <= self.max_lag,
+            }
+            for replica in self.replicas
+        }
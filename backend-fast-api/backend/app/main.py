@@ -3,24 +3,20 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api import api_router
-from app.db.database import engine, Base
+from app.db.database import async_engine, Base, replica_router
+from app.core.password_hashing import password_hash_pool
+from app.services.job_checkpoint import run_checkpoint_recovery
+from app.services.history_purge import run_history_purge
+from app.services.credit_ledger import run_hold_expiry
+from app.services.plan_cache import plan_cache, run_plan_version_watch
+from app.services.job_bookkeeping import bookkeeping_writer
+from app.services.webhook_inbox import webhook_inbox
+from app.core.logging_config import setup_logging
 import asyncio
 import logging
-import sys
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-# Disable noisy logs
-logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
-logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
-logging.getLogger("sqlalchemy.pool").setLevel(logging.WARNING)
+# Configure logging: handlers run on a listener thread, off the event loop
+setup_logging()
 
 # Get logger for this file
 logger = logging.getLogger(__name__)
@@ -30,16 +26,53 @@ async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events"""
     # Startup
     try:
-        Base.metadata.create_all(bind=engine)
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables initialized successfully")
         logger.info(f"Starting {settings.PROJECT_NAME} v{settings.VERSION}")
         logger.info("API documentation available at /docs and /redoc")
     except Exception as e:
         logger.error("Failed to initialize database tables", exc_info=False)
         raise
+    # Serve billing plans from memory; on failure the first plans request loads them instead
+    try:
+        await plan_cache.load()
+    except Exception as e:
+        logger.error(f"Failed to preload billing plans: {str(e)}")
+    # Reload plans edited through other workers
+    plan_watch_task = asyncio.create_task(run_plan_version_watch())
+    # Resume jobs whose worker died mid-stream
+    recovery_task = asyncio.create_task(run_checkpoint_recovery())
+    # Delete history past its expires_at
+    purge_task = asyncio.create_task(run_history_purge())
+    # Return credits held by jobs whose worker died
+    hold_expiry_task = asyncio.create_task(run_hold_expiry())
+    # Group-commits status updates queued by processing jobs
+    bookkeeping_writer.start()
+    # Applies stored payment webhooks in batches
+    webhook_inbox.start()
+    for secret_name in ("RAZORPAY_KEY_SECRET", "RAZORPAY_WEBHOOK_SECRET"):
+        if getattr(settings, secret_name):
+            continue
+        if settings.RAZORPAY_ALLOW_UNSIGNED:
+            logger.warning(
+                f"{secret_name} is not set and RAZORPAY_ALLOW_UNSIGNED is on: payments are accepted WITHOUT "
+                "signature checks and anyone can grant credits. Never run production like this."
+            )
+        else:
+            logger.error(f"{secret_name} is not set: Razorpay payments it signs will be rejected")
+    # Measure replica lag so reads skip replicas that fall behind
+    lag_monitor_task = asyncio.create_task(replica_router.run_lag_monitor(settings.DB_REPLICA_LAG_CHECK_SECONDS))
     yield
     # Shutdown
-    # Add any cleanup code here if needed
+    recovery_task.cancel()
+    purge_task.cancel()
+    hold_expiry_task.cancel()
+    plan_watch_task.cancel()
+    lag_monitor_task.cancel()
+    await bookkeeping_writer.stop()
+    await webhook_inbox.stop()
+    password_hash_pool.shutdown()
 
 # Create FastAPI app
 app = FastAPI(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -17,19 +17,59 @@ class BillingPlan(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class UserCredit(Base):
+    """
+    Running totals of a user's credits, one row per user.
+
+    Only ever changed with atomic ``SET column = column + n`` updates from
+    app.services.credit_ledger, each paired with a CreditLedgerEntry.
+    Credits reserved by running jobs are counted in credits_held; what a new
+    job can use is credits_balance - credits_held.
+    """
     __tablename__ = "user_credits"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, nullable=False, index=True)  # Reference to user table
-    credits_balance = Column(Integer, default=0)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
+    credits_balance = Column(Integer, default=0, nullable=False)
+    credits_held = Column(Integer, default=0, nullable=False)
     last_updated = Column(DateTime, default=datetime.utcnow)
 
+class CreditLedgerEntry(Base):
+    """Append-only record of every change to a credit balance; summing a user's amounts gives the balance"""
+    __tablename__ = "credit_ledger"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Integer, nullable=False)  # Positive for credits added, negative for credits spent
+    kind = Column(String(32), nullable=False)  # "purchase", "job", "opening_balance"
+    reference = Column(String(255), nullable=False)  # Transaction id, "pdf:<id>", ...
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# One entry per (kind, reference), so replaying a payment callback cannot add its credits twice
+Index("ux_credit_ledger_kind_reference", CreditLedgerEntry.kind, CreditLedgerEntry.reference, unique=True)
+Index("ix_credit_ledger_user_created", CreditLedgerEntry.user_id, CreditLedgerEntry.created_at)
+
+class CreditHold(Base):
+    """Credits reserved for a processing job until it completes (settled) or fails (released)"""
+    __tablename__ = "credit_holds"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    pdf_id = Column(Integer, ForeignKey("pdfs.id", ondelete="SET NULL"), nullable=True, index=True)
+    amount = Column(Integer, nullable=False)
+    status = Column(String(16), nullable=False, default="held")  # "held", "settled", "released"
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    closed_at = Column(DateTime, nullable=True)
+
+# The expiry sweep looks for holds still open past their expires_at
+Index("ix_credit_holds_status_expires", CreditHold.status, CreditHold.expires_at)
+
 class CreditTransaction(Base):
     __tablename__ = "credit_transactions"
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(String, unique=True, index=True)
-    user_id = Column(String, nullable=False, index=True)  # Reference to user table
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     plan_id = Column(String, ForeignKey("billing_plans.id"))
     credits_added = Column(Integer, nullable=False)
     amount_paid = Column(Float, nullable=False)
@@ -41,4 +81,11 @@ class CreditTransaction(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationship
-    plan = relationship("BillingPlan", backref="transactions") 
\ No newline at end of file
+    plan = relationship("BillingPlan", backref="transactions")
+
+# Transaction history pages by (created_at, id) within a user; InnoDB appends the primary key
+Index("ix_credit_transactions_user_created", CreditTransaction.user_id, CreditTransaction.created_at)
+# Priority tier lookup: does the user have a completed purchase
+Index("ix_credit_transactions_user_status", CreditTransaction.user_id, CreditTransaction.payment_status)
+# Razorpay webhooks identify the purchase by its order id
+Index("ix_credit_transactions_razorpay_order_id", CreditTransaction.razorpay_order_id)
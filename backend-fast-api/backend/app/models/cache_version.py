@@ -0,0 +1,12 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String
+from ..db.base_class import Base
+
+class CacheVersion(Base):
+    """Version counter of a cached dataset; bumped on every edit so each worker's copy can tell it is stale"""
+    __tablename__ = "cache_versions"
+
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime, timedelta
@@ -27,4 +27,22 @@ class History(Base):
         self.expires_at = self.created_at + timedelta(days=10)
 
 # Optional: Add an index on user_id and created_at for efficient querying of user history
-Index("ix_history_user_created", History.user_id, History.created_at) 
\ No newline at end of file
+Index("ix_history_user_created", History.user_id, History.created_at)
+
+# Full-text search over title and result: a FULLTEXT index on MySQL...
+Index("ix_history_fulltext", History.title, History.result, mysql_prefix="FULLTEXT").ddl_if(dialect="mysql")
+
+# ...and an external-content FTS5 table kept in sync by triggers on SQLite (tests, local dev)
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+    "title, result, content='history', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN "
+    "INSERT INTO history_fts(rowid, title, result) VALUES (new.id, new.title, new.result); END",
+    "CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN "
+    "INSERT INTO history_fts(history_fts, rowid, title, result) VALUES ('delete', old.id, old.title, old.result); END",
+    "CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE ON history BEGIN "
+    "INSERT INTO history_fts(history_fts, rowid, title, result) VALUES ('delete', old.id, old.title, old.result); "
+    "INSERT INTO history_fts(rowid, title, result) VALUES (new.id, new.title, new.result); END",
+):
+    event.listen(History.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(History.__table__, "before_drop", DDL("DROP TABLE IF EXISTS history_fts").execute_if(dialect="sqlite"))
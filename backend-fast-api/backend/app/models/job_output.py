@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Index
+from sqlalchemy.dialects import mysql
+from ..db.base_class import Base
+
+# MySQL TEXT tops out at 64KB, extracted papers can be larger
+LongText = Text().with_variant(mysql.LONGTEXT(), "mysql")
+
+class JobOutput(Base):
+    """Generation state of a streaming job, kept so it can resume after a crash"""
+    __tablename__ = "job_outputs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    pdf_id = Column(Integer, ForeignKey("pdfs.id"), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    source_text = Column(LongText, nullable=False)  # Extracted PDF text the prompt is built from
+    ref_book_text = Column(LongText, nullable=True)  # Extracted reference book text, if one was uploaded
+    claimed_by = Column(String(255), nullable=True)  # Worker currently generating this job
+    resume_count = Column(Integer, default=0, nullable=False)
+    # updated_at (from Base) doubles as the heartbeat, touched on every checkpoint
+
+class JobOutputChunk(Base):
+    """One checkpointed batch of streamed output, in order of seq"""
+    __tablename__ = "job_output_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_output_id = Column(Integer, ForeignKey("job_outputs.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+
+Index("ix_job_output_chunks_job_seq", JobOutputChunk.job_output_id, JobOutputChunk.seq, unique=True)
+Index("ix_job_outputs_updated_at", JobOutput.updated_at)
@@ -7,6 +7,7 @@ class PDFStatus:
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class PDF(Base):
     __tablename__ = "pdfs"
@@ -20,6 +21,7 @@ class PDF(Base):
         PDFStatus.PROCESSING,
         PDFStatus.COMPLETED,
         PDFStatus.FAILED,
+        PDFStatus.CANCELLED,
         name='pdf_status_enum'
     ), 
     default=PDFStatus.PENDING, 
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, DateTime, Integer
+from ..db.base_class import Base
+
+class ReplicationHeartbeat(Base):
+    """Single row the primary stamps periodically; how stale a replica's copy is measures its lag"""
+    __tablename__ = "replication_heartbeat"
+
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(DateTime, nullable=False)
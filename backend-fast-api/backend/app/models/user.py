@@ -10,6 +10,8 @@ class User(Base):
     first_name = Column(String(255), nullable=False)
     last_name = Column(String(255), nullable=True)
     phone_number = Column(String(255), nullable=True)
+    # E.164 form of phone_number (see app.core.phone.normalize_phone); phone logins look up this column
+    phone_e164 = Column(String(32), nullable=True, unique=True, index=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
     ip_address = Column(String(255), nullable=True)
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text
+from ..db.base_class import Base
+
+class WebhookEvent(Base):
+    """
+    Payment webhook or callback accepted but not necessarily processed yet.
+
+    Endpoints only validate and insert here; the consumer in
+    app.services.webhook_inbox applies pending events in batches.
+    """
+    __tablename__ = "webhook_inbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(32), nullable=False)  # "razorpay_webhook", "razorpay_callback"
+    idempotency_key = Column(String(128), nullable=False)  # Provider event id or payment id
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(16), nullable=False, default="pending")  # "pending", "processed", "failed"
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)  # Set after a failed attempt to back off retries
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+
+# A redelivered event hits this constraint instead of being stored twice
+Index("ux_webhook_inbox_source_key", WebhookEvent.source, WebhookEvent.idempotency_key, unique=True)
+# The consumer claims pending events oldest first
+Index("ix_webhook_inbox_status_id", WebhookEvent.status, WebhookEvent.id)
@@ -1,37 +1,49 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
 from typing import Optional
 import logging
 
 from ..models.user import User
+from ..models.refresh_token import RefreshToken
 from ..core.exceptions import NotFoundException, DatabaseError
+from ..db.database import mark_user_write
+from ..core.user_cache import user_cache
+from ..core.phone import normalize_phone
 
 class AuthRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_user_by_email(self, email: str) -> Optional[User]:
+    async def get_user_by_email(self, email: str) -> Optional[User]:
         try:
-            return self.db.query(User).filter(User.email == email).first()
+            result = await self.db.execute(select(User).where(User.email == email))
+            return result.scalars().first()
         except SQLAlchemyError as e:
             raise DatabaseError(f"Error fetching user by email: {str(e)}")
 
-    def get_user_by_phone(self, phone_number: str) -> Optional[User]:
+    async def get_user_by_phone(self, phone_number: str) -> Optional[User]:
         try:
-            return self.db.query(User).filter(User.phone_number == phone_number).first()
+            # Unique index lookup on the normalized number, whatever format it was typed in
+            phone_e164 = normalize_phone(phone_number)
+            if phone_e164 is None:
+                return None
+            result = await self.db.execute(select(User).where(User.phone_e164 == phone_e164))
+            return result.scalars().first()
         except SQLAlchemyError as e:
             raise DatabaseError(f"Error fetching user by phone: {str(e)}")
 
-    def get_user_by_id(self, user_id: int) -> Optional[User]:
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
         try:
-            user = self.db.query(User).filter(User.id == user_id).first()
+            user = await self.db.get(User, user_id)
             if not user:
                 raise NotFoundException(f"User with id {user_id} not found")
             return user
         except SQLAlchemyError as e:
             raise DatabaseError(f"Error fetching user by id: {str(e)}")
 
-    def create_user(self, user_data: dict) -> User:
+    async def create_user(self, user_data: dict) -> User:
         try:
             # Explicitly create User instance and set attributes
             user = User()
@@ -40,6 +52,7 @@ class AuthRepository:
             user.first_name = user_data.get('first_name')
             user.last_name = user_data.get('last_name') # Optional
             user.phone_number = user_data.get('phone_number') # Optional
+            user.phone_e164 = normalize_phone(user.phone_number)
             user.latitude = user_data.get('latitude') # Optional
             user.longitude = user_data.get('longitude') # Optional
             user.ip_address = user_data.get('ip_address') # Optional
@@ -51,43 +64,146 @@ class AuthRepository:
             if 'is_superuser' in user_data:
                 user.is_superuser = user_data['is_superuser']
 
-            # Add logging to see the constructed user object before adding
-            logging.info(f"Constructed User object: {user.__dict__}")
-
             self.db.add(user)
-            self.db.commit()
-            self.db.refresh(user)
+            await self.db.commit()
+            await self.db.refresh(user)
             return user
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             logging.error(f"SQLAlchemyError in create_user: {e}") # More specific log
-            logging.error(f"Data attempted: {user_data}") # Log input data again on error
             raise DatabaseError(f"Error creating user: {str(e)}")
 
-    def update_user(self, user: User, update_data: dict) -> User:
+    async def update_user(self, user: User, update_data: dict) -> User:
         try:
+            # current_user comes detached from a read session; attach it here without a reload
+            user = await self.db.merge(user, load=False)
             for field, value in update_data.items():
                 setattr(user, field, value)
-            self.db.commit()
-            self.db.refresh(user)
+            if 'phone_number' in update_data:
+                user.phone_e164 = normalize_phone(user.phone_number)
+            await self.db.commit()
+            await self.db.refresh(user)
+            mark_user_write(user.id)
+            user_cache.invalidate(user.id)
             return user
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise DatabaseError(f"Error updating user: {str(e)}")
 
-    def update_password(self, user: User, new_password: str) -> User:
+    async def update_password(self, user: User, new_password: str) -> User:
         try:
             user.password = new_password
-            self.db.commit()
-            self.db.refresh(user)
+            await self.db.commit()
+            await self.db.refresh(user)
+            mark_user_write(user.id)
+            user_cache.invalidate(user.id)
             return user
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise DatabaseError(f"Error updating password: {str(e)}")
 
-    def get_all_users(self) -> list[User]:
+    async def get_all_users(self) -> list[User]:
         """Get all users from the database"""
         try:
-            return self.db.query(User).all()
+            result = await self.db.execute(select(User))
+            return list(result.scalars().all())
         except SQLAlchemyError as e:
-            raise DatabaseError(f"Error fetching all users: {str(e)}") 
\ No newline at end of file
+            raise DatabaseError(f"Error fetching all users: {str(e)}") 
+
+    async def create_refresh_token(self, user_id: int, token_hash: str, family_id: str, expires_at: datetime) -> RefreshToken:
+        """Store a new refresh token, clearing out the user's expired ones on the way"""
+        try:
+            await self.db.execute(
+                delete(RefreshToken).where(
+                    RefreshToken.user_id == user_id,
+                    RefreshToken.expires_at <= datetime.utcnow()
+                )
+            )
+            token = RefreshToken(user_id=user_id, token_hash=token_hash, family_id=family_id, expires_at=expires_at)
+            self.db.add(token)
+            await self.db.commit()
+            return token
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Error creating refresh token: {str(e)}")
+
+    async def rotate_refresh_token(self, token_hash: str, new_token_hash: str, expires_at: datetime) -> Optional[RefreshToken]:
+        """
+        Swap the refresh token with ``token_hash`` for a new one in the same family.
+
+        Returns None when the token is unknown, expired or already used. A token
+        that was already rotated being presented again means a copy leaked, so
+        the whole family is revoked and the legitimate holder has to log in again.
+        The row is locked so two concurrent refreshes of one token cannot both win.
+        """
+        try:
+            result = await self.db.execute(
+                select(RefreshToken).where(RefreshToken.token_hash == token_hash).with_for_update()
+            )
+            current = result.scalars().first()
+            if current is None:
+                return None
+
+            now = datetime.utcnow()
+            if current.revoked_at is not None:
+                if current.replaced_by_id is not None:
+                    logging.warning(
+                        f"Refresh token reuse for user {current.user_id}, revoking family {current.family_id}"
+                    )
+                    await self._revoke_family(current.family_id, now)
+                    await self.db.commit()
+                return None
+            if current.expires_at <= now:
+                return None
+
+            replacement = RefreshToken(
+                user_id=current.user_id,
+                token_hash=new_token_hash,
+                family_id=current.family_id,
+                expires_at=expires_at
+            )
+            self.db.add(replacement)
+            await self.db.flush()
+            current.revoked_at = now
+            current.replaced_by_id = replacement.id
+            await self.db.commit()
+            return replacement
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Error rotating refresh token: {str(e)}")
+
+    async def revoke_refresh_token_family(self, token_hash: str) -> bool:
+        """Revoke the token with ``token_hash`` and every token rotated from the same login"""
+        try:
+            result = await self.db.execute(
+                select(RefreshToken.family_id).where(RefreshToken.token_hash == token_hash)
+            )
+            family_id = result.scalar()
+            if family_id is None:
+                return False
+            await self._revoke_family(family_id, datetime.utcnow())
+            await self.db.commit()
+            return True
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Error revoking refresh token: {str(e)}")
+
+    async def revoke_user_refresh_tokens(self, user_id: int) -> None:
+        """Revoke every outstanding refresh token of a user, e.g. after a password change"""
+        try:
+            await self.db.execute(
+                update(RefreshToken)
+                .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+                .values(revoked_at=datetime.utcnow())
+            )
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Error revoking refresh tokens: {str(e)}")
+
+    async def _revoke_family(self, family_id: str, revoked_at: datetime) -> None:
+        await self.db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=revoked_at)
+        )
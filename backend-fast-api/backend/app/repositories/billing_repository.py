@@ -1,86 +1,175 @@
-from sqlalchemy.orm import Session
+import base64
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 
 from ..models.billing import BillingPlan, UserCredit, CreditTransaction
 from ..core.exceptions import NotFoundException, DatabaseError
+from ..db.database import mark_user_write
+from ..services.credit_ledger import LEDGER_PURCHASE, apply_credit, get_balance
+
+def encode_transaction_cursor(created_at: datetime, transaction_id: int) -> str:
+    """Opaque cursor pointing just past the given (created_at, id) position"""
+    raw = f"{created_at.isoformat()}|{transaction_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_transaction_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_transaction_cursor; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, transaction_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 class BillingRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_all_plans(self) -> List[BillingPlan]:
+    async def get_all_plans(self) -> List[BillingPlan]:
         try:
-            return self.db.query(BillingPlan).all()
+            result = await self.db.execute(select(BillingPlan))
+            return list(result.scalars().all())
         except SQLAlchemyError as e:
             raise DatabaseError(f"Error fetching billing plans: {str(e)}")
 
-    def get_plan_by_id(self, plan_id: str) -> Optional[BillingPlan]:
+    async def get_plan_by_id(self, plan_id: str) -> Optional[BillingPlan]:
         try:
-            plan = self.db.query(BillingPlan).filter(BillingPlan.id == plan_id).first()
+            plan = await self.db.get(BillingPlan, plan_id)
             if not plan:
                 raise NotFoundException(f"Plan with id {plan_id} not found")
             return plan
         except SQLAlchemyError as e:
             raise DatabaseError(f"Error fetching plan: {str(e)}")
 
-    def get_user_credits(self, user_id: str) -> Optional[UserCredit]:
+    async def get_user_credits(self, user_id: int) -> UserCredit:
+        """The user's credits row; a user who never had credits gets an unsaved zero balance"""
         try:
-            credits = self.db.query(UserCredit).filter(UserCredit.user_id == user_id).first()
+            credits = await get_balance(self.db, user_id)
             if not credits:
-                # Initialize credits for new user
-                credits = UserCredit(user_id=user_id, credits_balance=0)
-                self.db.add(credits)
-                self.db.commit()
+                credits = UserCredit(user_id=user_id, credits_balance=0, credits_held=0, last_updated=datetime.utcnow())
             return credits
         except SQLAlchemyError as e:
             raise DatabaseError(f"Error fetching user credits: {str(e)}")
 
-    def create_transaction(self, transaction_data: dict) -> CreditTransaction:
+    async def get_credit_balance(self, user_id: int) -> int:
+        """Read the balance without initializing a credits row"""
+        try:
+            balance = await self.db.scalar(
+                select(UserCredit.credits_balance).where(UserCredit.user_id == user_id)
+            )
+            return balance or 0
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error fetching credit balance: {str(e)}")
+
+    async def get_available_credits(self, user_id: int) -> int:
+        """Balance not reserved by running jobs, i.e. what a new job can hold"""
+        try:
+            available = await self.db.scalar(
+                select(UserCredit.credits_balance - UserCredit.credits_held).where(UserCredit.user_id == user_id)
+            )
+            return max(0, available or 0)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error fetching available credits: {str(e)}")
+
+    async def has_paid_purchase(self, user_id: int) -> bool:
+        """Whether the user has completed at least one paid credit purchase"""
+        try:
+            transaction_id = await self.db.scalar(
+                select(CreditTransaction.id).where(
+                    CreditTransaction.user_id == user_id,
+                    CreditTransaction.payment_status == "completed",
+                    CreditTransaction.amount_paid > 0
+                ).limit(1)
+            )
+            return transaction_id is not None
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error checking paid purchases: {str(e)}")
+
+    async def get_user_transactions(
+        self,
+        user_id: int,
+        limit: int,
+        before: Optional[Tuple[datetime, int]] = None
+    ) -> Tuple[List[CreditTransaction], bool]:
+        """
+        One page of a user's credit transactions, newest first, and whether older ones remain.
+
+        Keyset paging on (created_at, id) like the history list, so every page
+        is a range scan on ix_credit_transactions_user_created.
+        """
+        query = (
+            select(CreditTransaction)
+            .where(CreditTransaction.user_id == user_id)
+            .order_by(CreditTransaction.created_at.desc(), CreditTransaction.id.desc())
+            .limit(limit + 1)  # One extra row tells us whether there is a next page
+        )
+        if before:
+            created_at, transaction_id = before
+            query = query.where(or_(
+                CreditTransaction.created_at < created_at,
+                and_(CreditTransaction.created_at == created_at, CreditTransaction.id < transaction_id)
+            ))
+        try:
+            rows = list((await self.db.execute(query)).scalars().all())
+            return rows[:limit], len(rows) > limit
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error fetching transactions: {str(e)}")
+
+    async def create_transaction(self, transaction_data: dict) -> CreditTransaction:
         try:
             transaction = CreditTransaction(**transaction_data)
             self.db.add(transaction)
-            self.db.commit()
-            self.db.refresh(transaction)
+            await self.db.commit()
+            await self.db.refresh(transaction)
             return transaction
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise DatabaseError(f"Error creating transaction: {str(e)}")
 
-    def update_user_credits(self, user_id: str, credits_to_add: int) -> UserCredit:
+    async def update_user_credits(self, user_id: int, credits_to_add: int, reference: str) -> UserCredit:
+        """
+        Credit a purchase identified by ``reference`` (its transaction id).
+
+        The balance is incremented in SQL rather than read, added to and
+        written back, so concurrent updates cannot lose each other, and the
+        ledger makes crediting the same reference twice a no-op.
+        """
         try:
-            user_credits = self.get_user_credits(user_id)
-            user_credits.credits_balance += credits_to_add
-            user_credits.last_updated = datetime.utcnow()
-            self.db.commit()
-            self.db.refresh(user_credits)
+            await apply_credit(self.db, user_id, credits_to_add, LEDGER_PURCHASE, reference)
+            await self.db.commit()
+            mark_user_write(user_id)
+            user_credits = await get_balance(self.db, user_id)
+            await self.db.refresh(user_credits)
             return user_credits
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise DatabaseError(f"Error updating user credits: {str(e)}")
 
-    def update_transaction_status(
-        self, 
-        transaction_id: str, 
+    async def update_transaction_status(
+        self,
+        transaction_id: str,
         status: str,
         razorpay_payment_id: Optional[str] = None
     ) -> CreditTransaction:
         try:
-            transaction = self.db.query(CreditTransaction).filter(
-                CreditTransaction.transaction_id == transaction_id
-            ).first()
+            result = await self.db.execute(
+                select(CreditTransaction).where(CreditTransaction.transaction_id == transaction_id)
+            )
+            transaction = result.scalars().first()
             if not transaction:
                 raise NotFoundException(f"Transaction {transaction_id} not found")
-            
+
             transaction.payment_status = status
             if razorpay_payment_id:
                 transaction.razorpay_payment_id = razorpay_payment_id
             transaction.updated_at = datetime.utcnow()
-            
-            self.db.commit()
-            self.db.refresh(transaction)
+
+            await self.db.commit()
+            await self.db.refresh(transaction)
             return transaction
         except SQLAlchemyError as e:
-            self.db.rollback()
-            raise DatabaseError(f"Error updating transaction: {str(e)}") 
\ No newline at end of file
+            await self.db.rollback()
+            raise DatabaseError(f"Error updating transaction: {str(e)}")
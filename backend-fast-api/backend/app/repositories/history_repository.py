@@ -0,0 +1,189 @@
+import base64
+import html
+import re
+from datetime import datetime
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+from typing import List, Optional, Tuple
+
+from ..models.history import History
+from ..core.exceptions import DatabaseError
+
+def encode_history_cursor(created_at: datetime, history_id: int) -> str:
+    """Opaque cursor pointing just past the given (created_at, id) position"""
+    raw = f"{created_at.isoformat()}|{history_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_history_cursor; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, history_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(history_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# Characters of context shown around the first match in a search snippet
+SNIPPET_CONTEXT_CHARS = 80
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = "<mark>", "</mark>"
+# Control characters FTS5's snippet() wraps matches in, swapped for the tags after escaping
+SNIPPET_OPEN, SNIPPET_CLOSE = "\x02", "\x03"
+
+# Written in capitals these read as operators, so they are not searched for
+SEARCH_OPERATORS = {"AND", "OR", "NOT"}
+
+def search_terms(query: str) -> List[str]:
+    """Plain word terms of a search query; operators and punctuation are dropped"""
+    return [term for term in re.findall(r"\w+", query) if term not in SEARCH_OPERATORS]
+
+def highlight_terms(snippet: str, terms: List[str]) -> str:
+    """HTML-escape the snippet and wrap every occurrence of a search term with highlight tags"""
+    if not terms:
+        return html.escape(snippet)
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    parts = []
+    position = 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[position:match.start()]))
+        parts.append(f"{HIGHLIGHT_OPEN}{html.escape(match.group(0))}{HIGHLIGHT_CLOSE}")
+        position = match.end()
+    parts.append(html.escape(snippet[position:]))
+    return "".join(parts)
+
+def highlight_markers(snippet: str) -> str:
+    """HTML-escape an FTS5 snippet and turn its sentinel markers into highlight tags"""
+    return html.escape(snippet).replace(SNIPPET_OPEN, HIGHLIGHT_OPEN).replace(SNIPPET_CLOSE, HIGHLIGHT_CLOSE)
+
+class HistoryRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_user_history(
+        self,
+        user_id: int,
+        limit: int,
+        before: Optional[Tuple[datetime, int]] = None
+    ) -> Tuple[List[Row], bool]:
+        """
+        One page of a user's history, newest first, and whether older items remain.
+
+        Only the list columns are selected, never the result body. Paging is by
+        keyset on (created_at, id): the next page starts strictly after the last
+        row returned, so it is a range scan on ix_history_user_created (InnoDB
+        appends the primary key to it) no matter how deep the client pages.
+        Expired rows still waiting for the purge task are left out.
+        """
+        query = (
+            select(History.id, History.pdf_name, History.title, History.created_at)
+            .where(History.user_id == user_id, History.expires_at > datetime.utcnow())
+            .order_by(History.created_at.desc(), History.id.desc())
+            .limit(limit + 1)  # One extra row tells us whether there is a next page
+        )
+        if before:
+            created_at, history_id = before
+            query = query.where(or_(
+                History.created_at < created_at,
+                and_(History.created_at == created_at, History.id < history_id)
+            ))
+        try:
+            rows = list((await self.db.execute(query)).all())
+            return rows[:limit], len(rows) > limit
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error fetching history: {str(e)}")
+
+    async def search_user_history(self, user_id: int, query: str, limit: int) -> List[dict]:
+        """
+        Full-text search over a user's unexpired history titles and results, best match first.
+
+        Uses the FULLTEXT index (MATCH ... AGAINST) on MySQL and the history_fts
+        FTS5 table on SQLite; never a LIKE scan over the result column. Each hit
+        carries a relevance score (higher is better) and a highlighted snippet,
+        HTML-escaped apart from the highlight tags.
+
+        Both backends match items containing any of the terms and rank items
+        matching more of them higher (MySQL's natural language mode, an OR
+        query in FTS5).
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        params = {"user_id": user_id, "now": datetime.utcnow(), "limit": limit}
+        try:
+            if self.db.bind.dialect.name == "sqlite":
+                # Quote every term so FTS5 query syntax in user input is matched literally; OR them
+                # together, since FTS5 would otherwise AND them unlike MySQL's natural language mode
+                params.update(
+                    match=" OR ".join(f'"{term}"' for term in terms),
+                    snippet_open=SNIPPET_OPEN,
+                    snippet_close=SNIPPET_CLOSE
+                )
+                result = await self.db.execute(text(
+                    "SELECT h.id, h.pdf_name, h.title, h.created_at, -bm25(history_fts) AS score, "
+                    "snippet(history_fts, 1, :snippet_open, :snippet_close, '...', 24) AS snippet "
+                    "FROM history_fts JOIN history h ON h.id = history_fts.rowid "
+                    "WHERE history_fts MATCH :match AND h.user_id = :user_id AND h.expires_at > :now "
+                    "ORDER BY bm25(history_fts) LIMIT :limit"
+                ), params)
+                return [
+                    {**row._mapping, "snippet": highlight_markers(row.snippet or "")}
+                    for row in result
+                ]
+
+            # Only a window around the first term leaves the database, not the whole result
+            params.update(match=" ".join(terms), first_term=terms[0], context=SNIPPET_CONTEXT_CHARS)
+            result = await self.db.execute(text(
+                "SELECT id, pdf_name, title, created_at, "
+                "MATCH(title, result) AGAINST (:match IN NATURAL LANGUAGE MODE) AS score, "
+                "SUBSTRING(result, GREATEST(1, LOCATE(:first_term, result) - :context), 2 * :context) AS snippet "
+                "FROM history "
+                "WHERE user_id = :user_id AND expires_at > :now "
+                "AND MATCH(title, result) AGAINST (:match IN NATURAL LANGUAGE MODE) "
+                "ORDER BY score DESC LIMIT :limit"
+            ), params)
+            return [
+                {**row._mapping, "snippet": highlight_terms(row.snippet or "", terms)}
+                for row in result
+            ]
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error searching history: {str(e)}")
+
+    async def get_user_history_version(self, history_id: int, user_id: int) -> Optional[Row]:
+        """id and created_at of a history item (enough for its ETag), without the result"""
+        try:
+            result = await self.db.execute(
+                select(History.id, History.created_at).where(
+                    History.id == history_id,
+                    History.user_id == user_id,
+                    History.expires_at > datetime.utcnow()
+                )
+            )
+            return result.first()
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error fetching history item: {str(e)}")
+
+    async def get_user_history_item(self, history_id: int, user_id: int) -> Optional[History]:
+        """A single history item, only if it belongs to the user and hasn't expired"""
+        try:
+            result = await self.db.execute(
+                select(History).where(
+                    History.id == history_id,
+                    History.user_id == user_id,
+                    History.expires_at > datetime.utcnow()
+                )
+            )
+            return result.scalars().first()
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Error fetching history item: {str(e)}")
+
+    async def create_history(self, history_data: dict) -> History:
+        try:
+            history_item = History(**history_data)
+            self.db.add(history_item)
+            await self.db.commit()
+            await self.db.refresh(history_item)
+            return history_item
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Error saving history: {str(e)}")
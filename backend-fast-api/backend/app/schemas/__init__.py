@@ -4,7 +4,7 @@
 # from .user import User, UserCreate, UserUpdate
 
 # Export History schemas
-from .history import HistoryBase, HistoryListItem, HistoryDetail, HistoryListResponse
+from .history import HistoryBase, HistoryListItem, HistoryDetail, HistoryListResponse, HistorySearchItem, HistorySearchResponse
 
 # Add other schema exports as needed
 
@@ -16,4 +16,6 @@ __all__ = [
     'HistoryListItem',
     'HistoryDetail',
     'HistoryListResponse',
+    'HistorySearchItem',
+    'HistorySearchResponse',
 ] 
\ No newline at end of file
@@ -31,7 +31,9 @@ class UserCreditBase(BaseModel):
     credits_balance: int = Field(ge=0)
 
 class UserCreditResponse(UserCreditBase):
-    user_id: str
+    user_id: int
+    credits_held: int = Field(0, ge=0, description="Credits reserved by jobs still running")
+    credits_available: int = Field(0, ge=0, description="Credits a new job can use")
     last_updated: datetime
 
     class Config:
@@ -48,14 +50,14 @@ class CreditTransactionBase(BaseModel):
     payment_status: str = Field(pattern="^(pending|completed|failed)$")
 
 class CreditTransactionCreate(CreditTransactionBase):
-    user_id: str
+    user_id: int
     plan_id: str
     razorpay_order_id: Optional[str] = None
     razorpay_payment_id: Optional[str] = None
 
 class CreditTransactionResponse(CreditTransactionBase):
     transaction_id: str
-    user_id: str
+    user_id: int
     plan_id: str
     razorpay_order_id: Optional[str]
     razorpay_payment_id: Optional[str]
@@ -63,4 +65,9 @@ class CreditTransactionResponse(CreditTransactionBase):
     updated_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class CreditTransactionListResponse(BaseModel):
+    transactions: List[CreditTransactionResponse]
+    # Opaque cursor for the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
@@ -24,4 +24,15 @@ class HistoryDetail(HistoryListItem):
 
 # Schema for the response containing a list of history items
 class HistoryListResponse(BaseModel):
-    history: List[HistoryListItem] 
\ No newline at end of file
+    history: List[HistoryListItem]
+    # Opaque cursor for the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
+# A search hit: list fields plus relevance and a highlighted excerpt of the result
+class HistorySearchItem(HistoryListItem):
+    score: float
+    snippet: str
+
+class HistorySearchResponse(BaseModel):
+    query: str
+    results: List[HistorySearchItem] 
\ No newline at end of file
@@ -2,6 +2,8 @@ from pydantic import BaseModel, EmailStr, Field, model_validator
 from datetime import datetime
 from typing import Optional
 
+from ..core.phone import clean_phone_number
+
 class UserBase(BaseModel):
     email: Optional[EmailStr] = Field(None, description="User's email address")
     phone_number: Optional[str] = Field(None, description="User's phone number")
@@ -16,7 +18,7 @@ class UserBase(BaseModel):
         if self.email:
             self.email = self.email.strip().lower()
         if self.phone_number:
-            self.phone_number = ''.join(filter(str.isdigit, self.phone_number.strip()))
+            self.phone_number = clean_phone_number(self.phone_number)
         return self
 
     @model_validator(mode="after")
@@ -53,7 +55,7 @@ class UserLogin(BaseModel):
         if self.email:
             self.email = self.email.strip().lower()
         elif self.phone_number:
-            self.phone_number = ''.join(filter(str.isdigit, self.phone_number.strip()))
+            self.phone_number = clean_phone_number(self.phone_number)
 
         return self
 
@@ -89,10 +91,10 @@ class UserUpdate(BaseModel):
             phone = self.phone_number.strip()
             if not phone:
                 raise ValueError("Phone number cannot be empty or just whitespace")
-            cleaned_number = ''.join(filter(str.isdigit, phone))
-            if not cleaned_number:
+            cleaned_number = clean_phone_number(phone)
+            if not cleaned_number.lstrip("+"):
                 raise ValueError("Phone number must contain only digits")
-            if not 8 <= len(cleaned_number) <= 15:
+            if not 8 <= len(cleaned_number.lstrip("+")) <= 15:
                 raise ValueError("Phone number length must be between 8 and 15 digits")
             self.phone_number = cleaned_number
 
@@ -121,6 +123,10 @@ class UserResponse(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = Field(None, description="Single-use token for POST /auth/refresh")
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., description="Refresh token returned by login or the previous refresh")
 
 class TokenPayload(BaseModel):
     sub: Optional[str] = Field(None, description="User ID stored in the token")
@@ -1,10 +1,13 @@
 from typing import Optional
 from fastapi import HTTPException, status, Request
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+import uuid
 
 from ..repositories.auth_repository import AuthRepository
-from ..core.security import get_password_hash, verify_password, create_access_token
+from ..core.config import settings
+from ..core.security import create_access_token, generate_refresh_token, hash_refresh_token
+from ..core.password_hashing import password_hash_pool
 from ..schemas.user import UserCreate, UserUpdate, UserResponse, Token
 from ..models.user import User
 
@@ -19,7 +22,7 @@ class AuthService:
 
         # Check for existing user by email (if provided)
         if user_data.email:
-            existing_email_user = self.repository.get_user_by_email(user_data.email)
+            existing_email_user = await self.repository.get_user_by_email(user_data.email)
             if existing_email_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,7 +31,7 @@ class AuthService:
         
         # Check for existing user by phone number (if provided)
         if user_data.phone_number:
-            existing_phone_user = self.repository.get_user_by_phone(user_data.phone_number)
+            existing_phone_user = await self.repository.get_user_by_phone(user_data.phone_number)
             if existing_phone_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -36,7 +39,7 @@ class AuthService:
                 )
 
         # Hash password
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hash_pool.hash(user_data.password)
 
         # Prepare user data dictionary for repository
         # Now we don't need to exclude 'email_phone' as it's removed from the schema
@@ -53,7 +56,7 @@ class AuthService:
         # Create user via repository
         try:
             # Pass the dictionary directly, not as keyword arguments
-            db_user = self.repository.create_user(user_dict) 
+            db_user = await self.repository.create_user(user_dict) 
             return db_user
         except Exception as e:
             # Log the detailed database error for debugging
@@ -71,27 +74,73 @@ class AuthService:
         user = None # Initialize user to None
         # Get user by email or phone
         if email:
-            # Repository methods are synchronous
-            user = self.repository.get_user_by_email(email)
+            user = await self.repository.get_user_by_email(email)
         elif phone_number:
-            # Repository methods are synchronous
-            user = self.repository.get_user_by_phone(phone_number)
+            user = await self.repository.get_user_by_phone(phone_number)
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email or phone number required"
             )
 
-        if not user or not verify_password(password, user.password):
+        if not user or not await password_hash_pool.verify(password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        # Create access token
-        access_token = create_access_token(subject=str(user.id))
-        return Token(access_token=access_token, token_type="bearer")
+        # Each login starts a new refresh token family
+        return await self.issue_tokens(user.id)
+
+    async def issue_tokens(self, user_id: int) -> Token:
+        """Access token plus the first refresh token of a new family"""
+        refresh_token = generate_refresh_token()
+        await self.repository.create_refresh_token(
+            user_id=user_id,
+            token_hash=hash_refresh_token(refresh_token),
+            family_id=uuid.uuid4().hex,
+            expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        )
+        return Token(
+            access_token=create_access_token(subject=str(user_id)),
+            token_type="bearer",
+            refresh_token=refresh_token
+        )
+
+    async def refresh_tokens(self, refresh_token: str) -> Token:
+        """Exchange a refresh token for a new access token and a rotated refresh token, without a password check"""
+        new_refresh_token = generate_refresh_token()
+        replacement = await self.repository.rotate_refresh_token(
+            token_hash=hash_refresh_token(refresh_token),
+            new_token_hash=hash_refresh_token(new_refresh_token),
+            expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        )
+        if replacement is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired refresh token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        user = await self.repository.get_user_by_id(replacement.user_id)
+        if not user.is_active:
+            await self.repository.revoke_user_refresh_tokens(user.id)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Inactive user",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        return Token(
+            access_token=create_access_token(subject=str(replacement.user_id)),
+            token_type="bearer",
+            refresh_token=new_refresh_token
+        )
+
+    async def logout(self, refresh_token: str) -> bool:
+        """Revoke a refresh token and the rest of its family"""
+        return await self.repository.revoke_refresh_token_family(hash_refresh_token(refresh_token))
 
     async def update_user_profile(self, current_user: User, user_data: UserUpdate) -> User:
         """Update user profile"""
@@ -99,7 +148,7 @@ class AuthService:
 
         # Check email uniqueness
         if user_data.email and user_data.email != current_user.email:
-            existing_user = self.repository.get_user_by_email(user_data.email)
+            existing_user = await self.repository.get_user_by_email(user_data.email)
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -108,18 +157,19 @@ class AuthService:
 
         # Check phone number uniqueness
         if user_data.phone_number and user_data.phone_number != current_user.phone_number:
-            existing_user = self.repository.get_user_by_phone(user_data.phone_number)
-            if existing_user:
+            existing_user = await self.repository.get_user_by_phone(user_data.phone_number)
+            # The same number typed in another format normalizes to the user's own row
+            if existing_user and existing_user.id != current_user.id:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Phone number already registered"
                 )
 
-        return self.repository.update_user(current_user, update_data)
+        return await self.repository.update_user(current_user, update_data)
 
     async def change_password(self, user_id: int, current_password: str, new_password: str) -> User:
         """Change user password"""
-        current_user = self.repository.get_user_by_id(user_id)
+        current_user = await self.repository.get_user_by_id(user_id)
         
         if not current_user:
             raise HTTPException(
@@ -127,19 +177,22 @@ class AuthService:
                 detail="User not found"
             )
             
-        if not verify_password(current_password, current_user.password):
+        if not await password_hash_pool.verify(current_password, current_user.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
             )
 
-        hashed_password = get_password_hash(new_password)
-        return self.repository.update_password(current_user, hashed_password)
+        hashed_password = await password_hash_pool.hash(new_password)
+        user = await self.repository.update_password(current_user, hashed_password)
+        # Sessions started with the old password must log in again
+        await self.repository.revoke_user_refresh_tokens(user.id)
+        return user
 
     async def get_user_by_id(self, user_id: int) -> User:
         """Get user by ID"""
-        return self.repository.get_user_by_id(user_id)
+        return await self.repository.get_user_by_id(user_id)
 
     async def get_all_users(self) -> list[User]:
         """Get all users"""
-        return self.repository.get_all_users() 
\ No newline at end of file
+        return await self.repository.get_all_users() 
\ No newline at end of file
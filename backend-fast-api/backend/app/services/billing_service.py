@@ -1,5 +1,6 @@
 from typing import List, Optional
 from datetime import datetime
+import logging
 import uuid
 
 from ..repositories.billing_repository import BillingRepository
@@ -12,30 +13,52 @@ from ..schemas.billing import (
 )
 from ..core.exceptions import PaymentError
 from ..core.config import settings
+from ..core.scheduler import FREE_TIER, PAID_TIER
+from ..db.database import read_session
+
+logger = logging.getLogger(__name__)
 
 class BillingService:
     def __init__(self, repository: BillingRepository):
         self.repository = repository
 
     async def get_all_plans(self) -> List[BillingPlanResponse]:
-        plans = self.repository.get_all_plans()
+        plans = await self.repository.get_all_plans()
         return [BillingPlanResponse.from_orm(plan) for plan in plans]
 
     async def get_plan_by_id(self, plan_id: str) -> BillingPlanResponse:
-        plan = self.repository.get_plan_by_id(plan_id)
+        plan = await self.repository.get_plan_by_id(plan_id)
         return BillingPlanResponse.from_orm(plan)
 
-    async def get_user_credits(self, user_id: str) -> UserCreditResponse:
-        credits = self.repository.get_user_credits(user_id)
-        return UserCreditResponse.from_orm(credits)
+    async def get_user_credits(self, user_id: int) -> UserCreditResponse:
+        credits = await self.repository.get_user_credits(user_id)
+        return UserCreditResponse(
+            user_id=credits.user_id,
+            credits_balance=credits.credits_balance,
+            credits_held=credits.credits_held,
+            credits_available=max(0, credits.credits_balance - credits.credits_held),
+            last_updated=credits.last_updated
+        )
+
+    async def get_priority_tier(self, user_id: int, held_for_job: int = 0) -> str:
+        """
+        Scheduling tier: paying customers with credits left outrank the free plan.
+
+        Credits held by other running jobs are already spoken for; pass
+        ``held_for_job`` when the job being scheduled holds its own credits.
+        """
+        available = await self.repository.get_available_credits(user_id) + held_for_job
+        if available > 0 and await self.repository.has_paid_purchase(user_id):
+            return PAID_TIER
+        return FREE_TIER
 
     async def initiate_credit_purchase(
         self, 
-        user_id: str,
+        user_id: int,
         purchase_request: CreditPurchaseRequest
     ) -> CreditTransactionResponse:
         # Get the plan details
-        plan = self.repository.get_plan_by_id(purchase_request.plan_id)
+        plan = await self.repository.get_plan_by_id(purchase_request.plan_id)
         
         # Generate unique transaction ID
         transaction_id = f"txn_{uuid.uuid4().hex}"
@@ -55,7 +78,7 @@ class BillingService:
             "razorpay_order_id": razorpay_order_id
         }
         
-        transaction = self.repository.create_transaction(transaction_data)
+        transaction = await self.repository.create_transaction(transaction_data)
         return CreditTransactionResponse.from_orm(transaction)
 
     async def complete_credit_purchase(
@@ -65,7 +88,7 @@ class BillingService:
         payment_status: str
     ) -> CreditTransactionResponse:
         # Update transaction status
-        transaction = self.repository.update_transaction_status(
+        transaction = await self.repository.update_transaction_status(
             transaction_id,
             payment_status,
             razorpay_payment_id
@@ -73,9 +96,10 @@ class BillingService:
         
         if payment_status == "completed":
             # Add credits to user's balance
-            self.repository.update_user_credits(
+            await self.repository.update_user_credits(
                 transaction.user_id,
-                transaction.credits_added
+                transaction.credits_added,
+                transaction.transaction_id
             )
         
         return CreditTransactionResponse.from_orm(transaction)
@@ -83,4 +107,14 @@ class BillingService:
     async def verify_payment(self, razorpay_payment_id: str, razorpay_signature: str) -> bool:
         """Mock implementation of Razorpay payment verification"""
         # In real implementation, verify the payment signature with Razorpay
-        return True 
\ No newline at end of file
+        return True 
+
+
+async def resolve_priority_tier(user_id: int, held_for_job: int = 0) -> str:
+    """Look up the user's scheduling tier, falling back to the free tier"""
+    try:
+        async with read_session(user_id) as db:
+            return await BillingService(BillingRepository(db)).get_priority_tier(user_id, held_for_job)
+    except Exception as tier_error:
+        logger.warning(f"Could not resolve priority tier for user {user_id}: {str(tier_error)}")
+        return FREE_TIER
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+from app.core.config import settings
+
+BLOB_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded PDFs.
+
+    Blobs are keyed by the SHA-256 of their content and namespaced per user,
+    so uploading the same file twice stores it once and a blob id is only
+    resolvable by the user who uploaded it.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def blob_id_for(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _blob_path(self, user_id: int, blob_id: str) -> str:
+        return os.path.join(self.root, str(user_id), blob_id[:2], f"{blob_id}.pdf")
+
+    def put(self, user_id: int, data: bytes) -> str:
+        """Store the bytes (if not already present) and return their blob id"""
+        blob_id = self.blob_id_for(data)
+        path = self._blob_path(user_id, blob_id)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial blob
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        return blob_id
+
+    def path(self, user_id: int, blob_id: str) -> Optional[str]:
+        """Filesystem path of a stored blob, or None if it does not exist"""
+        if not BLOB_ID_PATTERN.match(blob_id or ""):
+            return None
+        path = self._blob_path(user_id, blob_id)
+        return path if os.path.exists(path) else None
+
+
+blob_store = BlobStore(settings.BLOB_STORAGE_DIR)
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.exceptions import InsufficientCreditsError
+from app.db.database import async_session_scope, mark_user_write
+from app.models.billing import CreditHold, CreditLedgerEntry, UserCredit
+
+logger = logging.getLogger(__name__)
+
+# CreditLedgerEntry.kind values
+LEDGER_PURCHASE = "purchase"
+LEDGER_JOB = "job"
+LEDGER_OPENING_BALANCE = "opening_balance"
+
+# CreditHold.status values
+HOLD_HELD = "held"
+HOLD_SETTLED = "settled"
+HOLD_RELEASED = "released"
+
+
+def job_reference(pdf_id: int) -> str:
+    """Ledger reference of the charge for one processed PDF"""
+    return f"pdf:{pdf_id}"
+
+
+async def ensure_credit_account(db: AsyncSession, user_id: int) -> None:
+    """Create the user's credits row if missing; safe against a concurrent insert of the same row"""
+    if await db.scalar(select(UserCredit.id).where(UserCredit.user_id == user_id)) is not None:
+        return
+    try:
+        async with db.begin_nested():
+            db.add(UserCredit(user_id=user_id, credits_balance=0, credits_held=0, last_updated=datetime.utcnow()))
+    except IntegrityError:
+        pass
+
+
+async def get_balance(db: AsyncSession, user_id: int) -> Optional[UserCredit]:
+    """The user's credits row, read without locking it (None if the user never had credits)"""
+    return await db.scalar(select(UserCredit).where(UserCredit.user_id == user_id))
+
+
+async def apply_credit(db: AsyncSession, user_id: int, amount: int, kind: str, reference: str) -> bool:
+    """
+    Add ``amount`` (negative to spend) to the balance and record it in the ledger.
+
+    The ledger entry goes in first under its unique (kind, reference), so
+    applying the same purchase or job twice is a no-op that returns False.
+    Runs in the caller's transaction; nothing is committed here.
+    """
+    await ensure_credit_account(db, user_id)
+    try:
+        async with db.begin_nested():
+            db.add(CreditLedgerEntry(user_id=user_id, amount=amount, kind=kind, reference=reference))
+    except IntegrityError:
+        logger.info(f"Ledger entry {kind}/{reference} already applied, skipping")
+        return False
+    await db.execute(
+        update(UserCredit)
+        .where(UserCredit.user_id == user_id)
+        .values(credits_balance=UserCredit.credits_balance + amount, last_updated=datetime.utcnow())
+    )
+    return True
+
+
+async def place_job_hold(user_id: int, pdf_id: int, amount: int) -> int:
+    """
+    Reserve ``amount`` credits for a job and return the hold id.
+
+    The reservation is a single conditional UPDATE, so concurrent jobs of
+    the same user can never hold more than the balance. Raises
+    InsufficientCreditsError when the available credits fall short.
+    """
+    async with async_session_scope() as db:
+        result = await db.execute(
+            update(UserCredit)
+            .where(
+                UserCredit.user_id == user_id,
+                UserCredit.credits_balance - UserCredit.credits_held >= amount
+            )
+            .values(credits_held=UserCredit.credits_held + amount)
+        )
+        if result.rowcount == 0:
+            available = await db.scalar(
+                select(UserCredit.credits_balance - UserCredit.credits_held).where(UserCredit.user_id == user_id)
+            )
+            raise InsufficientCreditsError(amount, max(0, available or 0))
+        now = datetime.utcnow()
+        hold = CreditHold(
+            user_id=user_id,
+            pdf_id=pdf_id,
+            amount=amount,
+            status=HOLD_HELD,
+            created_at=now,
+            expires_at=now + timedelta(seconds=settings.CREDIT_HOLD_TTL_SECONDS)
+        )
+        db.add(hold)
+        await db.flush()
+        return hold.id
+
+
+async def _close_hold(db: AsyncSession, hold: CreditHold, status: str) -> bool:
+    # Guarded on the status so a hold is settled or released exactly once
+    result = await db.execute(
+        update(CreditHold)
+        .where(CreditHold.id == hold.id, CreditHold.status == HOLD_HELD)
+        .values(status=status, closed_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        return False
+    await db.execute(
+        update(UserCredit)
+        .where(UserCredit.user_id == hold.user_id)
+        .values(credits_held=UserCredit.credits_held - hold.amount)
+    )
+    return True
+
+
+async def settle_job_hold(db: AsyncSession, pdf_id: int) -> int:
+    """
+    Spend the credits held for a completed job; returns how many were charged.
+
+    Runs in the caller's transaction (BookkeepingWriter.complete_job), so the
+    charge commits together with the result it pays for. A hold the expiry
+    sweep already released (a job that outran its TTL, or was resumed after
+    it lapsed) is still charged: the charge is keyed on the job's ledger
+    reference, so it lands at most once either way.
+    """
+    hold = await db.scalar(
+        select(CreditHold)
+        .where(CreditHold.pdf_id == pdf_id, CreditHold.status.in_((HOLD_HELD, HOLD_RELEASED)))
+        .order_by(CreditHold.id.desc())
+        .limit(1)
+    )
+    if hold is None:
+        return 0
+    if not await _close_hold(db, hold, HOLD_SETTLED):
+        # Released while the job ran; its credits_held share is already gone
+        await db.execute(
+            update(CreditHold)
+            .where(CreditHold.id == hold.id, CreditHold.status == HOLD_RELEASED)
+            .values(status=HOLD_SETTLED, closed_at=datetime.utcnow())
+        )
+    if not await apply_credit(db, hold.user_id, -hold.amount, LEDGER_JOB, job_reference(pdf_id)):
+        return 0
+    return hold.amount
+
+
+async def extend_job_hold(pdf_id: int) -> bool:
+    """Push a running job's hold expiry a full TTL out; False if it is no longer held"""
+    async with async_session_scope() as db:
+        result = await db.execute(
+            update(CreditHold)
+            .where(CreditHold.pdf_id == pdf_id, CreditHold.status == HOLD_HELD)
+            .values(expires_at=datetime.utcnow() + timedelta(seconds=settings.CREDIT_HOLD_TTL_SECONDS))
+        )
+    return result.rowcount > 0
+
+
+async def release_job_hold(pdf_id: int) -> bool:
+    """Return a failed or cancelled job's held credits; False if none were still held"""
+    async with async_session_scope() as db:
+        hold = await db.scalar(select(CreditHold).where(CreditHold.pdf_id == pdf_id, CreditHold.status == HOLD_HELD))
+        if hold is None:
+            return False
+        released = await _close_hold(db, hold, HOLD_RELEASED)
+    if released:
+        mark_user_write(hold.user_id)
+    return released
+
+
+async def release_expired_holds(batch_size: int = 500) -> int:
+    """Release holds left open past their expires_at by workers that died mid-job; returns how many"""
+    async with async_session_scope() as db:
+        result = await db.execute(
+            select(CreditHold)
+            .where(CreditHold.status == HOLD_HELD, CreditHold.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+        )
+        released = 0
+        for hold in result.scalars().all():
+            if await _close_hold(db, hold, HOLD_RELEASED):
+                released += 1
+    return released
+
+
+async def run_hold_expiry(interval_seconds: Optional[float] = None) -> None:
+    """Background loop started from the lifespan hook that releases abandoned holds"""
+    interval_seconds = interval_seconds or settings.CREDIT_HOLD_SWEEP_SECONDS
+    while True:
+        try:
+            released = await release_expired_holds()
+            if released:
+                logger.info(f"Released {released} expired credit hold(s)")
+        except Exception as e:
+            logger.error(f"Credit hold sweep failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
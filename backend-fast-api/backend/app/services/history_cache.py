@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Dict, Optional
+
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.core.http_cache import compress, make_etag
+
+
+def history_etag(history_id: int, created_at: datetime) -> str:
+    """
+    ETag of a history item.
+
+    History rows are written once and never updated in place (only purged
+    on expiry), so id and creation time identify the content exactly and the
+    tag can be checked without loading the result.
+    """
+    return make_etag("history", history_id, created_at.isoformat())
+
+
+class CachedHistory:
+    """Serialized detail body of one history item plus its compressed variants"""
+
+    def __init__(self, etag: str, body: bytes, expires_at: datetime):
+        self.etag = etag
+        self.body = body
+        self.expires_at = expires_at.replace(tzinfo=None)
+        self._encoded: Dict[str, bytes] = {}
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at <= datetime.utcnow()
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        """Body in the given encoding, compressed on first use and kept"""
+        if not encoding:
+            return self.body
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+
+class HistoryCache:
+    """
+    LRU of history detail bodies keyed by (user_id, history_id).
+
+    Bounded by the total size of the uncompressed bodies. Entries past their
+    expires_at are dropped on access, matching what the purge task deletes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._entries = LRUCache(maxsize=max_bytes, getsizeof=lambda entry: len(entry.body))
+
+    def get(self, user_id: int, history_id: int) -> Optional[CachedHistory]:
+        entry = self._entries.get((user_id, history_id))
+        if entry is not None and entry.expired:
+            self._entries.pop((user_id, history_id), None)
+            return None
+        return entry
+
+    def put(self, user_id: int, history_id: int, entry: CachedHistory) -> CachedHistory:
+        # Bodies larger than the whole cache are served but not kept
+        if len(entry.body) <= self._entries.maxsize:
+            self._entries[(user_id, history_id)] = entry
+        return entry
+
+
+history_cache = HistoryCache(settings.HISTORY_CACHE_MAX_BYTES)
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, func, select
+
+from app.core.config import settings
+from app.db.database import async_session_scope
+from app.models.history import History
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_expired_history(
+    batch_size: Optional[int] = None,
+    pause_seconds: Optional[float] = None
+) -> Tuple[int, int]:
+    """
+    Delete history rows past their expires_at; returns (rows, bytes) reclaimed.
+
+    Rows go in batches of ``batch_size`` picked off the expires_at index, each
+    batch in its own short transaction with a pause before the next, so a
+    large backlog never holds locks on the table for long.
+    """
+    batch_size = batch_size or settings.HISTORY_PURGE_BATCH_SIZE
+    pause_seconds = settings.HISTORY_PURGE_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    cutoff = datetime.utcnow()
+    rows_deleted = 0
+    bytes_reclaimed = 0
+
+    while True:
+        async with async_session_scope() as db:
+            result = await db.execute(
+                select(
+                    History.id,
+                    func.length(History.result) + func.length(History.title) + func.length(History.pdf_name)
+                )
+                .where(History.expires_at <= cutoff)
+                .order_by(History.expires_at)
+                .limit(batch_size)
+            )
+            batch = result.all()
+            if not batch:
+                break
+            await db.execute(delete(History).where(History.id.in_([row[0] for row in batch])))
+        rows_deleted += len(batch)
+        bytes_reclaimed += sum(row[1] or 0 for row in batch)
+        if len(batch) < batch_size:
+            break
+        await asyncio.sleep(pause_seconds)
+
+    return rows_deleted, bytes_reclaimed
+
+
+async def run_history_purge(interval_seconds: Optional[float] = None) -> None:
+    """Background loop started from the lifespan hook that purges expired history"""
+    interval_seconds = interval_seconds or settings.HISTORY_PURGE_INTERVAL_SECONDS
+    while True:
+        try:
+            rows_deleted, bytes_reclaimed = await purge_expired_history()
+            if rows_deleted:
+                logger.info(
+                    f"Purged {rows_deleted} expired history row(s), "
+                    f"{bytes_reclaimed / (1024 * 1024):.1f} MB reclaimed"
+                )
+        except Exception as e:
+            logger.error(f"History purge failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
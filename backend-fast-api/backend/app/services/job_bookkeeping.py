@@ -0,0 +1,209 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import delete, select, update
+
+from app.core.config import settings
+from app.db.database import async_session_scope, mark_user_write
+from app.models.history import History
+from app.models.job_output import JobOutput, JobOutputChunk
+from app.models.pdf import PDF, PDFStatus
+from app.models.user import User
+from app.services.credit_ledger import settle_job_hold
+
+logger = logging.getLogger(__name__)
+
+# How durable a status update is when its await returns
+DURABILITY_SYNC = "sync"    # Committed in its own transaction
+DURABILITY_GROUP = "group"  # Committed with other jobs' updates by the flusher, awaited
+DURABILITY_ASYNC = "async"  # Queued for the flusher, not awaited; lost if the worker dies first
+DURABILITY_MODES = (DURABILITY_SYNC, DURABILITY_GROUP, DURABILITY_ASYNC)
+
+
+def make_title(result_text: str) -> str:
+    """Create a history title from the first 100 chars, stripping basic markdown"""
+    title = result_text[:100].strip().lstrip('#*-\\s ')
+    return title or "Processed Content"
+
+
+def status_values(status: str, error_message: Optional[str] = None) -> dict:
+    """Column values for moving a PDF record to ``status``; completed records also get processed_at"""
+    values = {"status": status}
+    if error_message is not None:
+        values["error_message"] = error_message
+    if status == PDFStatus.COMPLETED:
+        values["processed_at"] = datetime.now()
+    return values
+
+
+class BookkeepingWriter:
+    """
+    Batches the per-job writes around PDF processing.
+
+    A job's closing records (PDF status, history entry, checkpoint cleanup) go
+    through complete_job in a single transaction. Status updates that don't
+    need their own commit are queued and group-committed by a background
+    flusher: everything queued within ``flush_interval`` seconds (or up to
+    ``max_batch`` records) lands in one transaction, with repeated updates
+    of the same PDF collapsed into the last one.
+    """
+
+    def __init__(self, flush_interval: float, max_batch: int, durability: str = DURABILITY_GROUP):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.durability = durability
+        self._pending: Dict[int, dict] = {}
+        self._waiters: List[asyncio.Future] = []
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        # Users known to exist, so each worker looks a user up at most once
+        self._known_users: Set[int] = set()
+
+    @classmethod
+    def from_settings(cls) -> "BookkeepingWriter":
+        return cls(
+            flush_interval=settings.BOOKKEEPING_FLUSH_INTERVAL_MS / 1000,
+            max_batch=settings.BOOKKEEPING_MAX_BATCH,
+            durability=settings.BOOKKEEPING_DURABILITY
+        )
+
+    def start(self) -> None:
+        """Start the background flusher (from the lifespan hook)"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still queued"""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    async def ensure_user(self, user_id: int) -> bool:
+        """
+        Make sure the user row exists, creating a development user if not.
+
+        Returns True if the user had to be created. Known users are remembered
+        so repeat jobs skip the lookup.
+        """
+        if user_id in self._known_users:
+            return False
+        async with async_session_scope() as db:
+            created = await db.scalar(select(User.id).where(User.id == user_id)) is None
+            if created:
+                db.add(User(id=user_id, email="dev@example.com", password="dummy_hash", first_name="Dev", is_active=True))
+        self._known_users.add(user_id)
+        return created
+
+    async def set_status(
+        self,
+        pdf_id: int,
+        status: str,
+        error_message: Optional[str] = None,
+        durability: Optional[str] = None
+    ) -> None:
+        """Move a PDF record to ``status`` with the given (or the configured) durability"""
+        durability = durability or self.durability
+        values = status_values(status, error_message)
+        if durability == DURABILITY_SYNC or self._flusher is None:
+            # No flusher running (scripts, shutdown): nothing would pick the update up
+            async with async_session_scope() as db:
+                await db.execute(update(PDF).where(PDF.id == pdf_id).values(**values))
+            return
+
+        self._pending.setdefault(pdf_id, {}).update(values)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        if durability == DURABILITY_GROUP:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    async def complete_job(
+        self,
+        pdf_id: int,
+        user_id: int,
+        pdf_name: str,
+        result_text: str,
+        job_output_id: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Record a finished job in one transaction and return the history id.
+
+        Marks the PDF completed, saves a non-empty result to history, spends
+        the credits held for the job and drops its checkpoints. A status update
+        for the PDF still waiting in the group-commit queue is superseded.
+        """
+        self._pending.pop(pdf_id, None)
+        async with async_session_scope() as db:
+            await db.execute(update(PDF).where(PDF.id == pdf_id).values(**status_values(PDFStatus.COMPLETED)))
+            history_entry = None
+            if result_text:
+                history_entry = History(
+                    user_id=user_id,
+                    pdf_name=pdf_name,
+                    title=make_title(result_text),
+                    result=result_text,
+                    # created_at and expires_at are handled by __init__
+                )
+                db.add(history_entry)
+            await settle_job_hold(db, pdf_id)
+            if job_output_id:
+                await db.execute(delete(JobOutputChunk).where(JobOutputChunk.job_output_id == job_output_id))
+                await db.execute(delete(JobOutput).where(JobOutput.id == job_output_id))
+            await db.flush()
+            history_id = history_entry.id if history_entry else None
+        # The user's history list and detail should show the new entry right away
+        mark_user_write(user_id)
+        return history_id
+
+    async def flush(self) -> int:
+        """Write every queued status update in one transaction; returns how many"""
+        if not self._pending:
+            self._resolve_waiters(self._waiters, None)
+            self._waiters = []
+            return 0
+        pending, waiters = self._pending, self._waiters
+        self._pending, self._waiters = {}, []
+        try:
+            async with async_session_scope() as db:
+                for pdf_id, values in pending.items():
+                    await db.execute(update(PDF).where(PDF.id == pdf_id).values(**values))
+        except Exception as e:
+            self._resolve_waiters(waiters, e)
+            raise
+        self._resolve_waiters(waiters, None)
+        return len(pending)
+
+    @staticmethod
+    def _resolve_waiters(waiters: List[asyncio.Future], error: Optional[Exception]) -> None:
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if error:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Bookkeeping group commit failed: {str(e)}")
+
+
+bookkeeping_writer = BookkeepingWriter.from_settings()
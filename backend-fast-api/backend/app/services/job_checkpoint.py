@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from google import genai
+from sqlalchemy import delete, select, update
+
+from app.core.config import settings
+from app.core.exceptions import CheckpointLostError
+from app.core.scheduler import job_scheduler
+from app.db.database import async_session_scope
+from app.models.job_output import JobOutput, JobOutputChunk
+from app.models.pdf import PDF, PDFStatus
+from app.services.billing_service import resolve_priority_tier
+from app.services.credit_ledger import extend_job_hold, release_job_hold
+from app.services.job_bookkeeping import bookkeeping_writer
+from app.services.pdf_pipeline import build_continuation_prompt, stream_solution
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def create_job_output(pdf_id: int, user_id: int, source_text: str, ref_book_text: str = "") -> int:
+    """Register a streaming job so its output can be checkpointed; returns its id"""
+    async with async_session_scope() as db:
+        job_output = JobOutput(
+            pdf_id=pdf_id,
+            user_id=user_id,
+            source_text=source_text,
+            ref_book_text=ref_book_text or None,
+            claimed_by=WORKER_ID
+        )
+        db.add(job_output)
+        await db.flush()
+        return job_output.id
+
+
+async def load_partial_output(job_output_id: int) -> Tuple[str, int]:
+    """Return the checkpointed output so far and the next chunk seq"""
+    async with async_session_scope() as db:
+        result = await db.execute(
+            select(JobOutputChunk.seq, JobOutputChunk.content)
+            .where(JobOutputChunk.job_output_id == job_output_id)
+            .order_by(JobOutputChunk.seq)
+        )
+        chunks = result.all()
+    partial = "".join(chunk.content for chunk in chunks)
+    next_seq = chunks[-1].seq + 1 if chunks else 0
+    return partial, next_seq
+
+
+async def discard_job_output(job_output_id: int) -> None:
+    """Drop a job's checkpoints once its result is in history (or it can't resume)"""
+    async with async_session_scope() as db:
+        await db.execute(delete(JobOutputChunk).where(JobOutputChunk.job_output_id == job_output_id))
+        await db.execute(delete(JobOutput).where(JobOutput.id == job_output_id))
+
+
+class CheckpointWriter:
+    """
+    Batches streamed output into job_output_chunks.
+
+    Text is buffered and written once the buffer reaches ``max_chars`` or
+    ``interval`` seconds have passed since the last write, so a long answer
+    costs a handful of small inserts instead of one per Gemini chunk. Each
+    write also touches the job's updated_at, which serves as its heartbeat,
+    and runs in its own short session so no connection is held between writes.
+
+    While Gemini is silent, ``start_heartbeat`` keeps updated_at (and the
+    job's credit hold) fresh so the job is not taken for abandoned. Every
+    touch checks the job is still claimed by this worker; once another
+    worker has claimed it, writes stop with CheckpointLostError.
+    """
+
+    def __init__(
+        self,
+        job_output_id: int,
+        next_seq: int = 0,
+        max_chars: int = settings.CHECKPOINT_MAX_CHARS,
+        interval: float = settings.CHECKPOINT_INTERVAL_SECONDS,
+        pdf_id: Optional[int] = None,
+    ):
+        self.job_output_id = job_output_id
+        self.next_seq = next_seq
+        self.max_chars = max_chars
+        self.interval = interval
+        self.pdf_id = pdf_id
+        self.lost = False
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def append(self, text: str) -> None:
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        if self._buffered_chars >= self.max_chars or time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if self.lost:
+            raise CheckpointLostError(f"Job {self.job_output_id} was claimed by another worker")
+        if not self._buffer:
+            return
+        async with async_session_scope() as db:
+            # Touch first: a lost claim rolls the chunk back with it
+            await self._touch(db)
+            db.add(JobOutputChunk(
+                job_output_id=self.job_output_id,
+                seq=self.next_seq,
+                content="".join(self._buffer)
+            ))
+        self.next_seq += 1
+        self._buffer = []
+        self._buffered_chars = 0
+
+    async def _touch(self, db) -> None:
+        result = await db.execute(
+            update(JobOutput)
+            .where(JobOutput.id == self.job_output_id, JobOutput.claimed_by == WORKER_ID)
+            .values(updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 0:
+            self.lost = True
+            raise CheckpointLostError(f"Job {self.job_output_id} was claimed by another worker")
+
+    async def heartbeat(self) -> None:
+        """Mark the job alive without writing output"""
+        async with async_session_scope() as db:
+            await self._touch(db)
+        if self.pdf_id:
+            await extend_job_hold(self.pdf_id)
+
+    async def _run_heartbeat(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.heartbeat()
+            except CheckpointLostError:
+                logger.warning("Job %s was claimed by another worker, stopping its heartbeat", self.job_output_id)
+                return
+            except Exception as e:
+                logger.warning("Checkpoint heartbeat for job %s failed: %s", self.job_output_id, e)
+
+    def start_heartbeat(self, interval: float = settings.CHECKPOINT_HEARTBEAT_SECONDS) -> None:
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat(interval))
+
+    def stop_heartbeat(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+
+async def claim_stale_job(job_output_id: int) -> bool:
+    """Atomically take over an abandoned job; False if another worker got it first"""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.CHECKPOINT_STALE_SECONDS)
+    async with async_session_scope() as db:
+        result = await db.execute(
+            update(JobOutput)
+            .where(JobOutput.id == job_output_id, JobOutput.updated_at < cutoff)
+            .values(
+                claimed_by=WORKER_ID,
+                resume_count=JobOutput.resume_count + 1,
+                updated_at=datetime.utcnow()
+            )
+        )
+    return result.rowcount == 1
+
+
+async def resume_job(job_output_id: int) -> None:
+    """Continue an interrupted job from its last checkpoint and save the result to history"""
+    try:
+        async with async_session_scope() as db:
+            job_output = await db.get(JobOutput, job_output_id)
+            pdf_record = await db.get(PDF, job_output.pdf_id)
+            user_id, pdf_id, filename = job_output.user_id, pdf_record.id, pdf_record.filename
+            source_text, resume_count = job_output.source_text, job_output.resume_count
+            ref_book_text = job_output.ref_book_text or ""
+
+        if resume_count > settings.CHECKPOINT_MAX_RESUMES:
+            logger.warning(f"Giving up on job {job_output_id} after {resume_count - 1} resumes")
+            await bookkeeping_writer.set_status(pdf_id, PDFStatus.FAILED, "Generation interrupted too many times")
+            await release_job_hold(pdf_id)
+            await discard_job_output(job_output_id)
+            return
+
+        # The hold may be close to expiring after the outage; a lapsed one is charged on completion
+        still_held = await extend_job_hold(pdf_id)
+        partial, next_seq = await load_partial_output(job_output_id)
+        logger.info(f"Resuming job {job_output_id} (PDF {pdf_id}) from {len(partial)} checkpointed chars")
+        # Same tier as the live path, so a resumed paid job does not queue behind free ones
+        tier = await resolve_priority_tier(user_id, settings.JOB_CREDIT_COST if still_held else 0)
+        async with job_scheduler.slot(user_id, tier):
+            client = genai.Client(api_key=settings.GEMINI_API_KEY)
+            checkpoint = CheckpointWriter(job_output_id, next_seq=next_seq, pdf_id=pdf_id)
+            checkpoint.start_heartbeat()
+            continuation = ""
+            try:
+                async for chunk in stream_solution(client, build_continuation_prompt(source_text, partial, ref_book_text)):
+                    if getattr(chunk, "text", None):
+                        continuation += chunk.text
+                        await checkpoint.append(chunk.text)
+                await checkpoint.flush()
+            finally:
+                checkpoint.stop_heartbeat()
+
+        await bookkeeping_writer.complete_job(pdf_id, user_id, filename, partial + continuation, job_output_id)
+        logger.info(f"Resumed job {job_output_id} completed, {len(continuation)} chars generated after resume")
+    except CheckpointLostError:
+        logger.warning("Job %s was claimed by another worker while resuming, leaving it to that worker", job_output_id)
+    except Exception as e:
+        logger.error(f"Resuming job {job_output_id} failed: {str(e)}")
+
+
+async def recover_interrupted_jobs() -> int:
+    """Resume every abandoned job this worker manages to claim; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.CHECKPOINT_STALE_SECONDS)
+    async with async_session_scope() as db:
+        result = await db.execute(
+            select(JobOutput.id)
+            .join(PDF, PDF.id == JobOutput.pdf_id)
+            .where(PDF.status == PDFStatus.PROCESSING, JobOutput.updated_at < cutoff)
+        )
+        candidate_ids = list(result.scalars().all())
+
+    claimed = [job_id for job_id in candidate_ids if await claim_stale_job(job_id)]
+    for job_id in claimed:
+        asyncio.create_task(resume_job(job_id))
+    return len(claimed)
+
+
+async def run_checkpoint_recovery(poll_seconds: Optional[float] = None) -> None:
+    """Background loop started from the lifespan hook that resumes abandoned jobs"""
+    poll_seconds = poll_seconds or settings.CHECKPOINT_STALE_SECONDS
+    while True:
+        try:
+            resumed = await recover_interrupted_jobs()
+            if resumed:
+                logger.info(f"Resuming {resumed} interrupted job(s) from checkpoints")
+        except Exception as e:
+            logger.error(f"Checkpoint recovery sweep failed: {str(e)}")
+        await asyncio.sleep(poll_seconds)
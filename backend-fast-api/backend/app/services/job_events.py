@@ -0,0 +1,105 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import WebSocket
+
+# Event types emitted by the processing pipeline
+LOG_EVENTS = ("info", "warning", "error", "debug")
+
+
+class JobEventChannel(ABC):
+    """
+    Where the processing pipeline reports progress.
+
+    The pipeline only calls ``emit``; subclasses decide the wire format, so the
+    websocket and the streaming REST endpoint share one generation path.
+    """
+
+    @abstractmethod
+    async def emit(self, event_type: str, **data: Any) -> None:
+        """Deliver one event to the client in this channel's wire format"""
+
+    async def info(self, message: str) -> None:
+        await self.emit("info", message=message)
+
+    async def warning(self, message: str) -> None:
+        await self.emit("warning", message=message)
+
+    async def error(self, message: str) -> None:
+        await self.emit("error", message=message)
+
+    async def debug(self, message: str) -> None:
+        await self.emit("debug", message=message)
+
+    async def delta(self, text: str) -> None:
+        await self.emit("delta", text=text)
+
+
+class WebSocketChannel(JobEventChannel):
+    """Renders events as the plain-text frames websocket clients already parse"""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+
+    async def emit(self, event_type: str, **data: Any) -> None:
+        if event_type in LOG_EVENTS:
+            text = f"[{event_type.upper()}] {data['message']}"
+        elif event_type == "delta":
+            text = data["text"]
+        elif event_type == "answer_start":
+            text = "\n\n **Question Paper** \n\n"
+        elif event_type == "metrics":
+            text = (
+                "\n### Metrics\n"
+                f"* Text Extraction Time: {data['extraction_time']:.2f} seconds\n"
+                f"* Generation Time: {data['generation_time']:.2f} seconds\n"
+                f"* Estimated Tokens Used: {data['token_count']}\n"
+                f"* Characters Extracted: {data['question_paper_chars']}\n"
+            )
+        elif event_type == "complete":
+            text = "\n**Processing complete.**"
+        elif event_type == "cancelled":
+            text = "[INFO] Processing cancelled."
+        else:
+            return
+        await self.websocket.send_text(text)
+
+
+class QueueChannel(JobEventChannel):
+    """Buffers events for an HTTP streaming response to drain with ``events()``"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def emit(self, event_type: str, **data: Any) -> None:
+        self._queue.put_nowait({"type": event_type, **data})
+
+    def close(self) -> None:
+        """Mark the end of the stream once the pipeline has returned"""
+        self._queue.put_nowait(None)
+
+    async def events(self, keepalive_seconds: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield events until closed; yields None after ``keepalive_seconds`` of silence"""
+        while True:
+            try:
+                event = await asyncio.wait_for(self._queue.get(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is None:
+                return
+            yield event
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """Server-Sent Events frame; a None event becomes a keep-alive comment"""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def format_ndjson(event: Optional[Dict[str, Any]]) -> str:
+    """One JSON object per line; a None event becomes a ping line"""
+    return json.dumps(event if event is not None else {"type": "ping"}) + "\n"
@@ -0,0 +1,284 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import fitz  # PyMuPDF
+from google import genai
+from google.genai import types
+from app.db.database import async_session_scope
+from app.models.pdf import PDF, PDFStatus
+from app.core.config import settings
+from app.core.exceptions import JobCancelledError
+from app.services.credit_ledger import place_job_hold, release_job_hold
+from app.services.job_bookkeeping import bookkeeping_writer
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-2.0-flash-lite"
+
+class CancelToken:
+    """
+    Cooperative cancellation flag for a processing job.
+
+    Backed by a threading.Event so extraction running in a worker thread can
+    observe a cancellation requested from the event loop.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise JobCancelledError("Job was cancelled")
+
+def extract_text_sync(file_path: str, cancel_token: Optional[CancelToken] = None) -> Tuple[str, int]:
+    """Synchronous function to extract text using PyMuPDF, checking the cancel token between pages."""
+    extracted_text = ""
+    page_count = 0
+    logger.debug("[extract_text_sync] Starting extraction for: %s", file_path)
+    try:
+        # Verify the file is still accessible
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"[extract_text_sync] PDF file disappeared before extraction could start")
+        
+        # Log detailed information about the file (the stat is only done for the log)
+        if logger.isEnabledFor(logging.DEBUG):
+            file_info = os.stat(file_path)
+            logger.debug("[extract_text_sync] File details: Size=%d bytes, Permissions=%03o", file_info.st_size, file_info.st_mode & 0o777)
+        
+        # Open the PDF file with error diagnostics
+        try:
+            pdf_document = fitz.open(file_path)
+            page_count = len(pdf_document)
+            logger.debug("[extract_text_sync] PDF opened successfully: %d pages", page_count)
+        except Exception as open_error:
+            raise ValueError(f"[extract_text_sync] Failed to open PDF document: {str(open_error)}")
+        
+        # Make sure we have a valid document
+        if not pdf_document:
+            raise ValueError("[extract_text_sync] PDF document is None or invalid")
+            
+        if page_count == 0:
+            raise ValueError("[extract_text_sync] PDF document has no pages")
+        
+        # Extract text from each page with individual page error handling
+        for page_num in range(page_count):
+            if cancel_token and cancel_token.cancelled:
+                pdf_document.close()
+                logger.info("[extract_text_sync] Cancelled after %d of %d pages", page_num, page_count)
+                raise JobCancelledError("Extraction cancelled")
+            try:
+                page = pdf_document[page_num]
+                if not page:
+                    logger.warning("[extract_text_sync] Page %d is invalid, skipping", page_num + 1)
+                    continue
+                    
+                page_text = page.get_text()
+                extracted_text += f"\n--- Page {page_num + 1} ---\n{page_text}"
+                
+                # Progress reporting for large documents (logged to server console)
+                if page_num % 5 == 0 or page_num == page_count - 1:
+                    logger.debug("[extract_text_sync] Processed page %d of %d", page_num + 1, page_count)
+                    
+            except Exception as page_error:
+                logger.warning("[extract_text_sync] Error on page %d: %s", page_num + 1, page_error)
+                extracted_text += f"\n--- Page {page_num + 1} (Error: {str(page_error)}) ---\n"
+        
+        # Close the document
+        try:
+            pdf_document.close()
+            logger.debug("[extract_text_sync] PDF document closed properly")
+        except Exception as close_error:
+            logger.warning("[extract_text_sync] Error when closing PDF: %s", close_error)
+        
+        # Check if we got any text
+        text_size = len(extracted_text)
+        if text_size == 0:
+            # Don't raise error here, let the main function decide
+            logger.warning("[extract_text_sync] No text could be extracted from the PDF")
+            
+        logger.info("[extract_text_sync] Successfully extracted %d characters from %d pages", text_size, page_count)
+        return extracted_text, page_count
+        
+    except JobCancelledError:
+        raise
+    except Exception as extract_error:
+        # Log the error and re-raise to be caught by the caller
+        logger.error("[extract_text_sync] Error during extraction: %s", extract_error)
+        raise ValueError(f"Error extracting PDF text: {str(extract_error)}")
+
+def build_prompt(extracted_text: str) -> str:
+    """Instructions for Gemini followed by the extracted PDF text"""
+    return f"""
+        You are an expert AI assistant specialized in analyzing PDF content and generating high-quality, well-structured **GitHub Flavored Markdown (GFM)** responses suitable for rendering in web applications.
+
+        **Task:** Analyze the provided PDF text and generate a detailed, accurate, and presentation-ready GFM response.
+
+        **Formatting Guidelines (Strict):**
+
+        1.  **Overall Structure:** Format your entire response using standard GFM. Use headings (`#`, `##`), lists (`*`, `-`, `1.`), bold (`**...**`), italics (`*...*`), etc.
+        2.  **Content Identification:** Identify the type of content (e.g., academic questions, technical documentation, general text) and structure your response accordingly.
+        3.  **Academic Questions:** Label solutions clearly (e.g., using `## Question 1`, `### Part a)`). Provide step-by-step explanations where appropriate.
+        4.  **Mathematical Expressions (LaTeX):** CRITICAL: Use standard LaTeX delimiters ONLY:
+            *   Inline math: Use `$` followed by the LaTeX expression, followed by `$`. Example: `The formula is $E=mc^2$.`
+            *   Display math: Use `$$` followed by the LaTeX expression, followed by `$$`. Example: `$$
+            \\sum_{{i=1}}^n i = \\frac{{n(n+1)}}{{2}}
+            $$`
+        5.  **Code Snippets:** Use standard GFM fenced code blocks:
+            *   Start the block with three backticks followed by the language name (e.g., ```c, ```python).
+            *   Place ALL code lines within the fences.
+            *   End the block with three backticks on a new line.
+            *   Example:
+                ```python
+                def hello():
+                    print("Hello")
+                ```
+        6.  **Headings and Sections:** Use headings (`#`, `##`, etc.) logically to structure the content. Address distinct parts or questions separately.
+        7.  **Diagrams/Figures:** If the PDF contains visual elements you cannot reproduce, explicitly state this (e.g., `*Note: The original document included a diagram here illustrating...*`) and describe its likely content based on context.
+        8.  **Clarity:** Ensure explanations are clear, concise, and easy to follow.
+        9.  **Error Handling:** If parts of the input text are garbled or incomprehensible, indicate this clearly, perhaps using italics: `*Unclear or garbled text segment*`.
+
+        **Output:** Start your response directly with the main content, usually beginning with a `#` title appropriate for the document (e.g., `# Solutions for [Document Title]`). Do NOT output raw HTML tags.
+
+        **Input PDF Text:**
+        --- BEGIN PDF TEXT ---
+        {extracted_text}
+        --- END PDF TEXT ---
+        """
+
+def build_full_prompt(extracted_text: str, ref_book_text: str = "") -> str:
+    """Prompt plus the extracted text (and reference book text, if any) as sent to Gemini"""
+    prompt_text = build_prompt(extracted_text)
+    if ref_book_text:
+        prompt_text += """
+            
+            I've also provided a reference book that you should use to ensure your solutions are accurate and aligned with the course material. Here is the extracted text from the reference book:
+            """
+    full_prompt = prompt_text + "\n\n" + extracted_text
+    if ref_book_text:
+        full_prompt += "\n\n" + ref_book_text
+    return full_prompt
+
+def build_continuation_prompt(extracted_text: str, partial_result: str, ref_book_text: str = "") -> str:
+    """Prompt that asks Gemini to pick up an interrupted answer where it stopped"""
+    return build_full_prompt(extracted_text, ref_book_text) + f"""
+
+        **Continuation:** Your previous response to this document was interrupted. The text between the markers below is what you already produced. Continue the response exactly where it stops. Do NOT repeat any of it and do NOT start the document over.
+
+        --- BEGIN PARTIAL RESPONSE ---
+        {partial_result}
+        --- END PARTIAL RESPONSE ---
+        """
+
+def make_generate_config() -> types.GenerateContentConfig:
+    """Generation settings shared by every processing path"""
+    return types.GenerateContentConfig(
+        temperature=0.7,
+        top_p=0.95,
+        top_k=40,
+        max_output_tokens=4096,  # Increased token limit for longer responses
+        response_mime_type="text/plain",
+    )
+
+async def create_pdf_record(user_id: int, filename: str) -> int:
+    """Insert a PDF record in the processing state and return its id"""
+    async with async_session_scope() as db:
+        pdf_record = PDF(filename=filename, user_id=user_id, status="processing")
+        db.add(pdf_record)
+        await db.flush()
+        return pdf_record.id
+
+async def stream_solution(client: genai.Client, full_prompt: str) -> AsyncIterator[types.GenerateContentResponse]:
+    """
+    Yield Gemini response chunks as they arrive without blocking the event loop.
+
+    Cancelling the consuming task (or closing this generator) closes the
+    upstream HTTP request, so an abandoned job stops spending Gemini quota.
+    """
+    response_stream = await client.aio.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=full_prompt,
+        config=make_generate_config(),
+    )
+    try:
+        async for chunk in response_stream:
+            yield chunk
+    finally:
+        aclose = getattr(response_stream, "aclose", None)
+        if aclose:
+            await aclose()
+
+async def generate_solution(client: genai.Client, full_prompt: str) -> Tuple[str, int]:
+    """Run a non-streaming Gemini generation without blocking the event loop"""
+    response = await client.aio.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=full_prompt,
+        config=make_generate_config(),
+    )
+    response_text = response.text or ""
+    token_count = response.token_count if hasattr(response, 'token_count') else len(response_text.split())
+    return response_text, token_count
+
+async def process_pdf_file(
+    file_path: str,
+    filename: str,
+    user_id: int,
+    client: genai.Client,
+    cancel_token: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    """
+    Extract, generate and record one PDF without a client connection.
+
+    Creates the PDF record, holds the job's credits, saves the result to
+    history (spending them) and returns a JSON-serializable summary. Failures
+    and cancellations are recorded on the PDF record, release the held
+    credits and are re-raised to the caller.
+    """
+    pdf_id = await create_pdf_record(user_id, filename)
+
+    try:
+        if settings.JOB_CREDIT_COST > 0:
+            await place_job_hold(user_id, pdf_id, settings.JOB_CREDIT_COST)
+        start_time = time.time()
+        extracted_text, page_count = await asyncio.to_thread(extract_text_sync, file_path, cancel_token)
+        if not extracted_text:
+            raise ValueError("No text could be extracted from the PDF")
+        extraction_time = time.time() - start_time
+
+        generation_start = time.time()
+        response_text, token_count = await generate_solution(
+            client, build_prompt(extracted_text) + "\n\n" + extracted_text
+        )
+        generation_time = time.time() - generation_start
+
+        history_id = await bookkeeping_writer.complete_job(pdf_id, user_id, filename, response_text)
+        return {
+            "pdf_id": pdf_id,
+            "history_id": history_id,
+            "solutions": response_text,
+            "metrics": {
+                "extraction_time": extraction_time,
+                "generation_time": generation_time,
+                "token_count": token_count,
+                "pages": page_count,
+                "question_paper_chars": len(extracted_text)
+            }
+        }
+    except (asyncio.CancelledError, JobCancelledError):
+        await bookkeeping_writer.set_status(pdf_id, PDFStatus.CANCELLED)
+        await asyncio.shield(release_job_hold(pdf_id))
+        raise
+    except Exception as e:
+        await bookkeeping_writer.set_status(pdf_id, PDFStatus.FAILED, str(e))
+        await release_job_hold(pdf_id)
+        raise
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from datetime import datetime
+from itertools import chain
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.http_cache import make_etag
+from app.db.database import AsyncSessionLocal
+from app.models.billing import BillingPlan
+from app.models.cache_version import CacheVersion
+from app.repositories.billing_repository import BillingRepository
+from app.schemas.billing import BillingPlanResponse
+
+logger = logging.getLogger(__name__)
+
+# CacheVersion.name of the billing plan catalog
+PLAN_CATALOG = "billing_plans"
+
+
+class PlanCatalog:
+    """Every billing plan serialized once, at one catalog version"""
+
+    def __init__(self, version: int, plans: List[BillingPlanResponse]):
+        self.version = version
+        self.plan_bodies: Dict[str, bytes] = {plan.id: plan.model_dump_json().encode() for plan in plans}
+        self.list_body = b"[" + b",".join(self.plan_bodies.values()) + b"]"
+        self.list_etag = make_etag(PLAN_CATALOG, version)
+        self.loaded_at = datetime.utcnow()
+
+    def plan_etag(self, plan_id: str) -> str:
+        return make_etag(PLAN_CATALOG, self.version, plan_id)
+
+    def plan_body(self, plan_id: str) -> Optional[bytes]:
+        return self.plan_bodies.get(plan_id)
+
+
+async def get_catalog_version(db) -> int:
+    """Current catalog version; 0 until plans are first edited"""
+    version = await db.scalar(select(CacheVersion.version).where(CacheVersion.name == PLAN_CATALOG))
+    return version or 0
+
+
+class PlanCache:
+    """
+    Per-process copy of the billing plan catalog, already serialized.
+
+    Plan endpoints read from here without touching the database. Edits to
+    BillingPlan rows bump the catalog's CacheVersion in the same transaction
+    (see the flush hook below): the editing worker reloads on its next
+    request, the others when their version watch notices the bump.
+    """
+
+    def __init__(self):
+        self._catalog: Optional[PlanCatalog] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self.loads = 0
+
+    async def get(self) -> PlanCatalog:
+        if self._catalog is not None and not self._stale:
+            return self._catalog
+        async with self._lock:
+            if self._catalog is None or self._stale:
+                try:
+                    await self.load()
+                except Exception as e:
+                    if self._catalog is None:
+                        raise
+                    logger.error(f"Reloading billing plans failed, serving version {self._catalog.version}: {str(e)}")
+        return self._catalog
+
+    async def load(self) -> PlanCatalog:
+        """Read the plans and their version in one session and swap in the new catalog"""
+        # Cleared before reading, so an edit committed meanwhile marks the result stale again
+        self._stale = False
+        try:
+            # Always the primary: a lagging replica could hand back the catalog from before the bump
+            async with AsyncSessionLocal() as db:
+                version = await get_catalog_version(db)
+                plans = await BillingRepository(db).get_all_plans()
+                catalog = PlanCatalog(version, [BillingPlanResponse.model_validate(plan) for plan in plans])
+        except Exception:
+            self._stale = True
+            raise
+        self._catalog = catalog
+        self.loads += 1
+        logger.info(f"Loaded {len(catalog.plan_bodies)} billing plan(s) at version {version}")
+        return catalog
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    async def refresh_if_changed(self) -> bool:
+        """Reload if the catalog version moved past the cached one; True if it did"""
+        if self._catalog is None:
+            return False
+        # A replica's version may trail the primary's; one cheap lookup per interval
+        async with AsyncSessionLocal() as db:
+            version = await get_catalog_version(db)
+        if version == self._catalog.version:
+            return False
+        self.invalidate()
+        await self.get()
+        return True
+
+    def stats(self) -> dict:
+        catalog = self._catalog
+        return {
+            "version": catalog.version if catalog else None,
+            "plans": len(catalog.plan_bodies) if catalog else 0,
+            "loaded_at": catalog.loaded_at.isoformat() if catalog else None,
+            "stale": self._stale,
+            "loads": self.loads,
+        }
+
+
+plan_cache = PlanCache()
+
+
+async def run_plan_version_watch(interval_seconds: Optional[float] = None) -> None:
+    """Background loop started from the lifespan hook that reloads plans edited through other workers"""
+    interval_seconds = interval_seconds or settings.PLAN_CACHE_CHECK_SECONDS
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            if await plan_cache.refresh_if_changed():
+                logger.info("Billing plans changed, cache reloaded")
+        except Exception as e:
+            logger.error(f"Billing plan version check failed: {str(e)}")
+
+
+@event.listens_for(Session, "before_flush")
+def bump_version_on_plan_edit(session: Session, flush_context, instances) -> None:
+    """Bump the catalog version in the same transaction as any insert, update or delete of a plan"""
+    if not any(isinstance(obj, BillingPlan) for obj in chain(session.new, session.dirty, session.deleted)):
+        return
+    result = session.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == PLAN_CATALOG)
+        .values(version=CacheVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        session.add(CacheVersion(name=PLAN_CATALOG, version=1, updated_at=datetime.utcnow()))
+    session.info["billing_plans_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_after_plan_edit(session: Session) -> None:
+    if session.info.pop("billing_plans_changed", False):
+        plan_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_rolled_back_plan_edit(session: Session) -> None:
+    session.info.pop("billing_plans_changed", None)
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from cachetools import LRUCache
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.exceptions import NotFoundException, PaymentError
+from app.db.database import async_session_scope, mark_user_write
+from app.models.billing import CreditTransaction
+from app.models.webhook import WebhookEvent
+from app.services.credit_ledger import LEDGER_PURCHASE, apply_credit
+
+logger = logging.getLogger(__name__)
+
+# WebhookEvent.source values
+SOURCE_RAZORPAY_WEBHOOK = "razorpay_webhook"
+SOURCE_RAZORPAY_CALLBACK = "razorpay_callback"
+
+# WebhookEvent.status values
+EVENT_PENDING = "pending"
+EVENT_PROCESSED = "processed"
+EVENT_FAILED = "failed"
+
+# Razorpay webhook events that settle or fail a purchase; any other event is stored and ignored
+PAYMENT_CAPTURED_EVENTS = ("payment.captured", "order.paid")
+PAYMENT_FAILED_EVENTS = ("payment.failed",)
+
+
+def razorpay_payment(payload: dict) -> dict:
+    """The payment entity of a Razorpay webhook body (empty if it has none)"""
+    return ((payload.get("payload") or {}).get("payment") or {}).get("entity") or {}
+
+
+class WebhookInbox:
+    """
+    Durable inbox between payment callbacks and the billing tables.
+
+    Endpoints call accept() after validating the signature: it inserts one
+    WebhookEvent and returns, so a spike of provider retries costs one small
+    insert each instead of transaction and credit updates. A background
+    consumer then claims up to ``batch_size`` pending events at a time and
+    applies them in one transaction, each event in its own savepoint so one
+    bad event does not hold back the rest.
+
+    Redeliveries are absorbed twice over: keys accepted recently by this
+    worker are answered from memory with no query at all, and any other
+    duplicate hits the unique (source, idempotency_key) index and is
+    rolled back without writing anything.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_backoff: float,
+        dedup_cache_size: int
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._recent_keys = LRUCache(maxsize=dedup_cache_size)
+        self._wakeup = asyncio.Event()
+        self._consumer: Optional[asyncio.Task] = None
+        self._counts = {"accepted": 0, "duplicates": 0, "processed": 0, "retried": 0, "failed": 0, "batches": 0}
+
+    @classmethod
+    def from_settings(cls) -> "WebhookInbox":
+        return cls(
+            batch_size=settings.WEBHOOK_BATCH_SIZE,
+            poll_interval=settings.WEBHOOK_POLL_SECONDS,
+            max_attempts=settings.WEBHOOK_MAX_ATTEMPTS,
+            retry_backoff=settings.WEBHOOK_RETRY_BACKOFF_SECONDS,
+            dedup_cache_size=settings.WEBHOOK_DEDUP_CACHE_SIZE
+        )
+
+    def start(self) -> None:
+        """Start the background consumer (from the lifespan hook)"""
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the consumer; events still pending stay in the inbox for the next start"""
+        if self._consumer:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+
+    async def accept(self, source: str, idempotency_key: str, event_type: str, payload: dict) -> bool:
+        """Store an event for the consumer; False if it was already received"""
+        key = (source, idempotency_key)
+        if key in self._recent_keys:
+            self._counts["duplicates"] += 1
+            return False
+        try:
+            async with async_session_scope() as db:
+                db.add(WebhookEvent(
+                    source=source,
+                    idempotency_key=idempotency_key,
+                    event_type=event_type,
+                    payload=payload,
+                    status=EVENT_PENDING,
+                    attempts=0,
+                    received_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            self._recent_keys[key] = True
+            self._counts["duplicates"] += 1
+            return False
+        self._recent_keys[key] = True
+        self._counts["accepted"] += 1
+        self._wakeup.set()
+        return True
+
+    async def process_batch(self) -> int:
+        """Apply up to batch_size pending events in one transaction; returns how many were claimed"""
+        credited_users: Set[int] = set()
+        now = datetime.utcnow()
+        async with async_session_scope() as db:
+            result = await db.execute(
+                select(WebhookEvent)
+                .where(
+                    WebhookEvent.status == EVENT_PENDING,
+                    or_(WebhookEvent.next_attempt_at.is_(None), WebhookEvent.next_attempt_at <= now)
+                )
+                .order_by(WebhookEvent.id)
+                .limit(self.batch_size)
+                # Lets consumers in other workers claim the next batch instead of waiting on this one
+                .with_for_update(skip_locked=True)
+            )
+            events = list(result.scalars().all())
+            if not events:
+                return 0
+            transactions = await self._load_transactions(db, events)
+            for event in events:
+                event.attempts += 1
+                try:
+                    async with db.begin_nested():
+                        user_id = await self._apply(db, event, transactions)
+                except Exception as e:
+                    event.last_error = str(e)
+                    # A PaymentError is the event itself being wrong; retrying cannot fix it
+                    if isinstance(e, PaymentError) or event.attempts >= self.max_attempts:
+                        event.status = EVENT_FAILED
+                        event.processed_at = now
+                        self._counts["failed"] += 1
+                        logger.error(f"Webhook {event.source}/{event.idempotency_key} failed for good: {str(e)}")
+                    else:
+                        event.next_attempt_at = now + timedelta(seconds=self.retry_backoff * event.attempts)
+                        self._counts["retried"] += 1
+                        logger.warning(f"Webhook {event.source}/{event.idempotency_key} failed, will retry: {str(e)}")
+                    continue
+                event.status = EVENT_PROCESSED
+                event.processed_at = now
+                event.last_error = None
+                self._counts["processed"] += 1
+                if user_id:
+                    credited_users.add(user_id)
+        self._counts["batches"] += 1
+        for user_id in credited_users:
+            mark_user_write(user_id)
+        return len(events)
+
+    async def _load_transactions(self, db: AsyncSession, events: List[WebhookEvent]) -> Dict[str, CreditTransaction]:
+        # One query for every transaction the batch refers to, by our id or by Razorpay order id
+        transaction_ids = set()
+        order_ids = set()
+        for event in events:
+            if event.source == SOURCE_RAZORPAY_CALLBACK:
+                transaction_ids.add(event.payload.get("transaction_id"))
+            else:
+                order_ids.add(razorpay_payment(event.payload).get("order_id"))
+        transaction_ids.discard(None)
+        order_ids.discard(None)
+        if not transaction_ids and not order_ids:
+            return {}
+        result = await db.execute(
+            select(CreditTransaction).where(or_(
+                CreditTransaction.transaction_id.in_(transaction_ids),
+                CreditTransaction.razorpay_order_id.in_(order_ids)
+            ))
+        )
+        transactions = {}
+        for transaction in result.scalars().all():
+            transactions[transaction.transaction_id] = transaction
+            if transaction.razorpay_order_id:
+                transactions[f"order:{transaction.razorpay_order_id}"] = transaction
+        return transactions
+
+    async def _apply(self, db: AsyncSession, event: WebhookEvent, transactions: Dict[str, CreditTransaction]) -> Optional[int]:
+        """Apply one event; returns the user whose credits changed, if any"""
+        if event.source == SOURCE_RAZORPAY_CALLBACK:
+            transaction = transactions.get(event.payload.get("transaction_id"))
+            if transaction is None:
+                raise NotFoundException(f"Transaction {event.payload.get('transaction_id')} not found")
+            # The signature only covers the order and payment ids; without this a payment for one
+            # (cheap) order could complete any other pending transaction
+            order_id = event.payload.get("razorpay_order_id")
+            if not order_id or transaction.razorpay_order_id != order_id:
+                raise PaymentError(
+                    f"Callback for order {order_id} does not match transaction "
+                    f"{transaction.transaction_id} (order {transaction.razorpay_order_id})"
+                )
+            return await self._complete(db, transaction, event.payload.get("razorpay_payment_id"))
+
+        if event.event_type not in PAYMENT_CAPTURED_EVENTS + PAYMENT_FAILED_EVENTS:
+            return None
+        payment = razorpay_payment(event.payload)
+        transaction = transactions.get(f"order:{payment.get('order_id')}")
+        if transaction is None:
+            raise NotFoundException(f"No transaction for Razorpay order {payment.get('order_id')}")
+        if event.event_type in PAYMENT_FAILED_EVENTS:
+            await self._set_status(db, transaction, "failed", payment.get("id"))
+            return None
+        return await self._complete(db, transaction, payment.get("id"))
+
+    async def _set_status(self, db: AsyncSession, transaction: CreditTransaction, status: str, payment_id: Optional[str]) -> bool:
+        # Guarded on pending, so the callback and the webhook for one payment settle it once between them
+        values = {"payment_status": status, "updated_at": datetime.utcnow()}
+        if payment_id:
+            values["razorpay_payment_id"] = payment_id
+        result = await db.execute(
+            update(CreditTransaction)
+            .where(CreditTransaction.id == transaction.id, CreditTransaction.payment_status == "pending")
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
+    async def _complete(self, db: AsyncSession, transaction: CreditTransaction, payment_id: Optional[str]) -> Optional[int]:
+        if not await self._set_status(db, transaction, "completed", payment_id):
+            return None
+        await apply_credit(db, transaction.user_id, transaction.credits_added, LEDGER_PURCHASE, transaction.transaction_id)
+        return transaction.user_id
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # Drain the backlog before sleeping again
+                while await self.process_batch() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Webhook consumer batch failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            **self._counts,
+            "batch_size": self.batch_size,
+            "recent_keys": len(self._recent_keys),
+        }
+
+
+webhook_inbox = WebhookInbox.from_settings()
@@ -0,0 +1,121 @@
+"""
+Concurrent throughput of sync Session vs AsyncSession queries inside the event loop.
+
+    python -m script.bench_db_concurrency --concurrency 50 --requests 2000
+    python -m script.bench_db_concurrency --url http://localhost:8000/api/v1/auth/get/user --token <jwt>
+
+Without --url, both access patterns run in-process against the configured MySQL
+database: "sync" issues the query the way handlers used to (a blocking Session
+call inside an async task) on a throwaway sync engine built from DATABASE_URL,
+"async" goes through AsyncSessionLocal. With --url,
+the script load-tests a running server instead, so the same command can be run
+against a build from before and after the switch.
+
+Each run also samples event loop lag: how late a 10ms sleep wakes up while the
+queries are in flight. Blocking DB calls show up there first.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.user import User
+
+# The app no longer has a sync engine; this one only exists for the comparison
+SyncSessionLocal = sessionmaker(bind=create_engine(settings.DATABASE_URL))
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def run_workload(name: str, one_request, concurrency: int, total: int):
+    latencies = []
+    lags = []
+    remaining = iter(range(total))
+    stop = asyncio.Event()
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await one_request()
+            latencies.append(time.perf_counter() - started)
+
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    print(
+        f"{name:>6}: {total / elapsed:8.1f} req/s | "
+        f"p50 {percentile(latencies, 0.50) * 1000:7.1f}ms | "
+        f"p95 {percentile(latencies, 0.95) * 1000:7.1f}ms | "
+        f"loop lag mean {statistics.mean(lags or [0]) * 1000:6.1f}ms max {max(lags or [0]) * 1000:6.1f}ms"
+    )
+
+
+async def sync_request():
+    # What handlers used to do: a blocking round trip on the event loop thread
+    db = SyncSessionLocal()
+    try:
+        db.query(User.id).order_by(User.id).limit(1).first()
+        db.execute(text("SELECT SLEEP(0.005)"))
+    finally:
+        db.close()
+
+
+async def async_request():
+    async with AsyncSessionLocal() as db:
+        await db.execute(select(User.id).order_by(User.id).limit(1))
+        await db.execute(text("SELECT SLEEP(0.005)"))
+
+
+async def bench_db(concurrency: int, total: int):
+    print(f"In-process DB benchmark: {total} requests, concurrency {concurrency}")
+    await run_workload("sync", sync_request, concurrency, total)
+    await run_workload("async", async_request, concurrency, total)
+
+
+async def bench_http(url: str, token: str, concurrency: int, total: int):
+    import httpx
+
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=60) as client:
+        async def http_request():
+            response = await client.get(url)
+            response.raise_for_status()
+
+        print(f"HTTP benchmark against {url}: {total} requests, concurrency {concurrency}")
+        await run_workload("http", http_request, concurrency, total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--url", help="Load-test a running server instead of the in-process comparison")
+    parser.add_argument("--token", help="Bearer token for --url")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_http(args.url, args.token, args.concurrency, args.requests))
+    else:
+        asyncio.run(bench_db(args.concurrency, args.requests))
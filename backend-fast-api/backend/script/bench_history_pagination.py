@@ -0,0 +1,131 @@
+"""
+History list cost: loading every row (with result bodies) vs keyset pages.
+
+    python -m script.bench_history_pagination --items 5000 --result-kb 20
+    python -m script.bench_history_pagination --database-url sqlite+aiosqlite:////tmp/bench.db
+
+Seeds a throwaway user with --items history rows whose results are
+--result-kb of markdown each, then times:
+
+  full      the old list query: every History row of the user, result included
+  first     the first page of the keyset-paginated list
+  deep      a page near the end, reached through its cursor
+  walk      following next_cursor through the whole history
+
+The seeded user and its history are deleted afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db.base_class import Base
+from app.models.history import History
+from app.models.user import User
+from app.repositories.history_repository import HistoryRepository
+
+BENCH_EMAIL = "bench-history@example.com"
+
+
+async def seed(session_factory, items: int, result_kb: int) -> int:
+    result = ("# Answer\n" + "Lorem ipsum dolor sit amet. " * 40 + "\n") * max(1, result_kb * 1024 // 1130)
+    async with session_factory() as db:
+        user = await db.scalar(select(User).where(User.email == BENCH_EMAIL))
+        if user:
+            await db.execute(delete(History).where(History.user_id == user.id))
+        else:
+            user = User(email=BENCH_EMAIL, password="x", first_name="Bench")
+            db.add(user)
+            await db.flush()
+        now = datetime.utcnow()
+        for start in range(0, items, 500):
+            rows = [
+                {
+                    "user_id": user.id,
+                    "pdf_name": f"paper_{i}.pdf",
+                    "title": f"Question paper {i}",
+                    "result": result,
+                    "created_at": now - timedelta(seconds=i),
+                    "expires_at": now + timedelta(days=10),
+                }
+                for i in range(start, min(items, start + 500))
+            ]
+            await db.execute(insert(History), rows)
+        await db.commit()
+        return user.id
+
+
+async def timed(name: str, coro):
+    started = time.perf_counter()
+    rows = await coro
+    print(f"{name:>6}: {(time.perf_counter() - started) * 1000:9.1f}ms  {rows} rows")
+
+
+async def bench(database_url: str, items: int, result_kb: int, page_size: int, keep: bool):
+    engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    if database_url.startswith("sqlite"):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    print(f"Seeding {items} history items of ~{result_kb}KB each")
+    user_id = await seed(session_factory, items, result_kb)
+
+    async def full():
+        async with session_factory() as db:
+            result = await db.execute(
+                select(History).where(History.user_id == user_id).order_by(History.created_at.desc())
+            )
+            return len(result.scalars().all())
+
+    async def first():
+        async with session_factory() as db:
+            rows, _ = await HistoryRepository(db).get_user_history(user_id, page_size)
+            return len(rows)
+
+    async def walk(stop_before_last: bool = False):
+        before, seen = None, 0
+        async with session_factory() as db:
+            repo = HistoryRepository(db)
+            while True:
+                rows, has_more = await repo.get_user_history(user_id, page_size, before)
+                seen += len(rows)
+                if not has_more:
+                    return seen
+                before = (rows[-1].created_at, rows[-1].id)
+                if stop_before_last and seen + page_size >= items:
+                    return before
+
+    async def deep(before):
+        async with session_factory() as db:
+            rows, _ = await HistoryRepository(db).get_user_history(user_id, page_size, before)
+            return len(rows)
+
+    await timed("full", full())
+    await timed("first", first())
+    # Locate the last page's cursor up front so only the deep query itself is timed
+    await timed("deep", deep(await walk(stop_before_last=True)))
+    await timed("walk", walk())
+
+    if not keep:
+        async with session_factory() as db:
+            await db.execute(delete(History).where(History.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--result-kb", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=settings.HISTORY_PAGE_SIZE)
+    parser.add_argument("--database-url", default=settings.ASYNC_DATABASE_URL)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded rows")
+    args = parser.parse_args()
+
+    asyncio.run(bench(args.database_url, args.items, args.result_kb, args.page_size, args.keep))
@@ -0,0 +1,72 @@
+"""
+Login throughput under concurrency: inline bcrypt vs the bounded hashing executor.
+
+    python -m script.bench_password_hashing --concurrency 50 --requests 200
+    python -m script.bench_password_hashing --url http://localhost:8000/api/v1/auth/login --email a@b.c --password secret
+
+Without --url, password verification runs in-process three ways: "inline"
+calls bcrypt on the event loop the way AuthService used to, "thread" and
+"process" go through PasswordHashPool with --workers workers. With --url,
+the script load-tests the login endpoint of a running server instead.
+
+Loop lag (how late a 10ms sleep wakes up) is what every websocket stream on
+the same worker feels while logins are being verified.
+"""
+import argparse
+import asyncio
+
+from app.core.password_hashing import PasswordHashPool
+from app.core.security import get_password_hash, verify_password
+from script.bench_db_concurrency import run_workload
+
+
+async def bench_local(concurrency: int, total: int, workers: int):
+    hashed = get_password_hash("correct horse battery staple")
+    print(f"In-process login verification: {total} requests, concurrency {concurrency}, {workers} workers")
+
+    async def inline_verify():
+        verify_password("correct horse battery staple", hashed)
+
+    await run_workload("inline", inline_verify, concurrency, total)
+
+    for kind in ("thread", "process"):
+        pool = PasswordHashPool(max_workers=workers, max_queue=total, kind=kind)
+        # Start the workers before timing (process workers have to import the app)
+        await pool.verify("warm up", hashed)
+
+        async def pooled_verify():
+            await pool.verify("correct horse battery staple", hashed)
+
+        await run_workload(kind, pooled_verify, concurrency, total)
+        wait = pool.stats()["queue_wait_seconds"]
+        print(f"{'':>6}  queue wait p50 {wait['p50']}s p95 {wait['p95']}s max {wait['max']}s")
+        pool.shutdown()
+
+
+async def bench_http(url: str, email: str, password: str, concurrency: int, total: int):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def login():
+            response = await client.post(url, json={"email": email, "password": password})
+            response.raise_for_status()
+
+        print(f"HTTP login benchmark against {url}: {total} requests, concurrency {concurrency}")
+        await run_workload("http", login, concurrency, total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--url", help="Load-test a running server's login endpoint instead")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_http(args.url, args.email, args.password, args.concurrency, args.requests))
+    else:
+        asyncio.run(bench_local(args.concurrency, args.requests, args.workers))
@@ -0,0 +1,115 @@
+"""
+Phone login lookup cost: scanning users.phone_number vs the unique phone_e164 index.
+
+    python -m script.bench_phone_lookup --users 1000000 --lookups 200
+    python -m script.bench_phone_lookup --database-url sqlite+aiosqlite:////tmp/bench.db --users 100000
+
+Seeds --users throwaway accounts with distinct phone numbers, then times
+--lookups random phone logins two ways:
+
+  scan      the old query, WHERE phone_number = ... (no index: full table scan)
+  indexed   AuthRepository.get_user_by_phone, WHERE phone_e164 = ... (unique index)
+
+The seeded users are deleted afterwards unless --keep is given; with --keep
+a second run reuses them instead of seeding again.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.phone import normalize_phone
+from app.db.base_class import Base
+from app.models.user import User
+from app.repositories.auth_repository import AuthRepository
+
+BENCH_EMAIL_PREFIX = "bench-phone-"
+SEED_BATCH = 10000
+
+
+def bench_phone(i: int) -> str:
+    # Valid Indian mobile numbers, as typed without the country code
+    return f"9{i:09d}"
+
+
+async def seed(session_factory, users: int) -> None:
+    async with session_factory() as db:
+        existing = await db.scalar(
+            select(func.count()).select_from(User).where(User.email.like(f"{BENCH_EMAIL_PREFIX}%"))
+        )
+        if existing == users:
+            print(f"Reusing {users} seeded users")
+            return
+        await db.execute(delete(User).where(User.email.like(f"{BENCH_EMAIL_PREFIX}%")))
+        print(f"Seeding {users} users")
+        for start in range(0, users, SEED_BATCH):
+            rows = [
+                {
+                    "email": f"{BENCH_EMAIL_PREFIX}{i}@example.com",
+                    "password": "x",
+                    "first_name": "Bench",
+                    "phone_number": bench_phone(i),
+                    "phone_e164": normalize_phone(bench_phone(i)),
+                }
+                for i in range(start, min(users, start + SEED_BATCH))
+            ]
+            await db.execute(insert(User), rows)
+            await db.commit()
+
+
+async def timed(name: str, lookups: list, lookup) -> None:
+    latencies = []
+    for phone in lookups:
+        started = time.perf_counter()
+        user = await lookup(phone)
+        latencies.append(time.perf_counter() - started)
+        assert user is not None, phone
+    latencies.sort()
+    print(
+        f"{name:>8}: {sum(latencies) * 1000:9.1f}ms total  "
+        f"p50 {latencies[len(latencies) // 2] * 1000:7.2f}ms  "
+        f"max {latencies[-1] * 1000:7.2f}ms"
+    )
+
+
+async def bench(database_url: str, users: int, lookups: int, keep: bool):
+    engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    if database_url.startswith("sqlite"):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    await seed(session_factory, users)
+    sample = [bench_phone(random.randrange(users)) for _ in range(lookups)]
+
+    async with session_factory() as db:
+        async def scan(phone: str):
+            return await db.scalar(select(User.id).where(User.phone_number == phone))
+
+        async def indexed(phone: str):
+            return await AuthRepository(db).get_user_by_phone(phone)
+
+        print(f"{lookups} phone lookups against {users} users")
+        await timed("scan", sample, scan)
+        await timed("indexed", sample, indexed)
+
+    if not keep:
+        async with session_factory() as db:
+            await db.execute(delete(User).where(User.email.like(f"{BENCH_EMAIL_PREFIX}%")))
+            await db.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--database-url", default=settings.ASYNC_DATABASE_URL)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded users")
+    args = parser.parse_args()
+
+    asyncio.run(bench(args.database_url, args.users, args.lookups, args.keep))
@@ -1,4 +1,6 @@
-from app.db.database import Base, engine
+from app.core.config import settings
+from app.db.database import Base
+from sqlalchemy import create_engine
 from sqlalchemy_utils import database_exists, create_database
 from app.api.models import User, PDF
 import logging
@@ -8,6 +10,8 @@ logging.basicConfig()
 logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
 
 def init_db():
+    # One-off sync engine; the app itself only has the async one
+    engine = create_engine(settings.DATABASE_URL)
     # Create database if it doesn't exist
     if not database_exists(engine.url):
         create_database(engine.url)
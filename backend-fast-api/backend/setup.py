@@ -20,11 +20,14 @@ AUTH_DEPENDENCIES = [
     "bcrypt==4.3.0",
     "python-multipart==0.0.6",
     "ecdsa==0.19.1",
+    "phonenumbers==9.0.2",
 ]
 
 # Database and validation
 DB_DEPENDENCIES = [
     "PyMySQL==1.1.0",
+    "aiomysql==0.2.0",
+    "greenlet==3.0.3",
     "email_validator==2.2.0",
     "dnspython==2.7.0",
 ]
@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.exceptions import InsufficientCreditsError
+from app.db import database
+from app.db.base import Base
+from app.models.billing import CreditHold, CreditLedgerEntry, UserCredit
+from app.models.user import User
+from app.services.credit_ledger import (
+    HOLD_HELD,
+    HOLD_RELEASED,
+    HOLD_SETTLED,
+    LEDGER_JOB,
+    LEDGER_PURCHASE,
+    apply_credit,
+    extend_job_hold,
+    job_reference,
+    place_job_hold,
+    release_expired_holds,
+    release_job_hold,
+    settle_job_hold,
+)
+from app.services.pdf_pipeline import create_pdf_record
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """Point the app's async sessions at a fresh SQLite file"""
+    path = tmp_path / "ledger.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    original = database.AsyncSessionLocal.kw["bind"]
+    database.AsyncSessionLocal.configure(bind=engine)
+    yield engine
+    database.AsyncSessionLocal.configure(bind=original)
+    asyncio.run(engine.dispose())
+
+
+async def seed_user(credits):
+    """A user who bought ``credits`` credits; returns the user id"""
+    async with database.async_session_scope() as db:
+        user = User(email="student@example.com", password="x", first_name="Student")
+        db.add(user)
+        await db.flush()
+        await apply_credit(db, user.id, credits, LEDGER_PURCHASE, "txn_1")
+        return user.id
+
+
+async def settle(pdf_id):
+    async with database.async_session_scope() as db:
+        return await settle_job_hold(db, pdf_id)
+
+
+async def load_state(user_id):
+    async with database.async_session_scope() as db:
+        credits = await db.scalar(select(UserCredit).where(UserCredit.user_id == user_id))
+        holds = dict((await db.execute(select(CreditHold.pdf_id, CreditHold.status))).all())
+        ledger = (await db.execute(
+            select(CreditLedgerEntry.kind, CreditLedgerEntry.amount).order_by(CreditLedgerEntry.id)
+        )).all()
+    return (credits.credits_balance, credits.credits_held), holds, [tuple(entry) for entry in ledger]
+
+
+def test_ledger_entry_is_applied_once(db_engine):
+    async def scenario():
+        user_id = await seed_user(5)
+        async with database.async_session_scope() as db:
+            again = await apply_credit(db, user_id, 5, LEDGER_PURCHASE, "txn_1")
+            other = await apply_credit(db, user_id, 3, LEDGER_PURCHASE, "txn_2")
+        return (again, other), await load_state(user_id)
+
+    applied, (credits, _, ledger) = asyncio.run(scenario())
+    assert applied == (False, True)
+    assert credits == (8, 0)
+    assert ledger == [(LEDGER_PURCHASE, 5), (LEDGER_PURCHASE, 3)]
+
+
+def test_concurrent_holds_never_exceed_balance(db_engine):
+    async def scenario():
+        user_id = await seed_user(2)
+        pdf_ids = [await create_pdf_record(user_id, f"paper{index}.pdf") for index in range(5)]
+        results = await asyncio.gather(
+            *(place_job_hold(user_id, pdf_id, 1) for pdf_id in pdf_ids), return_exceptions=True
+        )
+        return results, await load_state(user_id)
+
+    results, (credits, holds, _) = asyncio.run(scenario())
+    refused = [result for result in results if isinstance(result, InsufficientCreditsError)]
+    assert len(refused) == 3
+    assert refused[0].available == 0
+    assert credits == (2, 2)
+    assert list(holds.values()) == [HOLD_HELD, HOLD_HELD]
+
+
+def test_settle_charges_and_release_refunds(db_engine):
+    async def scenario():
+        user_id = await seed_user(3)
+        done, failed = [await create_pdf_record(user_id, name) for name in ("done.pdf", "failed.pdf")]
+        await place_job_hold(user_id, done, 1)
+        await place_job_hold(user_id, failed, 1)
+        charged = (await settle(done), await settle(done))
+        released = (await release_job_hold(failed), await release_job_hold(failed))
+        return done, failed, charged, released, await load_state(user_id)
+
+    done, failed, charged, released, (credits, holds, ledger) = asyncio.run(scenario())
+    assert charged == (1, 0)
+    assert released == (True, False)
+    assert credits == (2, 0)
+    assert holds == {done: HOLD_SETTLED, failed: HOLD_RELEASED}
+    assert ledger == [(LEDGER_PURCHASE, 3), (LEDGER_JOB, -1)]
+
+
+def test_expired_hold_is_released_and_still_charged_on_completion(db_engine):
+    async def scenario():
+        user_id = await seed_user(3)
+        running, abandoned = [await create_pdf_record(user_id, name) for name in ("running.pdf", "abandoned.pdf")]
+        await place_job_hold(user_id, running, 1)
+        await place_job_hold(user_id, abandoned, 1)
+        async with database.async_session_scope() as db:
+            await db.execute(update(CreditHold).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        swept = await release_expired_holds()
+        extended = await extend_job_hold(running)
+        # The job outlived its hold but finished; it is charged exactly once
+        charged = (await settle(running), await settle(running))
+        return running, abandoned, swept, extended, charged, await load_state(user_id)
+
+    running, abandoned, swept, extended, charged, (credits, holds, ledger) = asyncio.run(scenario())
+    assert swept == 2
+    assert extended is False
+    assert charged == (1, 0)
+    assert credits == (2, 0)
+    assert holds == {running: HOLD_SETTLED, abandoned: HOLD_RELEASED}
+    assert ledger == [(LEDGER_PURCHASE, 3), (LEDGER_JOB, -1)]
+    assert job_reference(running) == f"pdf:{running}"
+
+
+def test_extended_hold_survives_the_sweep(db_engine):
+    async def scenario():
+        user_id = await seed_user(1)
+        pdf_id = await create_pdf_record(user_id, "long.pdf")
+        await place_job_hold(user_id, pdf_id, 1)
+        async with database.async_session_scope() as db:
+            await db.execute(update(CreditHold).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        extended = await extend_job_hold(pdf_id)
+        return extended, await release_expired_holds(), await load_state(user_id)
+
+    extended, swept, (credits, holds, _) = asyncio.run(scenario())
+    assert extended is True
+    assert swept == 0
+    assert credits == (1, 1)
+    assert list(holds.values()) == [HOLD_HELD]
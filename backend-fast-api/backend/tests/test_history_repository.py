@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import database
+from app.db.base import Base
+from app.models.history import History
+from app.models.user import User
+from app.repositories.history_repository import (
+    HistoryRepository,
+    decode_history_cursor,
+    encode_history_cursor,
+    highlight_terms,
+)
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """Point the app's async sessions at a fresh SQLite file"""
+    path = tmp_path / "history.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    original = database.AsyncSessionLocal.kw["bind"]
+    database.AsyncSessionLocal.configure(bind=engine)
+    yield engine
+    database.AsyncSessionLocal.configure(bind=original)
+    asyncio.run(engine.dispose())
+
+
+async def seed_user(*results):
+    """A user with one history item per result text; returns the user id"""
+    async with database.async_session_scope() as db:
+        user = User(email="student@example.com", password="x", first_name="Student")
+        db.add(user)
+        await db.flush()
+        for index, result in enumerate(results):
+            db.add(History(user_id=user.id, pdf_name=f"paper{index}.pdf", title=f"Paper {index}", result=result))
+        return user.id
+
+
+async def list_pages(user_id, limit):
+    """Walk a user's history page by page through the cursor, as a client would"""
+    pages, before = [], None
+    while True:
+        async with database.AsyncSessionLocal() as db:
+            rows, has_more = await HistoryRepository(db).get_user_history(user_id, limit, before)
+        pages.append([row.id for row in rows])
+        if not has_more:
+            return pages
+        before = decode_history_cursor(encode_history_cursor(rows[-1].created_at, rows[-1].id))
+
+
+def test_history_pages_by_keyset(db_engine):
+    async def scenario():
+        user_id = await seed_user(*(f"Answer {index}" for index in range(7)))
+        now = datetime.utcnow()
+        async with database.async_session_scope() as db:
+            # Items 1-4 share a timestamp so pages have to split the tie by id
+            await db.execute(update(History).where(History.id.between(1, 4)).values(created_at=now - timedelta(hours=1)))
+            await db.execute(update(History).where(History.id == 5).values(created_at=now - timedelta(hours=2)))
+            await db.execute(update(History).where(History.id == 6).values(created_at=now))
+            # Expired but not purged yet
+            await db.execute(update(History).where(History.id == 7).values(expires_at=now - timedelta(seconds=1)))
+        return await list_pages(user_id, 2), await list_pages(user_id, 5)
+
+    small_pages, exact_pages = asyncio.run(scenario())
+    assert small_pages == [[6, 4], [3, 2], [1, 5]]
+    assert exact_pages == [[6, 4, 3, 2, 1], [5]]
+
+
+def test_history_cursor_round_trips():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_history_cursor(encode_history_cursor(created_at, 42)) == (created_at, 42)
+    for cursor in ("not-a-cursor", encode_history_cursor(created_at, 42)[:-4], ""):
+        with pytest.raises(ValueError):
+            decode_history_cursor(cursor)
+
+
+def test_highlight_terms_escapes_html():
+    snippet = highlight_terms('<img src=x onerror="alert(1)"> Entropy & heat', ["entropy", "img"])
+    assert snippet == (
+        "&lt;<mark>img</mark> src=x onerror=&quot;alert(1)&quot;&gt; <mark>Entropy</mark> &amp; heat"
+    )
+    assert highlight_terms("<b>bold</b>", []) == "&lt;b&gt;bold&lt;/b&gt;"
+
+
+def test_search_snippet_escapes_html(db_engine):
+    async def scenario():
+        user_id = await seed_user("The <script>alert(1)</script> entropy of a closed system")
+        async with database.async_session_scope() as db:
+            return await HistoryRepository(db).search_user_history(user_id, "entropy", 10)
+
+    hits = asyncio.run(scenario())
+    assert len(hits) == 1
+    snippet = hits[0]["snippet"]
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in snippet
+    assert "<mark>entropy</mark>" in snippet
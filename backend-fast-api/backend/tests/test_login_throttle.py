@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from starlette.requests import Request
+
+from app.core import login_throttle as throttle_module
+from app.core.exceptions import RateLimitedError
+from app.core.login_throttle import LoginThrottle, MemoryRateLimitBackend, client_ip, parse_trusted_proxies
+
+WINDOW = 60.0
+IP_LIMIT = 3
+IDENTIFIER_LIMIT = 2
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze the throttle's clock so windows can be stepped through"""
+    fake = FakeClock()
+    # Only the throttle module's view of time; the event loop keeps the real clock
+    monkeypatch.setattr(throttle_module, "time", SimpleNamespace(monotonic=fake, time=fake))
+    return fake
+
+
+def make_throttle():
+    backend = MemoryRateLimitBackend(max_keys=100, window_seconds=WINDOW)
+    return LoginThrottle(backend, window_seconds=WINDOW, ip_limit=IP_LIMIT, identifier_limit=IDENTIFIER_LIMIT)
+
+
+def attempt(throttle, ip, identifier):
+    """None if the attempt is let through, else the RateLimitedError"""
+    try:
+        asyncio.run(throttle.check(ip, identifier))
+    except RateLimitedError as limited:
+        return limited
+    return None
+
+
+def test_identifier_limit_slides(clock):
+    throttle = make_throttle()
+    assert attempt(throttle, "10.0.0.1", "student@example.com") is None
+    clock.now += 20
+    assert attempt(throttle, "10.0.0.2", "Student@Example.com ") is None
+
+    limited = attempt(throttle, "10.0.0.3", "student@example.com")
+    assert limited.reason == "login_identifier"
+    # Frees up when the first attempt leaves the window, 40s from now
+    assert limited.retry_after == 40
+
+    clock.now += 40
+    assert attempt(throttle, "10.0.0.3", "student@example.com") is None
+    # The second attempt is still in the window, so the budget is spent again
+    assert attempt(throttle, "10.0.0.3", "student@example.com").reason == "login_identifier"
+    assert throttle.stats()["rejected"] == {"ip": 0, "identifier": 2}
+
+
+def test_only_failures_count_against_the_ip(clock):
+    throttle = make_throttle()
+    # Many users behind one address log in fine
+    for index in range(IP_LIMIT * 3):
+        assert attempt(throttle, "10.0.0.1", f"user{index}@example.com") is None
+
+    for _ in range(IP_LIMIT):
+        asyncio.run(throttle.record_failure("10.0.0.1"))
+    limited = attempt(throttle, "10.0.0.1", "someone@example.com")
+    assert limited.reason == "login_ip"
+    assert limited.retry_after == WINDOW
+    # Other addresses are unaffected
+    assert attempt(throttle, "10.0.0.2", "someone@example.com") is None
+
+    clock.now += WINDOW
+    assert attempt(throttle, "10.0.0.1", "someone-else@example.com") is None
+
+
+def test_successful_login_resets_the_identifier(clock):
+    throttle = make_throttle()
+    for _ in range(IDENTIFIER_LIMIT):
+        assert attempt(throttle, "10.0.0.1", "student@example.com") is None
+    asyncio.run(throttle.reset("student@example.com"))
+    assert attempt(throttle, "10.0.0.1", "student@example.com") is None
+
+
+def test_phone_spellings_share_one_budget(clock):
+    throttle = make_throttle()
+    assert attempt(throttle, "10.0.0.1", "+91 98765 43210") is None
+    assert attempt(throttle, "10.0.0.2", "09876543210") is None
+    assert attempt(throttle, "10.0.0.3", "+919876543210").reason == "login_identifier"
+
+
+def test_backend_errors_let_logins_through(clock):
+    class BrokenBackend:
+        async def peek(self, *args):
+            raise ConnectionError("backend down")
+
+        hit = peek
+
+    throttle = LoginThrottle(BrokenBackend(), window_seconds=WINDOW, ip_limit=IP_LIMIT, identifier_limit=IDENTIFIER_LIMIT)
+    for _ in range(IDENTIFIER_LIMIT + 1):
+        assert attempt(throttle, "10.0.0.1", "student@example.com") is None
+    assert throttle.stats()["backend_errors"] == 2 * (IDENTIFIER_LIMIT + 1)
+
+
+def make_request(peer, forwarded_for=None):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "client": (peer, 12345), "headers": headers})
+
+
+def test_client_ip_honours_only_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(throttle_module, "TRUSTED_PROXIES", parse_trusted_proxies("10.0.0.0/8, 192.168.1.1"))
+    # Straight from the internet: the header is the client's to forge
+    assert client_ip(make_request("203.0.113.7", "1.2.3.4")) == "203.0.113.7"
+    # Through our proxies: the rightmost untrusted hop is the client, anything left of it is ignored
+    assert client_ip(make_request("10.0.0.5", "1.2.3.4, 203.0.113.7, 192.168.1.1")) == "203.0.113.7"
+    assert client_ip(make_request("10.0.0.5")) == "10.0.0.5"
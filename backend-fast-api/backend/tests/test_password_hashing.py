@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.exceptions import ServiceOverloadedError
+from app.core.password_hashing import PasswordHashPool
+
+
+@pytest.fixture
+def pool():
+    hash_pool = PasswordHashPool(max_workers=1, max_queue=1)
+    yield hash_pool
+    hash_pool.shutdown()
+
+
+def test_hash_and_verify_off_the_loop(pool):
+    async def scenario():
+        hashed = await pool.hash("correct horse")
+        return hashed, await pool.verify("correct horse", hashed), await pool.verify("wrong horse", hashed)
+
+    hashed, match, mismatch = asyncio.run(scenario())
+    assert hashed != "correct horse"
+    assert (match, mismatch) == (True, False)
+    stats = pool.stats()
+    assert (stats["running"], stats["waiting"], stats["rejected"]) == (0, 0, 0)
+    assert stats["run_time_seconds"]["count"] == 3
+    assert stats["queue_wait_seconds"]["count"] == 3
+
+
+def test_full_queue_rejects_new_work(pool):
+    gate = threading.Event()
+
+    async def scenario():
+        # One call holds the only worker, one waits for it, the next finds the queue full
+        running = asyncio.create_task(pool._run(gate.wait, 5))
+        waiting = asyncio.create_task(pool._run(sum, [1, 2]))
+        await asyncio.sleep(0.05)
+        busy = (pool.running, pool.waiting)
+        with pytest.raises(ServiceOverloadedError) as overloaded:
+            await pool.verify("correct horse", "not-a-hash")
+        gate.set()
+        return busy, overloaded.value, await running, await waiting
+
+    busy, overloaded, held, summed = asyncio.run(scenario())
+    assert busy == (1, 1)
+    assert (overloaded.reason, overloaded.retry_after) == ("password_hash_queue", 1)
+    assert (held, summed) == (True, 3)
+    stats = pool.stats()
+    assert (stats["running"], stats["waiting"], stats["rejected"]) == (0, 0, 1)
+
+
+def test_unknown_executor_kind_is_refused():
+    with pytest.raises(ValueError):
+        PasswordHashPool(max_workers=1, max_queue=1, kind="fiber")
@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import database
+from app.db.base import Base
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+from app.repositories.auth_repository import AuthRepository
+from app.services.auth_service import AuthService
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """Point the app's async sessions at a fresh SQLite file"""
+    path = tmp_path / "auth.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    original = database.AsyncSessionLocal.kw["bind"]
+    database.AsyncSessionLocal.configure(bind=engine)
+    yield engine
+    database.AsyncSessionLocal.configure(bind=original)
+    asyncio.run(engine.dispose())
+
+
+async def seed_user(is_active=True):
+    async with database.async_session_scope() as db:
+        user = User(email="student@example.com", password="x", first_name="Student", is_active=is_active)
+        db.add(user)
+        await db.flush()
+        return user.id
+
+
+async def call(method, *args):
+    """Run one AuthService call in its own session, as one request would"""
+    async with database.AsyncSessionLocal() as db:
+        return await getattr(AuthService(AuthRepository(db)), method)(*args)
+
+
+async def refresh_status(refresh_token):
+    """The new refresh token, or the HTTP status the refresh was refused with"""
+    try:
+        return (await call("refresh_tokens", refresh_token)).refresh_token
+    except HTTPException as refused:
+        return refused.status_code
+
+
+async def load_tokens():
+    async with database.async_session_scope() as db:
+        result = await db.execute(select(RefreshToken).order_by(RefreshToken.id))
+        return list(result.scalars().all())
+
+
+def test_refresh_rotates_the_token(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        first = (await call("issue_tokens", user_id)).refresh_token
+        second = await refresh_status(first)
+        third = await refresh_status(second)
+        return first, second, third, await load_tokens()
+
+    first, second, third, tokens = asyncio.run(scenario())
+    assert len({first, second, third}) == 3
+    assert len({token.family_id for token in tokens}) == 1
+    # Each token points at the one it was swapped for; only the newest is live
+    assert [token.replaced_by_id for token in tokens] == [tokens[1].id, tokens[2].id, None]
+    assert [token.revoked_at is None for token in tokens] == [False, False, True]
+
+
+def test_reused_token_revokes_the_family(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        stolen = (await call("issue_tokens", user_id)).refresh_token
+        other_login = (await call("issue_tokens", user_id)).refresh_token
+        current = await refresh_status(stolen)
+        # The rotated-away token shows up again: someone kept a copy
+        reuse = await refresh_status(stolen)
+        after_reuse = await refresh_status(current)
+        return reuse, after_reuse, await refresh_status(other_login)
+
+    reuse, after_reuse, other_login = asyncio.run(scenario())
+    assert reuse == 401
+    assert after_reuse == 401
+    # Other logins of the same user are separate families and keep working
+    assert isinstance(other_login, str)
+
+
+def test_expired_or_unknown_token_is_refused(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        token = (await call("issue_tokens", user_id)).refresh_token
+        async with database.async_session_scope() as db:
+            await db.execute(update(RefreshToken).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        return await refresh_status(token), await refresh_status("not-a-token")
+
+    assert asyncio.run(scenario()) == (401, 401)
+
+
+def test_logout_revokes_the_family(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        first = (await call("issue_tokens", user_id)).refresh_token
+        second = await refresh_status(first)
+        logged_out = await call("logout", second)
+        return logged_out, await refresh_status(second), await call("logout", "not-a-token")
+
+    assert asyncio.run(scenario()) == (True, 401, False)
+
+
+def test_inactive_user_cannot_refresh(db_engine):
+    async def scenario():
+        user_id = await seed_user(is_active=False)
+        token = (await call("issue_tokens", user_id)).refresh_token
+        return await refresh_status(token), await load_tokens()
+
+    status_code, tokens = asyncio.run(scenario())
+    assert status_code == 401
+    assert all(token.revoked_at is not None for token in tokens)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.routing import HEARTBEAT_ID, ReplicaRouter
+from app.models.replication import ReplicationHeartbeat
+
+MAX_LAG = 5.0
+
+
+@pytest.fixture
+def engines(tmp_path):
+    """Two SQLite files standing in for the primary and one replica"""
+    paths = {name: tmp_path / f"{name}.db" for name in ("primary", "replica")}
+    for path in paths.values():
+        sync_engine = create_engine(f"sqlite:///{path}")
+        ReplicationHeartbeat.__table__.create(sync_engine)
+        sync_engine.dispose()
+    primary = create_async_engine(f"sqlite+aiosqlite:///{paths['primary']}")
+    replica = create_async_engine(f"sqlite+aiosqlite:///{paths['replica']}")
+    yield primary, replica
+    asyncio.run(primary.dispose())
+    asyncio.run(replica.dispose())
+
+
+def make_router(primary, replica, sticky_seconds=60.0):
+    return ReplicaRouter(primary, [replica], max_lag=MAX_LAG, sticky_seconds=sticky_seconds)
+
+
+async def replicate(primary, replica, behind_seconds=0.0):
+    """Copy the primary's heartbeat to the replica, ``behind_seconds`` older than it is"""
+    async with primary.connect() as conn:
+        beat = await conn.scalar(select(ReplicationHeartbeat.beat_at).where(ReplicationHeartbeat.id == HEARTBEAT_ID))
+    beat -= timedelta(seconds=behind_seconds)
+    async with replica.begin() as conn:
+        await conn.execute(ReplicationHeartbeat.__table__.delete())
+        await conn.execute(ReplicationHeartbeat.__table__.insert().values(
+            id=HEARTBEAT_ID, beat_at=beat, created_at=beat, updated_at=beat
+        ))
+
+
+async def measure(router, primary, replica, behind_seconds=0.0):
+    """Two lag checks with replication in between, as the lag monitor would run them"""
+    await router.check_lag()
+    await replicate(primary, replica, behind_seconds)
+    await router.check_lag()
+
+
+def test_unmeasured_replica_falls_back_to_primary(engines):
+    primary, replica = engines
+    router = make_router(primary, replica)
+    assert router.read_engine() is primary
+
+    # One check stamps the first beat but has nothing to compare the replica against yet
+    asyncio.run(router.check_lag())
+    assert router.read_engine() is primary
+    assert [replica_status["healthy"] for replica_status in router.status().values()] == [False]
+
+
+def test_caught_up_replica_serves_reads(engines):
+    primary, replica = engines
+    router = make_router(primary, replica)
+    asyncio.run(measure(router, primary, replica))
+    assert router.read_engine() is replica
+    assert router.read_engine(user_id=1) is replica
+
+
+def test_lagging_replica_falls_back_to_primary(engines):
+    primary, replica = engines
+    router = make_router(primary, replica)
+    asyncio.run(measure(router, primary, replica, behind_seconds=MAX_LAG * 4))
+    assert router.read_engine() is primary
+
+    # Once it catches up it is used again
+    asyncio.run(measure(router, primary, replica))
+    assert router.read_engine() is replica
+
+
+def test_unreachable_replica_falls_back_to_primary(engines, tmp_path):
+    primary, _ = engines
+    missing = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    router = make_router(primary, missing)
+    asyncio.run(router.check_lag())
+    asyncio.run(router.check_lag())
+    assert router.read_engine() is primary
+    asyncio.run(missing.dispose())
+
+
+def test_writer_sticks_to_primary(engines):
+    primary, replica = engines
+    router = make_router(primary, replica)
+    asyncio.run(measure(router, primary, replica))
+
+    router.mark_write(7)
+    assert router.read_engine(user_id=7) is primary
+    # Other users and user-less reads still go to the replica
+    assert router.read_engine(user_id=8) is replica
+    assert router.read_engine() is replica
+
+
+def test_stickiness_expires(engines):
+    primary, replica = engines
+    router = make_router(primary, replica, sticky_seconds=0.05)
+    asyncio.run(measure(router, primary, replica))
+
+    router.mark_write(7)
+    assert router.read_engine(user_id=7) is primary
+    time.sleep(0.1)
+    assert router.read_engine(user_id=7) is replica
@@ -0,0 +1,122 @@
+import asyncio
+
+from app.core.scheduler import FREE_TIER, PAID_TIER, JobScheduler, parse_tier_weights
+
+
+def make_scheduler(max_concurrent=1, per_user_limit=2, starvation_seconds=60.0):
+    return JobScheduler(
+        max_concurrent=max_concurrent,
+        per_user_limit=per_user_limit,
+        tier_weights=parse_tier_weights("paid:4,free:1"),
+        starvation_seconds=starvation_seconds,
+    )
+
+
+async def settle():
+    """Let granted acquire() calls return"""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def drain(scheduler, tasks):
+    """Release jobs one at a time as they are granted and return the tickets in dispatch order"""
+    order = []
+    pending = set(tasks)
+    while pending:
+        await settle()
+        granted = [task for task in pending if task.done()]
+        assert len(granted) == scheduler.running
+        for task in granted:
+            pending.discard(task)
+            ticket = task.result()
+            order.append(ticket)
+            scheduler.release(ticket)
+    return order
+
+
+def test_tiers_share_slots_by_weight():
+    async def scenario():
+        scheduler = make_scheduler()
+        blocker = await scheduler.acquire(0, FREE_TIER)
+        tasks = [asyncio.create_task(scheduler.acquire(user_id, FREE_TIER)) for user_id in range(1, 11)]
+        tasks += [asyncio.create_task(scheduler.acquire(user_id, PAID_TIER)) for user_id in range(11, 21)]
+        await settle()
+        assert scheduler.stats()["queued"] == {PAID_TIER: 10, FREE_TIER: 10}
+        scheduler.release(blocker)
+        return await drain(scheduler, tasks), scheduler.stats()
+
+    order, stats = asyncio.run(scenario())
+    tiers = [ticket.tier for ticket in order]
+    # Weight 4:1: while both tiers have work queued, free gets about one slot in five
+    assert tiers[:12].count(PAID_TIER) == 10
+    assert tiers[:6].count(FREE_TIER) == 1
+    # Free jobs are not skipped, only spaced out
+    assert tiers.count(FREE_TIER) == 10
+    assert stats["running"] == 0
+    assert stats["tiers"][PAID_TIER]["wait_time_seconds"]["count"] == 10
+
+
+def test_per_user_limit_lets_other_users_through():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrent=3, per_user_limit=1)
+        heavy = [asyncio.create_task(scheduler.acquire(1, PAID_TIER)) for _ in range(3)]
+        light = asyncio.create_task(scheduler.acquire(2, FREE_TIER))
+        await settle()
+        # A slot stays free rather than going to a second job of user 1
+        running = (scheduler.running, [task.done() for task in heavy], light.done())
+        scheduler.release(heavy[0].result())
+        await settle()
+        after_release = [task.done() for task in heavy]
+        for task in heavy[1:2] + [light]:
+            scheduler.release(task.result())
+        await settle()
+        scheduler.release(heavy[2].result())
+        return running, after_release
+
+    running, after_release = asyncio.run(scenario())
+    assert running == (2, [True, False, False], True)
+    assert after_release == [True, True, False]
+
+
+def test_starved_job_is_promoted():
+    async def scenario():
+        scheduler = make_scheduler(starvation_seconds=0.05)
+        blocker = await scheduler.acquire(0, PAID_TIER)
+        starved = asyncio.create_task(scheduler.acquire(1, FREE_TIER))
+        await asyncio.sleep(0.1)
+        paid = [asyncio.create_task(scheduler.acquire(user_id, PAID_TIER)) for user_id in range(2, 6)]
+        await settle()
+        scheduler.release(blocker)
+        order = await drain(scheduler, [starved] + paid)
+        return order, scheduler.stats()["starvation_promotions"]
+
+    order, promotions = asyncio.run(scenario())
+    assert order[0].user_id == 1
+    assert promotions >= 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = make_scheduler()
+        blocker = await scheduler.acquire(0, PAID_TIER)
+        waiting = asyncio.create_task(scheduler.acquire(1, PAID_TIER))
+        await settle()
+        waiting.cancel()
+        await settle()
+        queued = scheduler.queued
+        scheduler.release(blocker)
+        async with scheduler.slot(2, FREE_TIER) as ticket:
+            inside = (scheduler.running, ticket.user_id)
+        return queued, inside, scheduler.running
+
+    assert asyncio.run(scenario()) == (0, (1, 2), 0)
+
+
+def test_unknown_tier_is_scheduled_as_free():
+    async def scenario():
+        scheduler = make_scheduler()
+        async with scheduler.slot(1, "enterprise") as ticket:
+            return ticket.tier
+
+    assert asyncio.run(scenario()) == FREE_TIER
+    assert parse_tier_weights("paid:4, gold:0") == {PAID_TIER: 4, "gold": 1, FREE_TIER: 1}
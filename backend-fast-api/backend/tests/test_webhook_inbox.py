@@ -0,0 +1,214 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.core.security import verify_payment_signature
+from app.db import database
+from app.db.base import Base
+from app.models.billing import BillingPlan, CreditTransaction, UserCredit
+from app.models.user import User
+from app.models.webhook import WebhookEvent
+from app.services.webhook_inbox import (
+    EVENT_FAILED,
+    EVENT_PENDING,
+    EVENT_PROCESSED,
+    SOURCE_RAZORPAY_CALLBACK,
+    SOURCE_RAZORPAY_WEBHOOK,
+    WebhookInbox,
+)
+
+MAX_ATTEMPTS = 3
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """Point the app's async sessions at a fresh SQLite file"""
+    path = tmp_path / "billing.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    original = database.AsyncSessionLocal.kw["bind"]
+    database.AsyncSessionLocal.configure(bind=engine)
+    yield engine
+    database.AsyncSessionLocal.configure(bind=original)
+    asyncio.run(engine.dispose())
+
+
+def make_inbox():
+    return WebhookInbox(batch_size=10, poll_interval=1.0, max_attempts=MAX_ATTEMPTS, retry_backoff=30, dedup_cache_size=100)
+
+
+async def seed_user():
+    """A user with two pending purchases: a cheap one (order_cheap) and a big one (order_big)"""
+    async with database.async_session_scope() as db:
+        user = User(email="student@example.com", password="x", first_name="Student")
+        db.add_all([
+            user,
+            BillingPlan(id="basic", name="Basic", credits=10, price=100.0, features=[]),
+            BillingPlan(id="pro", name="Pro", credits=1000, price=5000.0, features=[]),
+        ])
+        await db.flush()
+        for transaction_id, plan_id, credits, order_id in (
+            ("txn_cheap", "basic", 10, "order_cheap"),
+            ("txn_big", "pro", 1000, "order_big"),
+        ):
+            db.add(CreditTransaction(
+                transaction_id=transaction_id,
+                user_id=user.id,
+                plan_id=plan_id,
+                credits_added=credits,
+                amount_paid=0.0,
+                payment_method="razorpay",
+                payment_status="pending",
+                razorpay_order_id=order_id
+            ))
+        return user.id
+
+
+def callback(transaction_id, order_id, payment_id):
+    return {"transaction_id": transaction_id, "razorpay_payment_id": payment_id, "razorpay_order_id": order_id}
+
+
+def captured(order_id, payment_id):
+    return {"event": "payment.captured", "payload": {"payment": {"entity": {"id": payment_id, "order_id": order_id}}}}
+
+
+async def load_state(user_id):
+    async with database.async_session_scope() as db:
+        balance = await db.scalar(select(UserCredit.credits_balance).where(UserCredit.user_id == user_id))
+        statuses = dict((await db.execute(
+            select(CreditTransaction.transaction_id, CreditTransaction.payment_status)
+        )).all())
+        events = list((await db.execute(select(WebhookEvent).order_by(WebhookEvent.id))).scalars().all())
+    return balance or 0, statuses, events
+
+
+def test_callback_for_another_transaction_is_rejected(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        inbox = make_inbox()
+        # A valid signature for the cheap order, replayed against the big transaction
+        await inbox.accept(SOURCE_RAZORPAY_CALLBACK, "pay_1", "payment.callback", callback("txn_big", "order_cheap", "pay_1"))
+        await inbox.process_batch()
+        return await load_state(user_id)
+
+    balance, statuses, events = asyncio.run(scenario())
+    assert balance == 0
+    assert statuses == {"txn_cheap": "pending", "txn_big": "pending"}
+    # A mismatch is not retried
+    assert [(event.status, event.attempts) for event in events] == [(EVENT_FAILED, 1)]
+    assert "does not match" in events[0].last_error
+
+
+def test_callback_without_order_is_rejected(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        inbox = make_inbox()
+        await inbox.accept(SOURCE_RAZORPAY_CALLBACK, "pay_1", "payment.callback", callback("txn_big", None, "pay_1"))
+        await inbox.process_batch()
+        return await load_state(user_id)
+
+    balance, statuses, events = asyncio.run(scenario())
+    assert balance == 0
+    assert statuses["txn_big"] == "pending"
+    assert events[0].status == EVENT_FAILED
+
+
+def test_matching_callback_completes_purchase(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        inbox = make_inbox()
+        await inbox.accept(SOURCE_RAZORPAY_CALLBACK, "pay_1", "payment.callback", callback("txn_cheap", "order_cheap", "pay_1"))
+        await inbox.process_batch()
+        return await load_state(user_id)
+
+    balance, statuses, events = asyncio.run(scenario())
+    assert balance == 10
+    assert statuses == {"txn_cheap": "completed", "txn_big": "pending"}
+    assert [event.status for event in events] == [EVENT_PROCESSED]
+
+
+def test_duplicate_deliveries_credit_once(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        inbox = make_inbox()
+        payload = callback("txn_cheap", "order_cheap", "pay_1")
+        first = await inbox.accept(SOURCE_RAZORPAY_CALLBACK, "pay_1", "payment.callback", payload)
+        # Answered from the worker's memory of recent keys
+        again = await inbox.accept(SOURCE_RAZORPAY_CALLBACK, "pay_1", "payment.callback", payload)
+        # Another worker has never seen the key; the unique index catches it
+        other_inbox = make_inbox()
+        other_worker = await other_inbox.accept(SOURCE_RAZORPAY_CALLBACK, "pay_1", "payment.callback", payload)
+        # The webhook for the same payment is a separate event but must not credit twice
+        await inbox.accept(SOURCE_RAZORPAY_WEBHOOK, "evt_1", "payment.captured", captured("order_cheap", "pay_1"))
+        await inbox.process_batch()
+        await inbox.accept(SOURCE_RAZORPAY_WEBHOOK, "evt_1", "payment.captured", captured("order_cheap", "pay_1"))
+        await inbox.process_batch()
+        duplicates = inbox.stats()["duplicates"] + other_inbox.stats()["duplicates"]
+        return (first, again, other_worker), duplicates, await load_state(user_id)
+
+    accepted, duplicates, (balance, statuses, events) = asyncio.run(scenario())
+    assert accepted == (True, False, False)
+    assert duplicates == 3
+    assert balance == 10
+    assert statuses["txn_cheap"] == "completed"
+    assert [event.status for event in events] == [EVENT_PROCESSED, EVENT_PROCESSED]
+
+
+def test_failed_event_is_retried_after_backoff(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        inbox = make_inbox()
+        # A webhook for an order we do not know yet (e.g. it raced the order being saved)
+        await inbox.accept(SOURCE_RAZORPAY_WEBHOOK, "evt_1", "payment.captured", captured("order_late", "pay_1"))
+        await inbox.process_batch()
+        after_failure = await load_state(user_id)
+
+        # Still backing off: not picked up again
+        assert await inbox.process_batch() == 0
+
+        async with database.async_session_scope() as db:
+            await db.execute(
+                update(CreditTransaction)
+                .where(CreditTransaction.transaction_id == "txn_cheap")
+                .values(razorpay_order_id="order_late")
+            )
+            await db.execute(update(WebhookEvent).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        await inbox.process_batch()
+        return after_failure, await load_state(user_id)
+
+    (_, _, first_events), (balance, statuses, events) = asyncio.run(scenario())
+    assert [(event.status, event.attempts) for event in first_events] == [(EVENT_PENDING, 1)]
+    assert first_events[0].next_attempt_at > datetime.utcnow()
+    assert [(event.status, event.attempts, event.last_error) for event in events] == [(EVENT_PROCESSED, 2, None)]
+    assert balance == 10
+    assert statuses["txn_cheap"] == "completed"
+
+
+def test_event_fails_after_max_attempts(db_engine):
+    async def scenario():
+        user_id = await seed_user()
+        inbox = make_inbox()
+        await inbox.accept(SOURCE_RAZORPAY_WEBHOOK, "evt_1", "payment.captured", captured("order_missing", "pay_1"))
+        for _ in range(MAX_ATTEMPTS):
+            async with database.async_session_scope() as db:
+                await db.execute(update(WebhookEvent).values(next_attempt_at=None))
+            await inbox.process_batch()
+        return await load_state(user_id)
+
+    _, _, events = asyncio.run(scenario())
+    assert [(event.status, event.attempts) for event in events] == [(EVENT_FAILED, MAX_ATTEMPTS)]
+
+
+def test_unsigned_payments_rejected_without_secret(monkeypatch):
+    monkeypatch.setattr(settings, "RAZORPAY_ALLOW_UNSIGNED", False)
+    assert verify_payment_signature(b"order_1|pay_1", "", "") is False
+    monkeypatch.setattr(settings, "RAZORPAY_ALLOW_UNSIGNED", True)
+    assert verify_payment_signature(b"order_1|pay_1", "", "") is True
+    # A configured secret is always checked
+    assert verify_payment_signature(b"order_1|pay_1", "bad", "secret") is False